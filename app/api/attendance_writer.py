@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import OperationalError
+
+from core import metrics
+from core.config import settings
+from crud import crud_attendance
+from db.base import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("check_ins_queued_total", "Отметки по QR-коду, принятые в очередь записи")
+metrics.describe("check_ins_written_total", "Отметки по QR-коду, записанные в БД")
+metrics.describe("check_ins_rejected_total", "Отметки по QR-коду, отклонённые из-за переполнения очереди")
+metrics.describe("check_ins_dropped_total", "Отметки по QR-коду, которые не удалось записать из-за ошибки данных")
+
+
+# Отметки по QR-коду копятся в памяти процесса и пишутся в БД пачками по CHECK_IN_BATCH_SIZE
+# раз в CHECK_IN_FLUSH_INTERVAL_SECONDS: сотни студентов, отметившихся за полминуты, дают
+# несколько запросов к Postgres вместо сотен транзакций. Повторная отметка того же студента
+# на том же занятии схлопывается ещё в очереди.
+class AttendanceWriter:
+    def __init__(self, batch_size: int = settings.CHECK_IN_BATCH_SIZE,
+                 flush_interval: float = settings.CHECK_IN_FLUSH_INTERVAL_SECONDS,
+                 max_pending: int = settings.CHECK_IN_MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[int, int], None] = {}
+
+    def enqueue(self, user_id: int, lesson_id: int) -> bool:
+        key = (user_id, lesson_id)
+        with self._lock:
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                metrics.inc("check_ins_rejected_total")
+                return False
+            self._pending[key] = None
+        metrics.inc("check_ins_queued_total")
+        return True
+
+    def _take(self) -> List[Tuple[int, int]]:
+        with self._lock:
+            batch = []
+            for key in self._pending:
+                batch.append(key)
+                if len(batch) >= self.batch_size:
+                    break
+            for key in batch:
+                del self._pending[key]
+            return batch
+
+    def _requeue(self, batch: List[Tuple[int, int]]) -> None:
+        with self._lock:
+            for key in batch:
+                self._pending.setdefault(key, None)
+
+    def _write(self, batch: List[Tuple[int, int]]) -> None:
+        db = SessionLocal()
+        try:
+            crud_attendance.check_in_many(db, batch)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write_each(self, batch: List[Tuple[int, int]]) -> Tuple[int, bool]:
+        # одна плохая отметка (например, занятие удалено) не должна блокировать остальные
+        written = 0
+        for i, (user_id, lesson_id) in enumerate(batch):
+            try:
+                self._write([(user_id, lesson_id)])
+            except OperationalError as e:
+                self._requeue(batch[i:])
+                logger.error(f"БД недоступна, отметки ({len(batch) - i} шт.) возвращены в очередь: {e}")
+                return written, False
+            except Exception as e:
+                metrics.inc("check_ins_dropped_total")
+                logger.error(f"Отметка студента {user_id} на занятии {lesson_id} отброшена: {e}")
+            else:
+                written += 1
+        return written, True
+
+    def flush(self) -> int:
+        written = 0
+        while batch := self._take():
+            count, proceed = len(batch), True
+            try:
+                self._write(batch)
+            except OperationalError as e:
+                # отметки не теряются: вернутся в очередь и уйдут со следующей попыткой
+                self._requeue(batch)
+                logger.error(f"Ошибка пакетной записи отметок ({len(batch)} шт.): {e}")
+                break
+            except Exception as e:
+                # ошибка данных повторится при каждой попытке: пачка пишется по одной отметке
+                logger.error(f"Ошибка данных в пачке отметок ({len(batch)} шт.), запись по одной: {e}")
+                count, proceed = self._write_each(batch)
+            written += count
+            metrics.inc("check_ins_written_total", count)
+            if not proceed:
+                break
+        return written
+
+    async def run(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await run_in_threadpool(self.flush)
+        finally:
+            # при остановке дописываем то, что уже принято
+            written = await run_in_threadpool(self.flush)
+            if written:
+                logger.info(f"Перед остановкой записано отметок: {written}")
+
+
+attendance_writer = AttendanceWriter()
@@ -0,0 +1,67 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Mapping, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from api.responses import dump_rows
+from core.config import settings
+from crud import crud_catalog, crud_lesson, crud_subject
+
+
+# Каталог целиком в памяти процесса; весь каталог и первая страница по умолчанию - готовыми JSON-байтами.
+# Версия каталога хранится в БД и увеличивается в транзакции create_*; каждый процесс
+# сверяет её не чаще раза в CATALOG_VERSION_CHECK_SECONDS, так что изменения из других
+# воркеров видны не позже чем через этот интервал.
+class CatalogCache:
+    def __init__(self, name: str, loader: Callable[[Session], Sequence[Mapping[str, Any]]],
+                 check_interval: float = settings.CATALOG_VERSION_CHECK_SECONDS, page_size: int | None = None):
+        self.name = name
+        self.loader = loader
+        self.check_interval = check_interval
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._version: int | None = None
+        # строки и кеш тел ответов (skip, limit) -> bytes заменяются вместе при смене версии
+        self._state: Tuple[Sequence[Mapping[str, Any]], Dict[Tuple[int, int | None], bytes]] | None = None
+        self._checked_at = 0.0
+
+    def get(self, db: Session, skip: int = 0, limit: int | None = None) -> bytes:
+        rows, pages = self._snapshot(db)
+        key = (skip, limit)
+        body = pages.get(key)
+        if body is None:
+            body = dump_rows(rows[skip:None if limit is None else skip + limit])
+            # остальные срезы сериализуются на каждый запрос, чтобы не копить их в памяти
+            if skip == 0 and limit in (None, self.page_size):
+                pages[key] = body
+        return body
+
+    def _snapshot(self, db: Session) -> Tuple[Sequence[Mapping[str, Any]], Dict[Tuple[int, int | None], bytes]]:
+        state = self._state
+        if state is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return state
+        with self._lock:
+            if self._state is None or time.monotonic() - self._checked_at >= self.check_interval:
+                self._refresh(db)
+            return self._state
+
+    def _refresh(self, db: Session) -> None:
+        version = crud_catalog.get_version(db, self.name)
+        if self._state is None or version != self._version:
+            self._state = ([dict(row) for row in self.loader(db)], {})
+            self._version = version
+        self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        # следующий запрос сверит версию сразу, не дожидаясь интервала
+        self._checked_at = 0.0
+
+
+subjects_cache = CatalogCache(crud_subject.CATALOG_NAME, crud_subject.get_subject_rows)
+lessons_cache = CatalogCache(crud_lesson.CATALOG_NAME, crud_lesson.get_lesson_rows, page_size=100)
+
+
+def warm_up(db: Session) -> None:
+    for cache in (subjects_cache, lessons_cache):
+        cache.get(db)
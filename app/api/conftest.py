@@ -0,0 +1,120 @@
+import importlib
+import os
+from typing import Generator, Any
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=".env.test")
+# клиент и токен создаются заново в каждом тесте: лимит входа с одного адреса здесь не проверяется
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+
+TEST_POSTGRES_SERVER = os.getenv("POSTGRES_SERVER", "localhost")
+TEST_POSTGRES_USER = os.getenv("POSTGRES_USER")
+TEST_POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+TEST_POSTGRES_DB = os.getenv("POSTGRES_DB")
+
+
+SQLALCHEMY_DATABASE_URL_TEST = (
+    f"postgresql+psycopg2://{TEST_POSTGRES_USER}:{TEST_POSTGRES_PASSWORD}"
+    f"@{TEST_POSTGRES_SERVER}/{TEST_POSTGRES_DB}"
+)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL_TEST)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+from db import init_db
+from db.base import Base, get_db, get_read_db
+from main import app
+from core.config import settings
+from core.task_queue import InProcessTaskQueue
+from api.endpoints import predictions
+from db.replicas import ReplicaRouter
+
+WORKERS_DIR = os.path.join(os.path.dirname(__file__), "..", "workers")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def setup_db():
+    Base.metadata.drop_all(bind=engine)
+    # схема как при запуске сервера (server.main): таблицы, секции истории, триггеры
+    db = TestingSessionLocal()
+    try:
+        init_db.init_db(db)
+    finally:
+        db.close()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="function")
+def db_session() -> Generator[Session, Any, None]:
+    connection = engine.connect()
+    transaction = connection.begin()
+    # commit/rollback кода приложения (например, пробный импорт) работают с точкой сохранения,
+    # а не с транзакцией теста
+    session = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+@pytest.fixture(scope="function")
+def client(db_session: Session) -> Generator[TestClient, Any, None]:
+
+    def override_get_db() -> Generator[Session, Any, None]:
+        yield db_session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.clear()
+
+@pytest.fixture(autouse=True)
+def task_queue(monkeypatch) -> InProcessTaskQueue:
+    # задачи API ставятся в очередь в памяти: тестам не нужен брокер, разбирает их drain
+    queue = InProcessTaskQueue()
+    monkeypatch.setattr(predictions, "publisher", queue)
+    return queue
+
+@pytest.fixture
+def worker(monkeypatch, tmp_path, db_session: Session):
+    # обработчик воркера в процессе теста: история, статус и результат - в транзакции теста,
+    # модель - встроенная (пустой реестр)
+    pytest.importorskip("numpy")
+    monkeypatch.syspath_prepend(WORKERS_DIR)
+    worker = importlib.import_module("worker")
+    connection = db_session.connection()
+    monkeypatch.setattr(worker, "SessionLocal", sessionmaker(bind=connection))
+    # get_attendance_history читает через replicas.engine(): без реплик это основная БД - соединение теста
+    monkeypatch.setattr(worker, "replicas", ReplicaRouter(connection, []))
+    monkeypatch.setattr(worker, "model_holder", worker.ModelHolder(worker.ModelRegistry(str(tmp_path))))
+    monkeypatch.setattr(worker, "predict_pool", None)
+    return worker
+
+@pytest.fixture(scope="function")
+def auth_token(client: TestClient) -> str:
+    test_email = "testuser@example.com"
+    test_password = "testpassword"
+
+
+    client.post(
+        f"{settings.API_V1_STR}/auth/register",
+        json={"email": test_email, "password": test_password},
+    )
+
+    # логин
+    response = client.post(
+        f"{settings.API_V1_STR}/auth/login",
+        data={"username": test_email, "password": test_password},
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    assert response.status_code == 200
+    token_data = response.json()
+    return f"{token_data['token_type']} {token_data['access_token']}"
@@ -1,11 +1,11 @@
 from typing import Generator, Annotated
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from jose import jwt, JWTError
 import logging
 
-from db.base import SessionLocal, get_db
+from db.base import SessionLocal, get_db, get_read_db
 from db.models.user import User
 from schemas.token import TokenData
 from core.config import settings
@@ -46,6 +46,15 @@ async def get_current_user(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
     return user
 
+async def get_current_user_from_cookie(
+        request: Request,
+        db: Annotated[Session, Depends(get_db)]
+) -> User:
+    token = request.cookies.get("access_token")
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    return await get_current_user(db, token)
+
 async def get_current_active_superuser(
         current_user: Annotated[User, Depends(get_current_user)],
 ) -> User:
@@ -0,0 +1,76 @@
+from typing import List, Annotated
+import datetime
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from api import deps
+from api.responses import rows_response
+from core.config import settings
+from schemas import analytics as analytics_schema
+from crud import crud_analytics
+
+# отчёты читают только сводные таблицы attendance_*_stats, а не сырые отметки;
+# небольшое отставание допустимо, поэтому запросы идут в реплики
+router = APIRouter(dependencies=[Depends(deps.get_current_active_superuser)])
+
+
+@router.get("/attendance/subjects", response_model=List[analytics_schema.SubjectAttendanceRate])
+def read_subject_attendance(db: Annotated[Session, Depends(deps.get_read_db)]):
+    return rows_response(crud_analytics.get_subject_rates(db))
+
+
+@router.get("/attendance/lessons", response_model=List[analytics_schema.LessonAttendanceRate])
+def read_lesson_attendance(
+        db: Annotated[Session, Depends(deps.get_read_db)],
+        subject_id: int | None = None,
+        date_from: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+        date_to: Annotated[datetime.datetime | None, Query(alias="to")] = None,
+        skip: int = 0,
+        limit: int = Query(100, le=1000),
+):
+    return rows_response(crud_analytics.get_lesson_rates(db, subject_id, date_from, date_to, skip, limit))
+
+
+@router.get("/attendance/weeks", response_model=List[analytics_schema.WeeklyAttendanceRate])
+def read_weekly_attendance(
+        db: Annotated[Session, Depends(deps.get_read_db)],
+        subject_id: int | None = None,
+        date_from: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+        date_to: Annotated[datetime.datetime | None, Query(alias="to")] = None,
+):
+    return rows_response(crud_analytics.get_weekly_rates(db, subject_id, date_from, date_to))
+
+
+@router.get("/attendance/at-risk", response_model=List[analytics_schema.AtRiskStudent])
+def read_at_risk_students(
+        db: Annotated[Session, Depends(deps.get_read_db)],
+        threshold: float = Query(settings.AT_RISK_ATTENDANCE_THRESHOLD, ge=0, le=1),
+        min_lessons: int = Query(settings.AT_RISK_MIN_LESSONS, ge=1),
+        subject_id: int | None = None,
+        skip: int = 0,
+        limit: int = Query(100, le=1000),
+):
+    return rows_response(crud_analytics.get_at_risk_students(db, threshold, min_lessons, subject_id, skip, limit))
+
+
+@router.get("/scores", response_model=List[analytics_schema.StudentScore])
+def read_student_scores(
+        db: Annotated[Session, Depends(deps.get_read_db)],
+        max_probability: float = Query(1.0, ge=0, le=1),
+        skip: int = 0,
+        limit: int = Query(100, le=1000),
+):
+    # результаты ночного прогона workers/batch_scoring.py, от наименьшей вероятности посещения
+    return rows_response(crud_analytics.get_student_scores(db, max_probability, skip, limit))
+
+
+@router.get("/shadow", response_model=List[analytics_schema.ShadowReport])
+def read_shadow_report(
+        db: Annotated[Session, Depends(deps.get_read_db)],
+        date_from: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+        date_to: Annotated[datetime.datetime | None, Query(alias="to")] = None,
+        threshold: float = Query(0.5, ge=0, le=1),
+):
+    # сравнение модели-кандидата с основной по парам версий (workers/shadow_scoring.py)
+    return rows_response(crud_analytics.get_shadow_report(db, date_from, date_to, threshold))
@@ -1,9 +1,13 @@
 from typing import List, Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from api import deps
+from api.attendance_writer import attendance_writer
+from api.responses import make_etag, etag_matches, etag_headers, not_modified
+from api.schedule_index import current_lessons
+from core import security
 from schemas import attendance as attendance_schema
 from schemas import history as history_schema
 from crud import crud_attendance
@@ -12,15 +16,52 @@ from db.models.user import User as UserModel
 router = APIRouter()
 
 @router.get("/", response_model=List[attendance_schema.Attendance])
-def read_attendances(db: Annotated[Session, Depends(deps.get_db)]):
+def read_attendances(db: Annotated[Session, Depends(deps.get_read_db)]):
     return crud_attendance.get_attendances(db)
 
 @router.post("/", response_model=attendance_schema.Attendance)
 def create_attendance(db: Annotated[Session, Depends(deps.get_db)], attendance: attendance_schema.AttendanceBase):
     return crud_attendance.create_attendance(db, attendance)
 
+@router.post("/check-in", response_model=attendance_schema.CheckInResponse, status_code=status.HTTP_202_ACCEPTED)
+def check_in(
+        db: Annotated[Session, Depends(deps.get_db)],
+        current_user: Annotated[UserModel, Depends(deps.get_current_user)],
+        check_in_in: attendance_schema.CheckInRequest,
+):
+    # подпись и срок проверяются без БД, занятие - по индексу текущих занятий в памяти,
+    # запись отметки уходит в пакетную очередь
+    lesson_id = security.verify_lesson_qr(check_in_in.qr_code_content)
+    if lesson_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="QR-код недействителен или просрочен"
+        )
+    if not current_lessons.is_current(db, lesson_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Занятие сейчас не идёт"
+        )
+    if not attendance_writer.enqueue(current_user.id, lesson_id):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Слишком много отметок, повторите попытку",
+            headers={"Retry-After": "1"}
+        )
+    return attendance_schema.CheckInResponse(lesson_id=lesson_id, status="queued")
+
 @router.get("/history", response_model=history_schema.AttendanceHistory)
-def read_attendance_history(db: Annotated[Session, Depends(deps.get_db)], current_user: Annotated[UserModel, Depends(deps.get_current_user)]):
+def read_attendance_history(
+        db: Annotated[Session, Depends(deps.get_db)],
+        current_user: Annotated[UserModel, Depends(deps.get_current_user)],
+        response: Response,
+        if_none_match: Annotated[str | None, Header()] = None,
+):
+    etag = make_etag("attendances", current_user.id, current_user.history_version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
+
     history = crud_attendance.get_attendance_history(db, current_user.id)
     # история посещений для ответа
     attendance_history = []
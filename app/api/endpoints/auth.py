@@ -1,9 +1,11 @@
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from api import deps
+from api.rate_limit import rate_limit
 from core import security
 from schemas.token import Token
 from crud import crud_user
@@ -11,33 +13,44 @@ from schemas.user import UserCreate, User as UserSchema
 
 router = APIRouter()
 
+# хеширование идёт в отдельном пуле core/security.py; синхронные запросы к БД - в threadpool,
+# в цикле событий они останавливали бы все запросы процесса
 
-@router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
-def register_user(
+
+@router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(rate_limit("register"))])
+async def register_user(
         *,
         db: Annotated[Session, Depends(deps.get_db)],
         user_in: UserCreate,
 ):
-    user = crud_user.get_user_by_email(db, email=user_in.email)
+    user = await run_in_threadpool(crud_user.get_user_by_email, db, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Такой пользователь уже существует.",
         )
 
-    user = crud_user.create_user(db=db, user=user_in)
+    hashed_password = await security.get_password_hash_async(user_in.password)
+    user = await run_in_threadpool(crud_user.create_user, db=db, user=user_in, hashed_password=hashed_password)
     return user
 
 
-@router.post("/login", response_model=Token)
-def login_for_access_token(
+@router.post("/login", response_model=Token, dependencies=[Depends(rate_limit("login"))])
+async def login_for_access_token(
 
         db: Annotated[Session, Depends(deps.get_db)],
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ):
-    user = crud_user.get_user_by_email(db, email=form_data.username)
+    user = await run_in_threadpool(crud_user.get_user_by_email, db, email=form_data.username)
 
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await security.verify_and_update_password_async(
+            form_data.password, user.hashed_password
+        )
+
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверная почта или пароль",
@@ -47,6 +60,9 @@ def login_for_access_token(
     elif not user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неактивный пользователь")
 
+    if new_hash:
+        await run_in_threadpool(crud_user.update_password_hash, db, user, new_hash)
+
     access_token = security.create_access_token(
         subject=user.email
     )
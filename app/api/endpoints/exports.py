@@ -0,0 +1,48 @@
+from typing import Annotated
+import datetime
+
+from fastapi import APIRouter, Depends, Query
+
+from api import deps
+from api.export import ExportFormat, export_response
+from core.config import settings
+from crud import crud_attendance, crud_prediction, crud_transaction
+
+router = APIRouter(dependencies=[Depends(deps.get_current_active_superuser)])
+
+DateFrom = Annotated[datetime.datetime | None, Query(alias="from")]
+DateTo = Annotated[datetime.datetime | None, Query(alias="to")]
+Format = Annotated[ExportFormat, Query(alias="format")]
+
+
+@router.get("/attendances")
+def export_attendances(fmt: Format = "csv", date_from: DateFrom = None, date_to: DateTo = None,
+                       subject_id: int | None = None):
+    return export_response(
+        lambda db: crud_attendance.iter_attendance_rows(
+            db, date_from, date_to, subject_id, chunk_size=settings.EXPORT_CHUNK_SIZE
+        ),
+        [column.key for column in crud_attendance.ATTENDANCE_EXPORT_COLUMNS], fmt, "attendances"
+    )
+
+
+@router.get("/predictions")
+def export_predictions(fmt: Format = "csv", date_from: DateFrom = None, date_to: DateTo = None,
+                       user_id: int | None = None):
+    return export_response(
+        lambda db: crud_prediction.iter_prediction_rows(
+            db, date_from, date_to, user_id, chunk_size=settings.EXPORT_CHUNK_SIZE
+        ),
+        [column.key for column in crud_prediction.PREDICTION_COLUMNS], fmt, "predictions"
+    )
+
+
+@router.get("/transactions")
+def export_transactions(fmt: Format = "csv", date_from: DateFrom = None, date_to: DateTo = None,
+                        user_id: int | None = None):
+    return export_response(
+        lambda db: crud_transaction.iter_transaction_rows(
+            db, date_from, date_to, user_id, chunk_size=settings.EXPORT_CHUNK_SIZE
+        ),
+        [column.key for column in crud_transaction.TRANSACTION_COLUMNS], fmt, "transactions"
+    )
@@ -0,0 +1,39 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from sqlalchemy.orm import Session
+
+from api import deps
+from api.catalog_cache import lessons_cache, subjects_cache
+from core.config import settings
+from schemas import imports as import_schema
+from crud import crud_import
+
+router = APIRouter(dependencies=[Depends(deps.get_current_active_superuser)])
+
+
+@router.post("/timetable", response_model=import_schema.ImportReport)
+def import_timetable(
+        db: Annotated[Session, Depends(deps.get_db)],
+        subjects: Annotated[UploadFile | None, File()] = None,
+        lessons: Annotated[UploadFile | None, File()] = None,
+        attendances: Annotated[UploadFile | None, File()] = None,
+        dry_run: bool = False,
+):
+    uploads = {
+        name: upload
+        for name, upload in (("subjects", subjects), ("lessons", lessons), ("attendances", attendances))
+        if upload is not None
+    }
+    if not uploads:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Не передан ни один файл")
+    files = {name: upload.file for name, upload in uploads.items()}
+    try:
+        report = crud_import.import_timetable(db, files, dry_run=dry_run, max_rejects=settings.IMPORT_MAX_REJECTS)
+    except crud_import.ImportFileError as e:
+        filename = uploads[e.name].filename or e.name
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Некорректный CSV в файле {filename}: {e}")
+    if not dry_run:
+        subjects_cache.invalidate()
+        lessons_cache.invalidate()
+    return report
@@ -1,18 +1,56 @@
 from typing import List, Annotated
+import datetime
+import time
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from api import deps
+from api.catalog_cache import lessons_cache
+from api.responses import rows_response
+from api.schedule_index import current_lessons
+from core import security
+from core.config import settings
 from schemas import lesson as lesson_schema
 from crud import crud_lesson
 
 router = APIRouter()
 
 @router.get("/", response_model=List[lesson_schema.Lesson])
-def read_lessons(db: Annotated[Session, Depends(deps.get_db)]):
-    return crud_lesson.get_lessons(db)
+def read_lessons(
+    db: Annotated[Session, Depends(deps.get_db)],
+    subject_id: int | None = None,
+    date_from: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+    date_to: Annotated[datetime.datetime | None, Query(alias="to")] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    if subject_id is None and date_from is None and date_to is None:
+        # страница нефильтрованного списка вырезается из каталога в памяти
+        return Response(content=lessons_cache.get(db, skip, limit), media_type="application/json")
+    # фильтрованная выборка идёт по индексу (subject_id, date_time)
+    return rows_response(crud_lesson.get_lesson_rows_filtered(db, subject_id, date_from, date_to, skip, limit))
+
+@router.get("/current", response_model=List[lesson_schema.Lesson])
+def read_current_lessons(db: Annotated[Session, Depends(deps.get_db)], subject_id: int | None = None):
+    return rows_response(current_lessons.current(db, subject_id=subject_id))
+
+@router.get("/{lesson_id}/qr", response_model=lesson_schema.LessonQRCode,
+            dependencies=[Depends(deps.get_current_active_superuser)])
+def read_lesson_qr(db: Annotated[Session, Depends(deps.get_db)], lesson_id: int):
+    # код показывается на экране в аудитории и обновляется каждые QR_CODE_TTL_SECONDS
+    if crud_lesson.get_lesson(db, lesson_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Занятие не найдено")
+    expires_at = int(time.time()) + settings.QR_CODE_TTL_SECONDS
+    return lesson_schema.LessonQRCode(
+        lesson_id=lesson_id,
+        qr_code_content=security.create_lesson_qr(lesson_id, expires_at),
+        expires_at=expires_at
+    )
 
 @router.post("/", response_model=lesson_schema.Lesson)
 def create_lesson(db: Annotated[Session, Depends(deps.get_db)], lesson: lesson_schema.LessonCreate):
-    return crud_lesson.create_lesson(db, lesson)
\ No newline at end of file
+    db_lesson = crud_lesson.create_lesson(db, lesson)
+    lessons_cache.invalidate()
+    current_lessons.add(db_lesson.id, db_lesson.subject_id, db_lesson.date_time)
+    return db_lesson
@@ -1,32 +1,50 @@
 from typing import Annotated, List
+import datetime
+import logging
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-import pika
-import json
+from sqlalchemy.exc import IntegrityError
 
 from api import deps
+from api.responses import rows_response
+from api.rate_limit import rate_limit_by_user
 from db.models.user import User as UserModel
+from db.models.idempotency_key import IdempotencyKey
+from db.models.prediction_request import PredictionRequest as PredictionRequestModel
 
 from schemas import prediction as prediction_schema
-from crud import crud_user, crud_prediction, crud_transaction
+from crud import crud_user, crud_prediction, crud_transaction, crud_idempotency
 from core.config import settings
+from core.publisher import publisher
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.post(
     "/",
     response_model=prediction_schema.PredictionRequest,
-    status_code=status.HTTP_202_ACCEPTED
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit_by_user("predictions"))]
 )
 def create_prediction_request_endpoint(
         *,
         db: Annotated[Session, Depends(deps.get_db)],
         prediction_in: prediction_schema.PredictionCreate,
         current_user: Annotated[UserModel, Depends(deps.get_current_user)],
+        idempotency_key: Annotated[str | None, Header(alias="Idempotency-Key", max_length=255)] = None,
 ):
     prediction_cost = settings.PREDICTION_COST
 
+    request_hash = None
+    if idempotency_key:
+        request_hash = crud_idempotency.hash_request(prediction_in.model_dump(mode="json"))
+        stored_key = crud_idempotency.get_active_key(db, user_id=current_user.id, key=idempotency_key)
+        if stored_key:
+            return replay_idempotent_response(stored_key, request_hash)
+
     if current_user.balance < prediction_cost:
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
@@ -45,6 +63,18 @@ def create_prediction_request_endpoint(
         db.add(db_prediction_request)
         db.flush()
 
+        if idempotency_key:
+            crud_idempotency.create_key(
+                db=db,
+                user_id=current_user.id,
+                key=idempotency_key,
+                request_hash=request_hash,
+                prediction_request_id=db_prediction_request.id,
+                response_body=prediction_schema.PredictionRequest.model_validate(
+                    db_prediction_request
+                ).model_dump(mode="json")
+            )
+
         updated_user = crud_user.update_balance(
             db=db,
             user=current_user,
@@ -59,31 +89,104 @@ def create_prediction_request_endpoint(
                 detail="Ошибка при списании средств или записи транзакции."
             )
 
+        db.commit()
         db.refresh(db_prediction_request)
 
-        # отправка задачи в RabbitMQ
-        send_task_to_rabbitmq(db_prediction_request.id, current_user.id)
-
-        return db_prediction_request
+    except IntegrityError:
+        # параллельный запрос с тем же ключом успел закоммитить первым: списание откатываем
+        db.rollback()
+        if idempotency_key:
+            stored_key = crud_idempotency.get_active_key(db, user_id=current_user.id, key=idempotency_key)
+            if stored_key:
+                return replay_idempotent_response(stored_key, request_hash)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Не удалось создать запрос на предсказание."
+        )
 
     except Exception as e:
 
         db.rollback()
 
-        print(f"Ошибка при создании запроса на предсказание: {e}")
+        logger.error(f"Ошибка при создании запроса на предсказание: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Не удалось создать запрос на предсказание."
         )
 
-def send_task_to_rabbitmq(prediction_id, user_id):
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host='rabbitmq'))
-    channel = connection.channel()
-    channel.queue_declare(queue='ml_tasks')
+    # отправка задачи воркеру через очередь TASK_BACKEND
+    try:
+        send_prediction_task(db_prediction_request.id, current_user.id, db_prediction_request.timestamp_created)
+    except Exception as e:
+        logger.error(f"Ошибка отправки задачи на предсказание: {e}")
+        cancel_unsent_prediction(db, db_prediction_request, current_user, idempotency_key)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Очередь задач недоступна, средства возвращены. Повторите запрос позже."
+        )
+
+    return db_prediction_request
 
+def cancel_unsent_prediction(db: Session, prediction: PredictionRequestModel, user: UserModel,
+                             idempotency_key: str | None) -> None:
+    # задача не попала в очередь и выполнена не будет: запрос помечается failed, списание возвращается,
+    # а ключ идемпотентности снимается, чтобы повтор с тем же ключом создал задачу заново
+    try:
+        prediction.status = "failed"
+        prediction.error_message = "Задача не отправлена в очередь"
+        crud_user.update_balance(
+            db=db,
+            user=user,
+            amount=prediction.cost,
+            transaction_type="prediction_refund",
+            prediction_request_id=prediction.id
+        )
+        if idempotency_key:
+            crud_idempotency.delete_key(db, user_id=user.id, key=idempotency_key)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ошибка отмены неотправленного запроса на предсказание {prediction.id}: {e}")
+
+def replay_idempotent_response(stored_key: IdempotencyKey, request_hash: str) -> JSONResponse:
+    if stored_key.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key уже использован с другими параметрами запроса."
+        )
+    # повтор запроса: без списания средств и без повторной отправки задачи
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=stored_key.response_body,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+def send_prediction_task(prediction_id, user_id, created_at=None):
     task = {'prediction_id': prediction_id, 'user_id': user_id}
-    channel.basic_publish(exchange='', routing_key='ml_tasks', body=json.dumps(task))
-    connection.close()
+    if created_at is not None:
+        # время создания - ключ секции: воркер обновляет строку, не просматривая остальные секции
+        task['created_at'] = created_at.isoformat()
+    publisher.publish(task)
+
+@router.get("/search", response_model=List[prediction_schema.PredictionRequest],
+            dependencies=[Depends(deps.get_current_active_superuser)])
+def search_prediction_requests(
+        db: Annotated[Session, Depends(deps.get_read_db)],
+        feature2: str | None = None,
+        min_probability: Annotated[float | None, Query(ge=0, le=1)] = None,
+        max_probability: Annotated[float | None, Query(ge=0, le=1)] = None,
+        prediction_status: Annotated[str | None, Query(alias="status")] = None,
+        user_id: int | None = None,
+        date_from: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+        date_to: Annotated[datetime.datetime | None, Query(alias="to")] = None,
+        skip: int = 0,
+        limit: int = 100,
+):
+    predictions = crud_prediction.search_prediction_rows(
+        db, feature2=feature2, min_probability=min_probability, max_probability=max_probability,
+        status=prediction_status, user_id=user_id, date_from=date_from, date_to=date_to, skip=skip, limit=limit
+    )
+    return rows_response(predictions)
 
 @router.get("/{prediction_id}", response_model=prediction_schema.PredictionRequest)
 def read_prediction_request(
@@ -113,14 +216,18 @@ def read_prediction_requests(
         db: Annotated[Session, Depends(deps.get_db)],
         current_user: Annotated[UserModel, Depends(deps.get_current_user)],
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        date_from: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+        date_to: Annotated[datetime.datetime | None, Query(alias="to")] = None,
 ):
     if current_user.is_superuser:
 
-        predictions = crud_prediction.get_all_predictions(db, skip=skip, limit=limit)
+        predictions = crud_prediction.get_all_prediction_rows(
+            db, skip=skip, limit=limit, date_from=date_from, date_to=date_to
+        )
     else:
 
-        predictions = crud_prediction.get_prediction_history_by_user(
-            db, user_id=current_user.id, skip=skip, limit=limit
+        predictions = crud_prediction.get_prediction_rows_by_user(
+            db, user_id=current_user.id, skip=skip, limit=limit, date_from=date_from, date_to=date_to
         )
-    return predictions
\ No newline at end of file
+    return rows_response(predictions)
\ No newline at end of file
@@ -1,9 +1,10 @@
 from typing import List, Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session
 
 from api import deps
+from api.catalog_cache import subjects_cache
 from schemas import subject as subject_schema
 from crud import crud_subject
 
@@ -12,9 +13,11 @@ router = APIRouter()
 
 @router.get("/", response_model=List[subject_schema.Subject])
 def read_subjects(db: Annotated[Session, Depends(deps.get_db)]):
-    return crud_subject.get_subjects(db)
+    return Response(content=subjects_cache.get(db), media_type="application/json")
 
 
 @router.post("/", response_model=subject_schema.Subject)
 def create_subject(db: Annotated[Session, Depends(deps.get_db)], subject: subject_schema.SubjectCreate):
-    return crud_subject.create_subject(db, subject)
+    db_subject = crud_subject.create_subject(db, subject)
+    subjects_cache.invalidate()
+    return db_subject
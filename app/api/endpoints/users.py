@@ -1,8 +1,10 @@
 from typing import List, Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from api import deps
+from api.responses import rows_response, make_etag, etag_matches, etag_headers, not_modified
 from db.models.user import User as UserModel
 from schemas import user as user_schema
 from schemas import transaction as transaction_schema
@@ -11,6 +13,10 @@ from crud import crud_user, crud_transaction, crud_prediction
 
 router = APIRouter()
 
+# период истории: с границами запрос читает только месячные секции внутри периода
+DateFrom = Annotated[datetime.datetime | None, Query(alias="from")]
+DateTo = Annotated[datetime.datetime | None, Query(alias="to")]
+
 
 @router.get("/me", response_model=user_schema.User)
 def read_users_me(
@@ -46,6 +52,8 @@ def topup_user_balance(
             detail="Не удалось обновить баланс."
         )
 
+    db.commit()
+    db.refresh(updated_user)
     return updated_user
 
 
@@ -54,13 +62,21 @@ def read_transaction_history(
         *,
         db: Annotated[Session, Depends(deps.get_db)],
         current_user: Annotated[UserModel, Depends(deps.get_current_user)],
+        if_none_match: Annotated[str | None, Header()] = None,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        date_from: DateFrom = None,
+        date_to: DateTo = None,
 ):
-    transactions = crud_transaction.get_transactions_by_user(
-        db, user_id=current_user.id, skip=skip, limit=limit
+    # версия истории уже загружена вместе с пользователем при аутентификации
+    etag = make_etag("transactions", current_user.id, current_user.history_version, skip, limit, date_from, date_to)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    transactions = crud_transaction.get_transaction_rows_by_user(
+        db, user_id=current_user.id, skip=skip, limit=limit, date_from=date_from, date_to=date_to
     )
-    return transactions
+    return rows_response(transactions, headers=etag_headers(etag))
 
 
 @router.get("/me/history/predictions", response_model=List[prediction_schema.PredictionRequest])
@@ -68,18 +84,25 @@ def read_prediction_history(
         *,
         db: Annotated[Session, Depends(deps.get_db)],
         current_user: Annotated[UserModel, Depends(deps.get_current_user)],
+        if_none_match: Annotated[str | None, Header()] = None,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        date_from: DateFrom = None,
+        date_to: DateTo = None,
 ):
-    predictions = crud_prediction.get_prediction_history_by_user(
-        db, user_id=current_user.id, skip=skip, limit=limit
+    etag = make_etag("predictions", current_user.id, current_user.history_version, skip, limit, date_from, date_to)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    predictions = crud_prediction.get_prediction_rows_by_user(
+        db, user_id=current_user.id, skip=skip, limit=limit, date_from=date_from, date_to=date_to
     )
-    return predictions
+    return rows_response(predictions, headers=etag_headers(etag))
 
 
 @router.get("/", response_model=List[user_schema.User], dependencies=[Depends(deps.get_current_active_superuser)])
 def read_users(
-        db: Annotated[Session, Depends(deps.get_db)],
+        db: Annotated[Session, Depends(deps.get_read_db)],
         skip: int = 0,
         limit: int = 100,
 
@@ -119,4 +142,6 @@ def admin_credit_user_balance(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Не удалось обновить баланс пользователя."
         )
+    db.commit()
+    db.refresh(updated_user)
     return updated_user
@@ -0,0 +1,63 @@
+import csv
+import datetime
+import io
+import json
+from typing import Any, Callable, Dict, Iterator, Literal, Mapping, Sequence
+
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from db.base import read_session
+
+ExportFormat = Literal["csv", "ndjson"]
+
+_row_adapter = TypeAdapter(Dict[str, Any])
+
+_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(rows: Sequence[Mapping[str, Any]], columns: Sequence[str], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    writer.writerows([_csv_value(row[column]) for column in columns] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def encode_ndjson(rows: Sequence[Mapping[str, Any]]) -> bytes:
+    return b"".join(_row_adapter.dump_json(dict(row)) + b"\n" for row in rows)
+
+
+# Выгрузка отдаётся по мере чтения пачек из серверного курсора, поэтому память процесса
+# не зависит от размера выгрузки. Сессия открывается внутри генератора: зависимость get_db
+# закрывается до того, как StreamingResponse начнёт отдавать тело. Полные выгрузки читаются из реплик.
+def export_response(iter_chunks: Callable[[Session], Iterator[Sequence[Mapping[str, Any]]]],
+                    columns: Sequence[str], fmt: ExportFormat, filename: str) -> StreamingResponse:
+    def body() -> Iterator[bytes]:
+        db = read_session()
+        try:
+            if fmt == "csv":
+                yield encode_csv([], columns, header=True)
+            for chunk in iter_chunks(db):
+                yield encode_csv(chunk, columns) if fmt == "csv" else encode_ndjson(chunk)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        body(),
+        media_type=_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
@@ -0,0 +1,186 @@
+import ipaddress
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Annotated, Callable, Dict, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import text
+
+from api import deps
+from core import metrics
+from core.config import settings
+from db.base import SessionLocal
+from db.models.user import User
+from db.models.rate_limit_bucket import RateLimitBucket
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+metrics.describe("rate_limit_rejections_total", "Запросы, отклонённые ограничителем частоты")
+
+
+@dataclass(frozen=True)
+class Limit:
+    capacity: float
+    rate: float  # токенов в секунду
+
+
+def parse_limit(value: str) -> Limit:
+    # "10/minute" -> корзина на 10 токенов, пополняется на 10 токенов в минуту
+    count, _, period = value.partition("/")
+    if period not in _PERIODS:
+        raise ValueError(f"Неизвестный период ограничения: {value}")
+    capacity = float(count)
+    return Limit(capacity=capacity, rate=capacity / _PERIODS[period])
+
+
+# корзины в памяти процесса; при нескольких воркерах лимит действует на каждый воркер отдельно
+class InMemoryRateLimitBackend:
+    def __init__(self, max_keys: int = settings.RATE_LIMIT_MAX_KEYS):
+        self._lock = threading.Lock()
+        # ключ -> (токены, время обновления, время полного восстановления)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._max_keys = max_keys
+
+    def acquire(self, key: str, limit: Limit) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (limit.capacity, now, 0.0))
+            tokens = min(limit.capacity, tokens + (now - updated_at) * limit.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (limit.capacity - tokens) / limit.rate)
+            if len(self._buckets) > self._max_keys:
+                self._evict_full(now)
+        return allowed, 0.0 if allowed else (1 - tokens) / limit.rate
+
+    def _evict_full(self, now: float) -> None:
+        # полностью восстановившиеся корзины ничем не отличаются от отсутствующих
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+
+
+# общие для всех процессов корзины: одно атомарное INSERT ... ON CONFLICT на запрос
+class PostgresRateLimitBackend:
+    _refilled = (
+        "LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate)"
+    )
+    _statement = text(f"""
+        INSERT INTO {RateLimitBucket.__tablename__} AS b (key, tokens, allowed, updated_at)
+        VALUES (:key, :capacity - 1, true, clock_timestamp())
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = CASE WHEN {_refilled} >= 1 THEN {_refilled} - 1 ELSE {_refilled} END,
+            allowed = {_refilled} >= 1,
+            updated_at = clock_timestamp()
+        RETURNING allowed, tokens
+    """)
+
+    def acquire(self, key: str, limit: Limit) -> Tuple[bool, float]:
+        db = SessionLocal()
+        try:
+            row = db.execute(
+                self._statement,
+                {"key": key, "capacity": limit.capacity, "rate": limit.rate}
+            ).one()
+            db.commit()
+        finally:
+            db.close()
+        allowed, tokens = row
+        return allowed, 0.0 if allowed else (1 - tokens) / limit.rate
+
+    # корзина, не тронутая дольше capacity/rate секунд, уже полная - её строка не нужна
+    _sweep_statement = text(f"""
+        DELETE FROM {RateLimitBucket.__tablename__}
+        WHERE key IN (
+            SELECT key FROM {RateLimitBucket.__tablename__}
+            WHERE key LIKE :prefix AND updated_at < clock_timestamp() - make_interval(secs => :seconds)
+            LIMIT :batch_size
+        )
+        AND updated_at < clock_timestamp() - make_interval(secs => :seconds)
+    """)
+
+    def sweep(self, limits: Dict[str, Limit], batch_size: int = settings.RATE_LIMIT_SWEEP_BATCH_SIZE) -> int:
+        deleted = 0
+        db = SessionLocal()
+        try:
+            for route, limit in limits.items():
+                params = {
+                    "prefix": f"{route}:%",
+                    "seconds": limit.capacity / limit.rate,
+                    "batch_size": batch_size,
+                }
+                while True:
+                    # удаляем пачками, чтобы не держать длинные блокировки
+                    result = db.execute(self._sweep_statement, params)
+                    db.commit()
+                    deleted += result.rowcount
+                    if result.rowcount < batch_size:
+                        break
+        finally:
+            db.close()
+        return deleted
+
+
+_BACKENDS = {
+    "memory": InMemoryRateLimitBackend,
+    "postgres": PostgresRateLimitBackend,
+}
+
+
+class RateLimiter:
+    def __init__(self, backend=None, limits: Dict[str, str] | None = None):
+        self.backend = backend or _BACKENDS[settings.RATE_LIMIT_BACKEND]()
+        self.limits = {route: parse_limit(value) for route, value in (limits or settings.RATE_LIMITS).items()}
+
+    def check(self, route: str, key: str) -> None:
+        limit = self.limits.get(route)
+        if limit is None or not settings.RATE_LIMIT_ENABLED:
+            return
+        allowed, retry_after = self.backend.acquire(f"{route}:{key}", limit)
+        if not allowed:
+            metrics.inc("rate_limit_rejections_total", route=route)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Слишком много запросов. Повторите попытку позже.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    def sweep(self) -> int:
+        return self.backend.sweep(self.limits)
+
+
+limiter = RateLimiter()
+
+
+TRUSTED_PROXIES = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES]
+
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    # за nginx реальный адрес клиента приходит в X-Real-IP; от остальных заголовок не принимается
+    host = request.client.host if request.client else "unknown"
+    if is_trusted_proxy(host):
+        return request.headers.get("X-Real-IP") or host
+    return host
+
+
+def rate_limit(route: str, user_dependency: Callable | None = None) -> Callable:
+    if user_dependency is None:
+        def dependency(request: Request) -> None:
+            limiter.check(route, f"ip:{client_ip(request)}")
+    else:
+        def dependency(current_user: Annotated[User, Depends(user_dependency)]) -> None:
+            limiter.check(route, f"user:{current_user.id}")
+    return dependency
+
+
+def rate_limit_by_user(route: str) -> Callable:
+    return rate_limit(route, user_dependency=deps.get_current_user)
@@ -0,0 +1,48 @@
+from typing import Any, Dict, List, Mapping, Sequence
+
+from fastapi import Response, status
+from pydantic import TypeAdapter
+
+# сериализация строк-проекций сразу в JSON-байты (pydantic-core на Rust):
+# без ORM-объектов, без валидации через response_model и без json.dumps
+_rows_adapter = TypeAdapter(List[Dict[str, Any]])
+
+
+def dump_rows(rows: Sequence[Mapping[str, Any]]) -> bytes:
+    return _rows_adapter.dump_json([dict(row) for row in rows])
+
+
+def rows_response(rows: Sequence[Mapping[str, Any]], status_code: int = status.HTTP_200_OK,
+                  headers: Dict[str, str] | None = None) -> Response:
+    return Response(
+        content=dump_rows(rows),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json"
+    )
+
+
+# история пользователя приватна и должна перепроверяться при каждом обращении
+HISTORY_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": HISTORY_CACHE_CONTROL}
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # слабое сравнение (RFC 9110): префикс W/ не учитывается
+    expected = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == expected for candidate in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
@@ -0,0 +1,95 @@
+import bisect
+import datetime
+import threading
+import time
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from crud import crud_catalog, crud_lesson
+
+# (начало, id занятия, id предмета)
+LessonEntry = Tuple[datetime.datetime, int, int]
+
+
+def schedule_now() -> datetime.datetime:
+    return datetime.datetime.now(ZoneInfo(settings.SCHEDULE_TIMEZONE)).replace(tzinfo=None)
+
+
+# Отсортированный по началу список занятий текущего дня в памяти процесса.
+# "Идёт сейчас" = начало в (now - длительность, now], это два bisect: O(log n) без запроса к БД.
+# Индекс пересобирается при смене дня и при изменении версии каталога занятий
+# (сверяется не чаще раза в CATALOG_VERSION_CHECK_SECONDS), вставки из этого процесса
+# добавляются сразу.
+class CurrentLessonIndex:
+    def __init__(self, duration_minutes: int = settings.LESSON_DURATION_MINUTES,
+                 check_interval: float = settings.CATALOG_VERSION_CHECK_SECONDS):
+        self.duration = datetime.timedelta(minutes=duration_minutes)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._day: datetime.date | None = None
+        # (начала, занятия) заменяются целиком, читатели берут снимок без блокировки
+        self._snapshot: Tuple[List[datetime.datetime], List[LessonEntry]] = ([], [])
+        self._by_id: Dict[int, LessonEntry] = {}
+        self._version: int | None = None
+        self._checked_at = 0.0
+
+    def _window(self, day: datetime.date) -> Tuple[datetime.datetime, datetime.datetime]:
+        # занятия, начавшиеся вчера поздно вечером, могут ещё идти после полуночи
+        day_start = datetime.datetime.combine(day, datetime.time.min)
+        return day_start - self.duration, day_start + datetime.timedelta(days=1)
+
+    def _ensure_fresh(self, db: Session, now: datetime.datetime) -> None:
+        if self._day == now.date() and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            version = crud_catalog.get_version(db, crud_lesson.CATALOG_NAME)
+            if self._day != now.date() or version != self._version:
+                self._rebuild(db, now.date())
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def _rebuild(self, db: Session, day: datetime.date) -> None:
+        window_start, window_end = self._window(day)
+        rows = crud_lesson.get_lesson_rows_filtered(db, date_from=window_start, date_to=window_end, limit=None)
+        entries = [(row["date_time"], row["id"], row["subject_id"]) for row in rows]
+        self._snapshot = ([entry[0] for entry in entries], entries)
+        self._by_id = {entry[1]: entry for entry in entries}
+        self._day = day
+
+    def add(self, lesson_id: int, subject_id: int, start: datetime.datetime) -> None:
+        with self._lock:
+            if self._day is None or lesson_id in self._by_id:
+                return
+            window_start, window_end = self._window(self._day)
+            if not window_start <= start < window_end:
+                return
+            entry = (start, lesson_id, subject_id)
+            entries = list(self._snapshot[1])
+            bisect.insort(entries, entry)
+            self._snapshot = ([e[0] for e in entries], entries)
+            self._by_id = {**self._by_id, lesson_id: entry}
+
+    def current(self, db: Session, now: datetime.datetime | None = None,
+                subject_id: int | None = None) -> List[dict]:
+        now = now or schedule_now()
+        self._ensure_fresh(db, now)
+        starts, entries = self._snapshot
+        lo = bisect.bisect_right(starts, now - self.duration)
+        hi = bisect.bisect_right(starts, now)
+        return [
+            {"id": lesson_id, "subject_id": lesson_subject_id, "date_time": start}
+            for start, lesson_id, lesson_subject_id in entries[lo:hi]
+            if subject_id is None or lesson_subject_id == subject_id
+        ]
+
+    def is_current(self, db: Session, lesson_id: int, now: datetime.datetime | None = None) -> bool:
+        now = now or schedule_now()
+        self._ensure_fresh(db, now)
+        entry = self._by_id.get(lesson_id)
+        return entry is not None and now - self.duration < entry[0] <= now
+
+
+current_lessons = CurrentLessonIndex()
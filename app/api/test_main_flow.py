@@ -1,5 +1,24 @@
+import datetime
+
+from fastapi import Request
 from fastapi.testclient import TestClient
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from core.security import create_lesson_qr
+from core.task_queue import CLAIM_QUERY
+from api.catalog_cache import lessons_cache
+from api import attendance_writer
+from api.rate_limit import PostgresRateLimitBackend, client_ip, parse_limit
+from crud import crud_catalog, crud_dashboard, crud_lesson, crud_prediction, crud_user
+from db.base import SessionLocal
+from db.models.attendance import Attendance
+from db.models.idempotency_key import IdempotencyKey
+from db.models.lesson import Lesson
+from db.models.prediction_request import PredictionRequest
+from db.models.rate_limit_bucket import RateLimitBucket
+from db.models.subject import Subject
+from db.replicas import ReplicaRouter
 
 def test_register_user(client: TestClient):
     response = client.post(
@@ -120,4 +139,396 @@ def test_create_prediction_insufficient_funds(client: TestClient, auth_token: st
         json=prediction_input,
     )
     assert response_predict.status_code == 402
-    assert "Недостаточно средств" in response_predict.json()["detail"]
\ No newline at end of file
+    assert "Недостаточно средств" in response_predict.json()["detail"]
+
+def test_create_prediction_idempotent_retry(client: TestClient, auth_token: str):
+    headers = {"Authorization": auth_token, "Idempotency-Key": "retry-key-1"}
+    client.post(
+        f"{settings.API_V1_STR}/users/me/balance/topup",
+        headers={"Authorization": auth_token},
+        json={"amount": settings.PREDICTION_COST + 10},
+    )
+
+    prediction_input = {"input_data": {"feature1": 7.89, "feature2": "retry"}}
+    first = client.post(f"{settings.API_V1_STR}/predictions/", headers=headers, json=prediction_input)
+    assert first.status_code == 202
+    balance_after_first = client.get(f"{settings.API_V1_STR}/users/me", headers=headers).json()["balance"]
+
+    second = client.post(f"{settings.API_V1_STR}/predictions/", headers=headers, json=prediction_input)
+    assert second.status_code == 202
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json()["id"] == first.json()["id"]
+
+    balance_after_second = client.get(f"{settings.API_V1_STR}/users/me", headers=headers).json()["balance"]
+    assert balance_after_second == balance_after_first
+
+    other_input = {"input_data": {"feature1": 0.0, "feature2": "other"}}
+    conflict = client.post(f"{settings.API_V1_STR}/predictions/", headers=headers, json=other_input)
+    assert conflict.status_code == 422
+
+def test_create_prediction_expired_key_reused(client: TestClient, auth_token: str, db_session):
+    headers = {"Authorization": auth_token, "Idempotency-Key": "expired-key-1"}
+    client.post(
+        f"{settings.API_V1_STR}/users/me/balance/topup",
+        headers={"Authorization": auth_token},
+        json={"amount": settings.PREDICTION_COST * 2},
+    )
+    prediction_input = {"input_data": {"feature1": 1.5, "feature2": "expired"}}
+    first = client.post(f"{settings.API_V1_STR}/predictions/", headers=headers, json=prediction_input)
+    assert first.status_code == 202
+
+    # ключ просрочен, но очистка до него ещё не дошла
+    db_session.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key == "expired-key-1")
+        .values(expires_at=datetime.datetime(2000, 1, 1))
+    )
+    second = client.post(f"{settings.API_V1_STR}/predictions/", headers=headers, json=prediction_input)
+    assert second.status_code == 202
+    assert "Idempotent-Replayed" not in second.headers
+    assert second.json()["id"] != first.json()["id"]
+
+def test_create_prediction_publish_failure_refunds(client: TestClient, auth_token: str, task_queue, monkeypatch):
+    headers = {"Authorization": auth_token, "Idempotency-Key": "unsent-key-1"}
+    client.post(
+        f"{settings.API_V1_STR}/users/me/balance/topup",
+        headers={"Authorization": auth_token},
+        json={"amount": settings.PREDICTION_COST},
+    )
+    balance_before = client.get(f"{settings.API_V1_STR}/users/me", headers=headers).json()["balance"]
+
+    def unavailable(task):
+        raise ConnectionError("очередь недоступна")
+
+    monkeypatch.setattr(task_queue, "publish", unavailable)
+    prediction_input = {"input_data": {"feature1": 3.21, "feature2": "unsent"}}
+    failed = client.post(f"{settings.API_V1_STR}/predictions/", headers=headers, json=prediction_input)
+    assert failed.status_code == 503
+    assert client.get(f"{settings.API_V1_STR}/users/me", headers=headers).json()["balance"] == balance_before
+
+    # ключ неотправленной задачи не воспроизводится: повтор создаёт и отправляет новую задачу
+    monkeypatch.delattr(task_queue, "publish")
+    retry = client.post(f"{settings.API_V1_STR}/predictions/", headers=headers, json=prediction_input)
+    assert retry.status_code == 202
+    assert "Idempotent-Replayed" not in retry.headers
+    assert task_queue.pending() == 1
+
+def test_claim_query_bumps_history_and_fails_exhausted_tasks(auth_token: str, db_session):
+    user = crud_user.get_user_by_email(db_session, email="testuser@example.com")
+    version = user.history_version
+    prediction = PredictionRequest(user_id=user.id, input_data={"feature2": "claim"}, status="pending")
+    db_session.add(prediction)
+    db_session.flush()
+    params = {"batch": 10, "lease": 300, "max_attempts": 2}
+
+    def claim():
+        rows = db_session.execute(CLAIM_QUERY, params).all()
+        db_session.refresh(prediction)
+        db_session.refresh(user)
+        return [row.id for row in rows]
+
+    assert claim() == [prediction.id]
+    assert (prediction.status, prediction.attempts) == ("processing", 1)
+    assert user.history_version == version + 1
+    # задача в processing до истечения аренды не забирается
+    assert claim() == []
+
+    # воркер дважды падал с задачей: третий захват помечает её failed
+    for attempt in (2, 3):
+        db_session.execute(
+            update(PredictionRequest)
+            .where(PredictionRequest.id == prediction.id)
+            .values(claimed_at=datetime.datetime(2000, 1, 1))
+        )
+        assert claim() == ([prediction.id] if attempt == 2 else [])
+    assert (prediction.status, prediction.attempts) == ("failed", 3)
+    assert prediction.error_message
+    assert user.history_version == version + 3
+
+def test_transaction_history_conditional_get(client: TestClient, auth_token: str):
+    headers = {"Authorization": auth_token}
+    url = f"{settings.API_V1_STR}/users/me/history/transactions"
+
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    not_modified = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    client.post(f"{settings.API_V1_STR}/users/me/balance/topup", headers=headers, json={"amount": 5})
+    changed = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+def test_dashboard_rows_keep_datetimes(client: TestClient, auth_token: str, db_session):
+    client.post(
+        f"{settings.API_V1_STR}/users/me/balance/topup",
+        headers={"Authorization": auth_token},
+        json={"amount": 5.0},
+    )
+    user = crud_user.get_user_by_email(db_session, email="testuser@example.com")
+    _, transactions = crud_dashboard.get_dashboard_rows(db_session, user_id=user.id)
+    # страница показывает время так же, как до сборки истории через json_agg
+    assert isinstance(transactions[0]["timestamp"], datetime.datetime)
+
+def test_check_in_rejects_invalid_qr(client: TestClient, auth_token: str):
+    headers = {"Authorization": auth_token}
+    url = f"{settings.API_V1_STR}/attendances/check-in"
+
+    qr_code_content = create_lesson_qr(lesson_id=1)
+    tampered = client.post(url, headers=headers, json={"qr_code_content": "2" + qr_code_content[1:]})
+    assert tampered.status_code == 400
+
+    expired = client.post(url, headers=headers, json={"qr_code_content": create_lesson_qr(lesson_id=1, expires_at=0)})
+    assert expired.status_code == 400
+
+    not_running = client.post(url, headers=headers, json={"qr_code_content": qr_code_content})
+    assert not_running.status_code == 409
+
+def test_read_lessons_pages_cached_catalog(client: TestClient, db_session):
+    subject = Subject(name="catalog-pages")
+    db_session.add(subject)
+    db_session.flush()
+    started = datetime.datetime(2026, 2, 2, 9, 0)
+    db_session.add_all([Lesson(subject_id=subject.id, date_time=started + datetime.timedelta(hours=hour))
+                        for hour in range(3)])
+    crud_catalog.bump_version(db_session, crud_lesson.CATALOG_NAME)
+    db_session.flush()
+    lessons_cache.invalidate()
+    url = f"{settings.API_V1_STR}/lessons/"
+
+    catalog = client.get(url).json()
+    assert 3 <= len(catalog) <= 100
+    assert client.get(url, params={"skip": 1, "limit": 2}).json() == catalog[1:3]
+    assert client.get(url, params={"skip": 0, "limit": 2}).json() == catalog[:2]
+    assert client.get(url, params={"limit": 0}).status_code == 422
+
+def test_attendance_writer_drops_only_failing_check_ins(auth_token: str, db_session, monkeypatch):
+    # запись идёт через тестовое соединение; каждая попытка - отдельная точка сохранения
+    monkeypatch.setattr(attendance_writer, "SessionLocal",
+                        sessionmaker(bind=db_session.connection(), join_transaction_mode="create_savepoint"))
+    user = crud_user.get_user_by_email(db_session, email="testuser@example.com")
+    subject = Subject(name="check-in-writer")
+    db_session.add(subject)
+    db_session.flush()
+    lesson = Lesson(subject_id=subject.id, date_time=datetime.datetime(2026, 3, 2, 9, 0))
+    db_session.add(lesson)
+    db_session.flush()
+
+    writer = attendance_writer.AttendanceWriter(batch_size=10)
+    # занятия 0 нет: нарушение внешнего ключа не должно терять соседнюю отметку
+    writer.enqueue(user.id, 0)
+    writer.enqueue(user.id, lesson.id)
+    assert writer.flush() == 1
+    assert writer.flush() == 0
+    attended = db_session.query(Attendance.lesson_id).filter(Attendance.user_id == user.id).all()
+    assert [lesson_id for (lesson_id,) in attended] == [lesson.id]
+
+def superuser_headers(auth_token: str, db_session) -> dict:
+    user = crud_user.get_user_by_email(db_session, email="testuser@example.com")
+    user.is_superuser = True
+    db_session.commit()
+    return {"Authorization": auth_token}
+
+def test_import_timetable_dry_run_and_rejects(client: TestClient, auth_token: str, db_session):
+    headers = superuser_headers(auth_token, db_session)
+    files = {
+        "subjects": ("subjects.csv", "name\nИмпорт\n", "text/csv"),
+        "lessons": ("lessons.csv", "subject_name,date_time\n"
+                                   "Импорт,2026-04-06 10:00\n"
+                                   "Импорт,06.04.2026 25:00\n"
+                                   "Нет такого,2026-04-06 10:00\n", "text/csv"),
+        "attendances": ("attendances.csv", "email,subject_name,date_time,attended\n"
+                                           "testuser@example.com,Импорт,2026-04-06 10:00,true\n"
+                                           "nobody@example.com,Импорт,2026-04-06 10:00,true\n"
+                                           "testuser@example.com,Импорт,2026-04-07 10:00,true\n"
+                                           "testuser@example.com,Импорт,2026-04-06 10:00,false\n", "text/csv"),
+    }
+    url = f"{settings.API_V1_STR}/imports/timetable"
+
+    dry_run = client.post(url, headers=headers, files=files, params={"dry_run": True})
+    assert dry_run.status_code == 200
+    report = dry_run.json()
+    assert report["dry_run"] is True
+    assert report["lessons"] == {"received": 3, "inserted": 1, "updated": 0, "rejected": 2}
+    assert db_session.query(Subject).filter(Subject.name == "Импорт").count() == 0
+
+    response = client.post(url, headers=headers, files=files)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["subjects"]["inserted"] == 1
+    assert report["attendances"] == {"received": 4, "inserted": 1, "updated": 0, "rejected": 2}
+    assert report["rejects"] == [
+        {"file": "attendances", "line": 2, "error": "пользователь не найден"},
+        {"file": "attendances", "line": 3, "error": "занятие не найдено"},
+        {"file": "lessons", "line": 2, "error": "некорректная дата"},
+        {"file": "lessons", "line": 3, "error": "предмет не найден"},
+    ]
+    # пара (студент, занятие) повторяется в файле: записана последняя строка
+    attendance = (
+        db_session.query(Attendance).join(Lesson).join(Subject)
+        .filter(Subject.name == "Импорт").one()
+    )
+    assert attendance.attended is False
+
+def test_import_timetable_malformed_csv(client: TestClient, auth_token: str, db_session):
+    headers = superuser_headers(auth_token, db_session)
+    files = {"lessons": ("timetable.csv", "subject_name,date_time\nИмпорт,2026-04-06 10:00,лишняя\n", "text/csv")}
+    response = client.post(f"{settings.API_V1_STR}/imports/timetable", headers=headers, files=files)
+    assert response.status_code == 400
+    assert "timetable.csv" in response.json()["detail"]
+
+def test_exports_require_superuser(client: TestClient, auth_token: str):
+    response = client.get(
+        f"{settings.API_V1_STR}/exports/transactions",
+        headers={"Authorization": auth_token},
+        params={"format": "ndjson"},
+    )
+    assert response.status_code == 403
+
+def test_prediction_search_requires_superuser(client: TestClient, auth_token: str):
+    response = client.get(
+        f"{settings.API_V1_STR}/predictions/search",
+        headers={"Authorization": auth_token},
+        params={"feature2": "lecture", "min_probability": 0.5},
+    )
+    assert response.status_code == 403
+
+def test_search_prediction_rows_filters(db_session, auth_token: str):
+    user = crud_user.get_user_by_email(db_session, email="testuser@example.com")
+    for feature2, probability in [("search-a", 0.2), ("search-a", 0.5), ("search-a", 0.8),
+                                  ("search-a", 0.9), ("search-b", 0.5)]:
+        db_session.add(PredictionRequest(
+            user_id=user.id, status="completed",
+            input_data={"feature1": 0.0, "feature2": feature2}, result={"probability": probability},
+        ))
+    db_session.flush()
+
+    rows = crud_prediction.search_prediction_rows(db_session, feature2="search-a",
+                                                  min_probability=0.4, max_probability=0.8)
+    assert sorted(row["result"]["probability"] for row in rows) == [0.5, 0.8]
+    assert all(row["input_data"]["feature2"] == "search-a" for row in rows)
+
+def test_client_ip_trusts_real_ip_only_from_proxy():
+    def request(host):
+        return Request({"type": "http", "client": (host, 50000), "headers": [(b"x-real-ip", b"203.0.113.7")]})
+
+    # заголовок от клиента напрямую подделан и не меняет корзину ограничения
+    assert client_ip(request("198.51.100.1")) == "198.51.100.1"
+    assert client_ip(request("127.0.0.1")) == "203.0.113.7"
+
+def test_postgres_rate_limit_sweep_deletes_refilled_buckets():
+    backend = PostgresRateLimitBackend()
+    limit = parse_limit("2/minute")
+    assert backend.acquire("login:ip:sweep-old", limit)[0]
+    assert backend.acquire("login:ip:sweep-new", limit)[0]
+    db = SessionLocal()
+    try:
+        # корзина не трогалась дольше capacity/rate = 60 с и уже полная
+        db.execute(
+            update(RateLimitBucket)
+            .where(RateLimitBucket.key == "login:ip:sweep-old")
+            .values(updated_at=RateLimitBucket.updated_at - datetime.timedelta(seconds=61))
+        )
+        db.commit()
+        assert backend.sweep({"login": limit}, batch_size=1) == 1
+        assert [key for (key,) in db.query(RateLimitBucket.key)] == ["login:ip:sweep-new"]
+        db.query(RateLimitBucket).delete()
+        db.commit()
+    finally:
+        db.close()
+
+class FakeEngine:
+    # движок с одним ответом на любой запрос; исключение в result - недоступный сервер
+    def __init__(self, url, result):
+        self.url = url
+        self.result = result
+
+    def connect(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement, parameters=None):
+        return self
+
+    def scalar(self):
+        return self.result
+
+def test_replica_router_routing_and_fallback():
+    primary = FakeEngine("primary", "0/3000000")
+    router = ReplicaRouter(primary, [], max_lag_seconds=30)
+    fresh, lagging, down, standalone = (
+        FakeEngine("fresh", 0.0), FakeEngine("lagging", 120.0),
+        FakeEngine("down", ConnectionError("нет соединения")), FakeEngine("standalone", None),
+    )
+    router.replicas = [fresh, lagging, down, standalone]
+    # до первой проверки чтения идут в основную БД
+    assert router.engine() is primary
+
+    assert router.check() == 1
+    assert {router.engine() for _ in range(4)} == {fresh}
+
+    lagging.result = 5.0
+    assert router.check() == 2
+    assert {router.engine() for _ in range(4)} == {fresh, lagging}
+
+    # сервер не в режиме реплики (NULL вместо отставания) не считается исправной репликой
+    fresh.result = lagging.result = None
+    assert router.check() == 0
+    assert router.engine() is primary
+
+    # без основной БД состояние реплик не меняется
+    lagging.result = 1.0
+    router.check()
+    primary.result = ConnectionError("основная БД недоступна")
+    assert router.check() == 1
+    assert router.engine() is lagging
+
+def test_prediction_pipeline_in_process(client: TestClient, auth_token: str, db_session, task_queue, worker):
+    # запрос -> оценка -> результат в одном процессе: задачу из очереди в памяти разбирает обработчик воркера
+    headers = {"Authorization": auth_token}
+    user = crud_user.get_user_by_email(db_session, email="testuser@example.com")
+    subject = Subject(name="pipeline")
+    db_session.add(subject)
+    db_session.flush()
+    started = datetime.datetime(2026, 1, 12, 10, 0)
+    for day, attended in enumerate([True, False, True, True]):
+        lesson = Lesson(subject_id=subject.id, date_time=started + datetime.timedelta(days=day))
+        db_session.add(lesson)
+        db_session.flush()
+        db_session.add(Attendance(user_id=user.id, lesson_id=lesson.id, attended=attended))
+    db_session.flush()
+
+    client.post(
+        f"{settings.API_V1_STR}/users/me/balance/topup",
+        headers=headers,
+        json={"amount": settings.PREDICTION_COST},
+    )
+    response = client.post(
+        f"{settings.API_V1_STR}/predictions/",
+        headers=headers,
+        json={"input_data": {"feature1": 2.5, "feature2": "pipeline"}},
+    )
+    assert response.status_code == 202
+    prediction_id = response.json()["id"]
+    assert task_queue.pending() == 1
+
+    task_queue.drain(worker.task_handler(task_queue))
+    assert task_queue.pending() == 0
+    db_session.expire_all()
+
+    response = client.get(f"{settings.API_V1_STR}/predictions/{prediction_id}", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "completed"
+    # встроенная модель - доля посещённых занятий: 3 из 4
+    assert data["result"] == {"probability": 0.75, "model_version": "builtin-ratio"}
@@ -0,0 +1,35 @@
+import argparse
+import json
+import sys
+
+from core.config import settings
+from crud import crud_partition
+from db.base import SessionLocal
+
+
+# Архивация старой истории по месяцам, запускается по расписанию:
+#   python archive_history.py [--retention-months 12] [--dry-run]
+# Каждая секция predictions / transactions старше срока хранения выгружается в
+# <archive-dir>/<таблица>/<ГГГГ-ММ>.ndjson.gz, итоги по пользователям остаются в БД, секция удаляется.
+def main():
+    parser = argparse.ArgumentParser(description="Архивация секций истории предсказаний и транзакций")
+    parser.add_argument("--retention-months", type=int, default=settings.HISTORY_RETENTION_MONTHS)
+    parser.add_argument("--archive-dir", default=settings.HISTORY_ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="только перечислить секции для архивации")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        crud_partition.ensure_partitions(db, settings.PARTITION_PREMAKE_MONTHS)
+        report = crud_partition.archive_old_partitions(
+            db, args.retention_months, args.archive_dir, dry_run=args.dry_run, chunk_size=settings.EXPORT_CHUNK_SIZE
+        )
+    finally:
+        db.close()
+
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
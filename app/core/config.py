@@ -1,7 +1,7 @@
 import os
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List, Literal
 
 load_dotenv()
 
@@ -16,11 +16,76 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "db_test")
     DATABASE_URL: str | None = None
 
+    # пул соединений на процесс; если размер не задан явно, DB_MAX_CONNECTIONS делится между WEB_CONCURRENCY процессами
+    DB_MAX_CONNECTIONS: int = 80
+    DB_POOL_SIZE: int | None = None
+    DB_MAX_OVERFLOW: int | None = None
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: int = 30
+
+    # реплики для чтений, допускающих отставание (аналитика, выгрузки, списки администратора),
+    # в формате JSON-списка URL SQLAlchemy; без реплик всё читается из основной БД
+    DATABASE_REPLICA_URLS: List[str] = []
+    DB_REPLICA_CHECK_INTERVAL_SECONDS: float = 5.0
+    DB_REPLICA_MAX_LAG_SECONDS: float | None = 30.0
+    DB_REPLICA_CONNECT_TIMEOUT: int = 2
+
+    # "development" - один процесс с --reload, "production" - WEB_CONCURRENCY процессов без перезагрузки
+    APP_ENV: str = "development"
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    WEB_CONCURRENCY: int = os.cpu_count() or 1
+    GRACEFUL_SHUTDOWN_TIMEOUT: int = 30
+
+    # как часто процесс сверяет версию каталога предметов/занятий с БД
+    CATALOG_VERSION_CHECK_SECONDS: float = 5.0
+
+    # время занятий хранится без часового пояса, в поясе расписания
+    SCHEDULE_TIMEZONE: str = "Europe/Moscow"
+    LESSON_DURATION_MINUTES: int = 90
+
+    # QR-код отметки подписан HMAC на SECRET_KEY и действует QR_CODE_TTL_SECONDS;
+    # отметки копятся в памяти и пишутся в БД пачками
+    QR_CODE_TTL_SECONDS: int = 60
+    CHECK_IN_BATCH_SIZE: int = 500
+    CHECK_IN_FLUSH_INTERVAL_SECONDS: float = 0.5
+    CHECK_IN_MAX_PENDING: int = 20_000
+
+    # студент в зоне риска по предмету: посещаемость ниже порога при не менее чем N отметках
+    AT_RISK_ATTENDANCE_THRESHOLD: float = 0.7
+    AT_RISK_MIN_LESSONS: int = 3
+
+    # строк на одну пачку серверного курсора при потоковой выгрузке
+    EXPORT_CHUNK_SIZE: int = 5000
+    # сколько отклонённых строк импорта расписания перечислять в отчёте
+    IMPORT_MAX_REJECTS: int = 100
+
+    # predictions и transactions секционированы по месяцам: секции создаются на PARTITION_PREMAKE_MONTHS
+    # вперёд при старте и раз в PARTITION_MAINTENANCE_INTERVAL_SECONDS; месяцы старше HISTORY_RETENTION_MONTHS
+    # выгружаются archive_history.py в сжатые файлы HISTORY_ARCHIVE_DIR с помесячными итогами в БД
+    PARTITION_PREMAKE_MONTHS: int = 3
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 60 * 60 * 6
+    HISTORY_RETENTION_MONTHS: int = 12
+    HISTORY_ARCHIVE_DIR: str = "/archive"
+
+    DASHBOARD_CACHE_MAX_USERS: int = 10_000
+    JINJA_BYTECODE_CACHE_DIR: str = "/tmp/jinja_bytecode_cache"
+
+    # доставка задач воркеру (core/task_queue.py): "rabbitmq" - сообщение в очередь RABBITMQ_QUEUE,
+    # "postgres" - воркер сам забирает строки predictions в статусе pending, разбуженный NOTIFY (без брокера);
+    # очередь в памяти (InProcessTaskQueue) создают только тесты и бенчмарки - в приложении её некому разбирать
+    TASK_BACKEND: Literal["rabbitmq", "postgres"] = "rabbitmq"
+    RABBITMQ_HOST: str = "rabbitmq"
+    RABBITMQ_QUEUE: str = "ml_tasks"
+
     SECRET_KEY: str = os.getenv("SECRET_KEY", "secret123")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24
 
     PASSWORD_HASH_SCHEMES: List[str] = ["bcrypt"]
+    # при изменении стоимости хеши пересчитываются при следующем входе пользователя
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = os.cpu_count() or 1
 
     FIRST_SUPERUSER_EMAIL: str = os.getenv("FIRST_SUPERUSER_EMAIL", "admin@example.com")
     FIRST_SUPERUSER_PASSWORD: str = os.getenv("FIRST_SUPERUSER_PASSWORD", "asd123")
@@ -29,6 +94,27 @@ class Settings(BaseSettings):
 
     PREDICTION_COST: float = 1.0
 
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 60 * 60 * 24
+    IDEMPOTENCY_SWEEP_INTERVAL_SECONDS: int = 60 * 10
+    IDEMPOTENCY_SWEEP_BATCH_SIZE: int = 1000
+
+    RATE_LIMIT_ENABLED: bool = True
+    # "memory" - корзины в памяти процесса, "postgres" - общие для всех воркеров
+    RATE_LIMIT_BACKEND: str = "memory"
+    # лимиты по маршрутам в формате "<запросов>/<second|minute|hour>"
+    RATE_LIMITS: Dict[str, str] = {
+        "login": "10/minute",
+        "register": "5/minute",
+        "predictions": "30/minute",
+    }
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # очистка восстановившихся корзин в БД (RATE_LIMIT_BACKEND=postgres)
+    RATE_LIMIT_SWEEP_INTERVAL_SECONDS: int = 60 * 10
+    RATE_LIMIT_SWEEP_BATCH_SIZE: int = 1000
+    # адреса (или сети CIDR) обратного прокси: только от них принимаются X-Real-IP и X-Forwarded-For,
+    # иначе клиент подменой заголовка обходит ограничения по IP
+    TRUSTED_PROXIES: List[str] = ["127.0.0.1"]
+
     class Config:
         case_sensitive = True
         env_file = '.env'
@@ -39,5 +125,20 @@ class Settings(BaseSettings):
 
         self.DATABASE_URL = f"postgresql+psycopg2://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}/{self.POSTGRES_DB}"
 
+    @property
+    def web_workers(self) -> int:
+        return 1 if self.APP_ENV == "development" else max(1, self.WEB_CONCURRENCY)
+
+    def db_pool_options(self) -> dict:
+        per_process = max(2, self.DB_MAX_CONNECTIONS // self.web_workers)
+        pool_size = self.DB_POOL_SIZE if self.DB_POOL_SIZE is not None else per_process // 2
+        max_overflow = self.DB_MAX_OVERFLOW if self.DB_MAX_OVERFLOW is not None else per_process - pool_size
+        return {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_recycle": self.DB_POOL_RECYCLE,
+            "pool_timeout": self.DB_POOL_TIMEOUT,
+        }
+
 
 settings = Settings()
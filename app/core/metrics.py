@@ -0,0 +1,42 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+# простые счётчики процесса в формате Prometheus (без внешних зависимостей)
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = defaultdict(dict)
+_help: Dict[str, str] = {}
+
+
+def describe(name: str, help_text: str) -> None:
+    _help[name] = help_text
+
+
+def inc(name: str, amount: float = 1.0, **labels: str) -> None:
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        series = _counters[name]
+        series[key] = series.get(key, 0.0) + amount
+
+
+def get(name: str, **labels: str) -> float:
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        return _counters.get(name, {}).get(key, 0.0)
+
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for name, series in sorted(_counters.items()):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                if labels:
+                    label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{name}{{{label_str}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
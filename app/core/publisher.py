@@ -0,0 +1,11 @@
+from core.config import settings
+from core.task_queue import create_task_queue
+from db.base import engine
+
+# очередь, в которую API ставит задачи на предсказание (core/task_queue.py)
+publisher = create_task_queue(
+    settings.TASK_BACKEND,
+    engine=engine,
+    rabbitmq_host=settings.RABBITMQ_HOST,
+    rabbitmq_queue=settings.RABBITMQ_QUEUE,
+)
@@ -1,22 +1,103 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Union
+from typing import Any, Tuple, Union
 
 from jose import jwt
 from passlib.context import CryptContext
 
 from core.config import settings
 
-pwd_context = CryptContext(schemes=settings.PASSWORD_HASH_SCHEMES, deprecated="auto")
+
+def build_password_context(rounds: int) -> CryptContext:
+    # min/max = rounds: хеши с другой стоимостью помечаются как требующие пересчёта
+    return CryptContext(
+        schemes=settings.PASSWORD_HASH_SCHEMES,
+        deprecated="auto",
+        bcrypt__rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+pwd_context = build_password_context(settings.BCRYPT_ROUNDS)
+
+# bcrypt отпускает GIL, поэтому отдельный ограниченный пул потоков масштабируется по ядрам
+# и не занимает event loop и общий threadpool запросов
+_hash_executor: ThreadPoolExecutor | None = None
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash"
+        )
+    return _hash_executor
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, str | None]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, str | None]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_hash_executor(), verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), get_password_hash, password)
+
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=True, cancel_futures=True)
+        _hash_executor = None
+
+
+def _lesson_qr_signature(payload: str) -> str:
+    digest = hmac.new(settings.SECRET_KEY.encode(), b"lesson-qr:" + payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).rstrip(b"=").decode()
+
+
+def create_lesson_qr(lesson_id: int, expires_at: int | None = None) -> str:
+    if expires_at is None:
+        expires_at = int(time.time()) + settings.QR_CODE_TTL_SECONDS
+    payload = f"{lesson_id}.{expires_at}"
+    return f"{payload}.{_lesson_qr_signature(payload)}"
+
+
+def verify_lesson_qr(content: str, now: float | None = None) -> int | None:
+    # "<lesson_id>.<expires_at>.<подпись>", проверяется без обращения к БД
+    try:
+        lesson_id, expires_at, signature = content.split(".")
+        lesson_id_value, expires_at_value = int(lesson_id), int(expires_at)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _lesson_qr_signature(f"{lesson_id}.{expires_at}")):
+        return None
+    if expires_at_value < (now if now is not None else time.time()):
+        return None
+    return lesson_id_value
+
+
 def create_access_token(
         subject: Union[str, Any], expires_delta: timedelta = None
 ) -> str:
@@ -0,0 +1,428 @@
+import abc
+import heapq
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List
+
+import pika
+import psycopg2
+from pika.exceptions import AMQPError
+from sqlalchemy import exc, text
+
+logger = logging.getLogger(__name__)
+
+# Очередь задач на предсказание между API и воркером (TASK_BACKEND):
+#   rabbitmq - сообщения в очереди брокера
+#   postgres - сами строки predictions в статусе pending, воркер будит NOTIFY
+#   InProcessTaskQueue - очередь в памяти процесса без своего потребителя: тесты и бенчмарки
+#                        подменяют ею очередь API и сами вызывают drain с обработчиком воркера
+# У всех одинаковый интерфейс: publish(task) со стороны API (потокобезопасно, не ждёт обработки)
+# и consume(handle, capacity) - цикл приёма воркера. Цикл выполняется в одном потоке, как у pika:
+# handle(task, done), таймеры call_later и колбэки add_callback_threadsafe из других потоков
+# (результаты пула предсказаний) вызываются в нём; done() - задача записана (ack).
+# Модуль не зависит от настроек приложения: его используют и API, и образ воркера.
+
+Task = Dict[str, Any]
+Handler = Callable[[Task, Callable[[], None]], None]
+
+TASK_CHANNEL = "prediction_tasks"
+# пауза между попытками переподключения цикла приёма растёт вдвое до этого предела
+RECONNECT_MAX_SECONDS = 30.0
+
+# Строки забираются пачкой одним UPDATE ... FROM (SELECT ... FOR UPDATE SKIP LOCKED): параллельные
+# воркеры не ждут друг друга и не получают одну строку дважды. Забранные строки переходят в processing
+# с отметкой claimed_at; если воркер упал, строки старше lease_seconds забираются заново.
+# Задача, забранная max_attempts раз и так и не завершённая, помечается failed и воркеру не отдаётся.
+# В том же запросе увеличивается users.history_version владельцев (ETag истории и кеш кабинета);
+# пользователи блокируются по возрастанию id, чтобы параллельные воркеры не получали взаимоблокировок.
+CLAIM_QUERY = text("""
+    WITH claimed AS (
+        SELECT id, "timestamp", attempts FROM predictions
+        WHERE status = 'pending'
+            OR (status = 'processing' AND claimed_at < now() AT TIME ZONE 'UTC' - make_interval(secs => :lease))
+        ORDER BY "timestamp"
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+    ), updated AS (
+        UPDATE predictions SET
+            status = CASE WHEN claimed.attempts >= :max_attempts THEN 'failed' ELSE 'processing' END,
+            error_message = CASE WHEN claimed.attempts >= :max_attempts
+                THEN 'Превышено число попыток обработки задачи' ELSE predictions.error_message END,
+            claimed_at = now() AT TIME ZONE 'UTC',
+            attempts = predictions.attempts + 1
+        FROM claimed
+        WHERE predictions.id = claimed.id AND predictions."timestamp" = claimed."timestamp"
+        RETURNING predictions.id, predictions.user_id, predictions."timestamp", predictions.status
+    ), owners AS (
+        SELECT id FROM users WHERE id IN (SELECT user_id FROM updated) ORDER BY id FOR UPDATE
+    ), bumped AS (
+        UPDATE users SET history_version = history_version + 1 FROM owners WHERE users.id = owners.id
+    )
+    SELECT id, user_id, "timestamp" FROM updated WHERE status = 'processing'
+""")
+
+
+# BlockingConnection не потокобезопасен, поэтому у каждого потока threadpool своё
+# долгоживущее соединение вместо нового TCP+AMQP рукопожатия на каждую задачу
+class RabbitMQTaskQueue:
+    def __init__(self, host: str, queue: str):
+        self.host = host
+        self.queue = queue
+        self._local = threading.local()
+        # RLock: stop() вызывается из обработчика сигнала в том же потоке
+        self._lock = threading.RLock()
+        self._connections: List[pika.BlockingConnection] = []
+        # соединение цикла приёма; таймеры и колбэки до его открытия откладываются
+        self._consumer = None
+        self._pending_timers = []
+        self._pending_callbacks = []
+        self._stopping = False
+
+    def _channel(self):
+        channel = getattr(self._local, "channel", None)
+        if channel is not None and channel.is_open:
+            return channel
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        channel = connection.channel()
+        channel.queue_declare(queue=self.queue)
+        self._local.channel = channel
+        with self._lock:
+            self._connections = [c for c in self._connections if c.is_open]
+            self._connections.append(connection)
+        return channel
+
+    def publish(self, task: Task) -> None:
+        body = json.dumps(task)
+        try:
+            self._channel().basic_publish(exchange='', routing_key=self.queue, body=body)
+        except AMQPError as e:
+            # соединение могло быть закрыто брокером за время простоя - одна попытка переподключения
+            logger.warning(f"Переподключение к RabbitMQ после ошибки публикации: {e}")
+            self._local.channel = None
+            self._channel().basic_publish(exchange='', routing_key=self.queue, body=body)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if self._consumer is None:
+                self._pending_timers.append((delay, callback))
+            else:
+                self._consumer[0].call_later(delay, callback)
+
+    def add_callback_threadsafe(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if self._consumer is None:
+                self._pending_callbacks.append(callback)
+            else:
+                self._consumer[0].add_callback_threadsafe(callback)
+
+    def stop(self) -> None:
+        # текущие сообщения дообрабатываются и подтверждаются, новые не забираются
+        with self._lock:
+            self._stopping = True
+            consumer = self._consumer
+        if consumer is not None:
+            consumer[0].add_callback_threadsafe(consumer[1].stop_consuming)
+
+    def consume(self, handle: Handler, capacity: int | None = None) -> None:
+        in_flight = 0
+
+        def on_message(ch, method, properties, body):
+            nonlocal in_flight
+
+            def done():
+                nonlocal in_flight
+                in_flight -= 1
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+
+            in_flight += 1
+            try:
+                task = json.loads(body)
+            except ValueError:
+                logger.error(f"Неверный формат сообщения: {body}")
+                done()
+                return
+            handle(task, done)
+
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        try:
+            channel = connection.channel()
+            channel.queue_declare(queue=self.queue)
+            # в полёте не больше сообщений, чем может обработать воркер
+            channel.basic_qos(prefetch_count=capacity or 1)
+            channel.basic_consume(queue=self.queue, on_message_callback=on_message)
+            with self._lock:
+                self._consumer = (connection, channel)
+                timers, self._pending_timers = self._pending_timers, []
+                callbacks, self._pending_callbacks = self._pending_callbacks, []
+                stopping = self._stopping
+            for delay, callback in timers:
+                connection.call_later(delay, callback)
+            for callback in callbacks:
+                connection.add_callback_threadsafe(callback)
+            if not stopping:
+                channel.start_consuming()
+            # результаты, пришедшие после остановки приёма, ещё записываются и подтверждаются
+            while in_flight and connection.is_open:
+                connection.process_data_events(time_limit=0.1)
+        finally:
+            with self._lock:
+                self._consumer = None
+                self._stopping = False
+            if connection.is_open:
+                connection.close()
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                if connection.is_open:
+                    connection.close()
+            except AMQPError as e:
+                logger.warning(f"Ошибка при закрытии соединения с RabbitMQ: {e}")
+        self._local = threading.local()
+
+
+class LoopTaskQueue(abc.ABC):
+    # Цикл приёма без брокера: другие потоки будят его через pipe. Наследник задаёт fetch(limit) -
+    # забрать до limit задач, и при необходимости источник уведомлений (_open/_notified/_close).
+    # Ошибки connection_errors из fetch и уведомлений не завершают цикл: источник переоткрывается.
+    connection_errors: tuple = ()
+
+    def __init__(self, batch_size: int = 32, poll_seconds: float | None = None):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._callbacks = queue.SimpleQueue()
+        self._timers = []
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+        self._stopping = False
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_write, b"\0")
+        except BlockingIOError:
+            # pipe полон - цикл и так будет разбужен
+            pass
+
+    def add_callback_threadsafe(self, callback: Callable[[], None]) -> None:
+        self._callbacks.put(callback)
+        self._wake()
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        heapq.heappush(self._timers, (time.monotonic() + delay, id(callback), callback))
+
+    def stop(self) -> None:
+        # из обработчика сигнала: новые задачи не забираются, начатые дообрабатываются
+        self._stopping = True
+        self._wake()
+
+    @abc.abstractmethod
+    def fetch(self, limit: int) -> List[Task]:
+        ...
+
+    def _open(self) -> List[Any]:
+        # объекты для select, кроме pipe
+        return []
+
+    def _notified(self, readable: List[Any]) -> bool:
+        return False
+
+    def _close(self) -> None:
+        pass
+
+    def _reconnect(self, error: Exception) -> List[Any]:
+        self._close()
+        delay = 1.0
+        while True:
+            logger.warning(f"Соединение очереди задач потеряно: {error}; повтор через {delay:.0f} с")
+            # колбэки и таймеры задач в полёте выполняются и во время ожидания
+            deadline = time.monotonic() + delay
+            while not self._stopping and time.monotonic() < deadline:
+                self._run_due()
+                self._wait([], deadline - time.monotonic())
+            if self._stopping:
+                return []
+            try:
+                sources = self._open()
+            except self.connection_errors as e:
+                error = e
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+                continue
+            logger.info("Соединение очереди задач восстановлено")
+            return sources
+
+    def _run_due(self) -> None:
+        while True:
+            try:
+                callback = self._callbacks.get_nowait()
+            except queue.Empty:
+                break
+            callback()
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, callback = heapq.heappop(self._timers)
+            callback()
+
+    def _wait(self, sources: List[Any], timeout: float | None) -> bool:
+        if self._timers:
+            until_timer = max(0.0, self._timers[0][0] - time.monotonic())
+            timeout = until_timer if timeout is None else min(timeout, until_timer)
+        readable, _, _ = select.select([*sources, self._wake_read], [], [], timeout)
+        if self._wake_read in readable:
+            try:
+                while os.read(self._wake_read, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+        return self._notified(readable)
+
+    def consume(self, handle: Handler, capacity: int | None = None, until_idle: bool = False) -> None:
+        # в работе не больше capacity задач; until_idle - вернуться, когда очередь пуста и всё начатое записано
+        capacity = capacity or self.batch_size
+        in_flight = 0
+
+        def done():
+            nonlocal in_flight
+            in_flight -= 1
+
+        sources = self._open()
+        try:
+            # задачи, поставленные до запуска цикла, забираются сразу
+            maybe_pending = True
+            next_poll = time.monotonic() + self.poll_seconds if self.poll_seconds else None
+            while not (self._stopping and in_flight == 0):
+                self._run_due()
+                free = capacity - in_flight
+                if maybe_pending and free > 0 and not self._stopping:
+                    limit = min(self.batch_size, free)
+                    try:
+                        tasks = self.fetch(limit)
+                    except self.connection_errors as e:
+                        sources = self._reconnect(e)
+                        continue
+                    # полная пачка - в очереди могут остаться задачи, забираются по мере освобождения мест
+                    maybe_pending = len(tasks) == limit
+                    for task in tasks:
+                        in_flight += 1
+                        handle(task, done)
+                    if maybe_pending and in_flight < capacity:
+                        continue
+                if until_idle and not maybe_pending and in_flight == 0:
+                    break
+                timeout = max(0.0, next_poll - time.monotonic()) if next_poll is not None else None
+                try:
+                    notified = self._wait(sources, timeout)
+                except self.connection_errors as e:
+                    sources = self._reconnect(e)
+                    # уведомления, отправленные без соединения, потеряны: очередь проверяется сразу
+                    notified = True
+                if notified:
+                    maybe_pending = True
+                if next_poll is not None and time.monotonic() >= next_poll:
+                    maybe_pending = True
+                    next_poll = time.monotonic() + self.poll_seconds
+        finally:
+            self._stopping = False
+            self._close()
+
+    def drain(self, handle: Handler, capacity: int | None = None) -> None:
+        # обработать всё, что уже поставлено, в текущем потоке и вернуться - детерминированно для тестов
+        self.consume(handle, capacity, until_idle=True)
+
+    def close(self) -> None:
+        pass
+
+
+class InProcessTaskQueue(LoopTaskQueue):
+    # publish не блокируется и не ходит в сеть, поэтому безопасен и из потока событий asyncio
+    def __init__(self, batch_size: int = 32):
+        super().__init__(batch_size=batch_size)
+        self._tasks = deque()
+        self._lock = threading.Lock()
+
+    def publish(self, task: Task) -> None:
+        with self._lock:
+            self._tasks.append(task)
+        self._wake()
+
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def fetch(self, limit: int) -> List[Task]:
+        with self._lock:
+            return [self._tasks.popleft() for _ in range(min(limit, len(self._tasks)))]
+
+    def _notified(self, readable: List[Any]) -> bool:
+        return bool(self._tasks)
+
+
+class PostgresTaskQueue(LoopTaskQueue):
+    # Уведомление только будит воркер, поэтому потерянный NOTIFY (переподключение, перезапуск)
+    # не теряет задачу: раз в poll_seconds очередь проверяется и без уведомлений.
+    connection_errors = (exc.OperationalError, exc.InterfaceError, psycopg2.OperationalError, psycopg2.InterfaceError)
+
+    def __init__(self, engine, batch_size: int = 32, lease_seconds: float = 300, poll_seconds: float = 5,
+                 max_attempts: int = 3):
+        super().__init__(batch_size=batch_size, poll_seconds=poll_seconds)
+        self.engine = engine
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._raw = None
+
+    def publish(self, task: Task) -> None:
+        # задача - сама строка в статусе pending, воркер уже разбужен NOTIFY при фиксации транзакции
+        pass
+
+    def fetch(self, limit: int) -> List[Task]:
+        with self.engine.begin() as connection:
+            rows = connection.execute(
+                CLAIM_QUERY, {"batch": limit, "lease": self.lease_seconds, "max_attempts": self.max_attempts}
+            ).all()
+        return [
+            {"prediction_id": row.id, "user_id": row.user_id, "created_at": row.timestamp.isoformat()}
+            for row in rows
+        ]
+
+    def _open(self) -> List[Any]:
+        self._raw = self.engine.raw_connection()
+        listener = self._raw.driver_connection
+        listener.autocommit = True
+        with listener.cursor() as cursor:
+            cursor.execute(f"LISTEN {TASK_CHANNEL}")
+        return [listener]
+
+    def _notified(self, readable: List[Any]) -> bool:
+        if self._raw is None:
+            return False
+        listener = self._raw.driver_connection
+        if listener not in readable:
+            return False
+        listener.poll()
+        notified = bool(listener.notifies)
+        listener.notifies.clear()
+        return notified
+
+    def _close(self) -> None:
+        # соединение с LISTEN и autocommit не возвращается в пул
+        if self._raw is not None:
+            self._raw.invalidate()
+            self._raw = None
+
+
+def create_task_queue(backend: str, *, engine=None, rabbitmq_host: str = "rabbitmq",
+                      rabbitmq_queue: str = "ml_tasks", batch_size: int = 32,
+                      lease_seconds: float = 300, poll_seconds: float = 5, max_attempts: int = 3):
+    if backend == "rabbitmq":
+        return RabbitMQTaskQueue(host=rabbitmq_host, queue=rabbitmq_queue)
+    if backend == "postgres":
+        return PostgresTaskQueue(engine, batch_size=batch_size, lease_seconds=lease_seconds,
+                                 poll_seconds=poll_seconds, max_attempts=max_attempts)
+    raise ValueError(f"Неизвестный способ доставки задач: {backend}")
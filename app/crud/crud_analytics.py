@@ -0,0 +1,160 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, cast, Float, Integer, RowMapping
+from typing import Sequence
+import datetime
+
+from db.models.attendance_stats import AttendanceLessonStats, AttendanceStudentStats
+from db.models.lesson import Lesson
+from db.models.shadow_prediction import ShadowPrediction
+from db.models.student_score import StudentScore
+from db.models.subject import Subject
+from db.models.user import User
+
+
+def _rate(attended, total):
+    return cast(attended, Float) / func.nullif(total, 0, type_=Float)
+
+
+def _lesson_period_filter(stmt, subject_id: int | None, date_from: datetime.datetime | None,
+                          date_to: datetime.datetime | None):
+    if subject_id is not None:
+        stmt = stmt.where(Lesson.subject_id == subject_id)
+    if date_from is not None:
+        stmt = stmt.where(Lesson.date_time >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Lesson.date_time < date_to)
+    return stmt
+
+
+def get_subject_rates(db: Session) -> Sequence[RowMapping]:
+    total = func.sum(AttendanceLessonStats.total_count)
+    attended = func.sum(AttendanceLessonStats.attended_count)
+    stmt = (
+        select(
+            Subject.id.label("subject_id"),
+            Subject.name.label("subject_name"),
+            func.count(Lesson.id).label("lessons"),
+            total.label("total"),
+            attended.label("attended"),
+            _rate(attended, total).label("attendance_rate"),
+        )
+        .join(Lesson, Lesson.subject_id == Subject.id)
+        .join(AttendanceLessonStats, AttendanceLessonStats.lesson_id == Lesson.id)
+        .group_by(Subject.id, Subject.name)
+        .order_by(Subject.id)
+    )
+    return db.execute(stmt).mappings().all()
+
+
+def get_lesson_rates(db: Session, subject_id: int | None = None,
+                     date_from: datetime.datetime | None = None, date_to: datetime.datetime | None = None,
+                     skip: int = 0, limit: int = 100) -> Sequence[RowMapping]:
+    stmt = select(
+        Lesson.id.label("lesson_id"),
+        Lesson.subject_id,
+        Lesson.date_time,
+        AttendanceLessonStats.total_count.label("total"),
+        AttendanceLessonStats.attended_count.label("attended"),
+        _rate(AttendanceLessonStats.attended_count, AttendanceLessonStats.total_count).label("attendance_rate"),
+    ).join(AttendanceLessonStats, AttendanceLessonStats.lesson_id == Lesson.id)
+    stmt = _lesson_period_filter(stmt, subject_id, date_from, date_to)
+    stmt = stmt.order_by(Lesson.date_time.desc(), Lesson.id.desc()).offset(skip).limit(limit)
+    return db.execute(stmt).mappings().all()
+
+
+def get_weekly_rates(db: Session, subject_id: int | None = None,
+                     date_from: datetime.datetime | None = None,
+                     date_to: datetime.datetime | None = None) -> Sequence[RowMapping]:
+    week = func.date_trunc("week", Lesson.date_time)
+    total = func.sum(AttendanceLessonStats.total_count)
+    attended = func.sum(AttendanceLessonStats.attended_count)
+    stmt = select(
+        week.label("week_start"),
+        total.label("total"),
+        attended.label("attended"),
+        _rate(attended, total).label("attendance_rate"),
+    ).join(AttendanceLessonStats, AttendanceLessonStats.lesson_id == Lesson.id)
+    stmt = _lesson_period_filter(stmt, subject_id, date_from, date_to)
+    stmt = stmt.group_by(week).order_by(week)
+    return db.execute(stmt).mappings().all()
+
+
+def get_at_risk_students(db: Session, threshold: float, min_lessons: int, subject_id: int | None = None,
+                         skip: int = 0, limit: int = 100) -> Sequence[RowMapping]:
+    rate = _rate(AttendanceStudentStats.attended_count, AttendanceStudentStats.total_count)
+    stmt = (
+        select(
+            AttendanceStudentStats.user_id,
+            User.email,
+            AttendanceStudentStats.subject_id,
+            Subject.name.label("subject_name"),
+            AttendanceStudentStats.total_count.label("total"),
+            AttendanceStudentStats.attended_count.label("attended"),
+            rate.label("attendance_rate"),
+        )
+        .join(User, User.id == AttendanceStudentStats.user_id)
+        .join(Subject, Subject.id == AttendanceStudentStats.subject_id)
+        .where(AttendanceStudentStats.total_count >= min_lessons, rate < threshold)
+    )
+    if subject_id is not None:
+        stmt = stmt.where(AttendanceStudentStats.subject_id == subject_id)
+    stmt = stmt.order_by(rate, AttendanceStudentStats.user_id).offset(skip).limit(limit)
+    return db.execute(stmt).mappings().all()
+
+
+def get_student_scores(db: Session, max_probability: float, skip: int = 0, limit: int = 100) -> Sequence[RowMapping]:
+    stmt = (
+        select(
+            StudentScore.user_id,
+            User.email,
+            StudentScore.probability,
+            StudentScore.attended_count,
+            StudentScore.total_count,
+            StudentScore.scored_at,
+            StudentScore.model_version,
+        )
+        .join(User, User.id == StudentScore.user_id)
+        .where(StudentScore.probability <= max_probability)
+        .order_by(StudentScore.probability, StudentScore.user_id)
+        .offset(skip)
+        .limit(limit)
+    )
+    return db.execute(stmt).mappings().all()
+
+
+def get_shadow_report(db: Session, date_from: datetime.datetime | None = None,
+                      date_to: datetime.datetime | None = None,
+                      threshold: float = 0.5) -> Sequence[RowMapping]:
+    # согласие = обе модели по одну сторону порога; сравниваются только досчитанные теневые оценки
+    completed = ShadowPrediction.status == "completed"
+    agreed = (ShadowPrediction.primary_probability >= threshold) == (ShadowPrediction.shadow_probability >= threshold)
+    compared = func.count().filter(completed)
+
+    def p95(column):
+        return func.percentile_cont(0.95).within_group(column)
+
+    stmt = select(
+        ShadowPrediction.primary_version,
+        ShadowPrediction.shadow_version,
+        func.count().label("total"),
+        compared.label("compared"),
+        func.count().filter(ShadowPrediction.status == "timeout").label("timeouts"),
+        func.count().filter(ShadowPrediction.status == "failed").label("failures"),
+        _rate(func.sum(cast(agreed, Integer)).filter(completed), compared).label("agreement_rate"),
+        func.avg(func.abs(ShadowPrediction.primary_probability - ShadowPrediction.shadow_probability))
+        .filter(completed).label("mean_abs_diff"),
+        func.avg(ShadowPrediction.primary_latency_ms).label("primary_latency_avg_ms"),
+        p95(ShadowPrediction.primary_latency_ms).label("primary_latency_p95_ms"),
+        func.avg(ShadowPrediction.shadow_latency_ms).label("shadow_latency_avg_ms"),
+        p95(ShadowPrediction.shadow_latency_ms).label("shadow_latency_p95_ms"),
+        func.min(ShadowPrediction.created_at).label("first_at"),
+        func.max(ShadowPrediction.created_at).label("last_at"),
+    )
+    if date_from is not None:
+        stmt = stmt.where(ShadowPrediction.created_at >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(ShadowPrediction.created_at < date_to)
+    stmt = stmt.group_by(ShadowPrediction.primary_version, ShadowPrediction.shadow_version).order_by(
+        func.max(ShadowPrediction.created_at).desc()
+    )
+    return db.execute(stmt).mappings().all()
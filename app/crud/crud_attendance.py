@@ -1,8 +1,12 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select, text, RowMapping
+from typing import Iterator, List, Optional, Sequence, Tuple
+import datetime
 
 from db.models.attendance import Attendance
+from db.models.lesson import Lesson
 from schemas.attendance import AttendanceBase as AttendanceCreate
+from crud import crud_user
 
 def get_attendance(db: Session, attendance_id: int) -> Optional[Attendance]:
     return db.query(Attendance).filter(Attendance.id == attendance_id).first()
@@ -13,9 +17,50 @@ def get_attendances(db: Session, skip: int = 0, limit: int = 100) -> List[Attend
 def create_attendance(db: Session, attendance: AttendanceCreate) -> Attendance:
     db_attendance = Attendance(**attendance.dict())
     db.add(db_attendance)
+    crud_user.bump_history_version(db, attendance.user_id)
     db.commit()
     db.refresh(db_attendance)
     return db_attendance
 
+def check_in_many(db: Session, check_ins: Sequence[Tuple[int, int]]) -> int:
+    # пачка отметок (user_id, lesson_id) одним запросом: недостающие записи вставляются, существующие
+    # (например, созданные с attended=false) отмечаются; уникальный индекс не даёт процессам вставить дубль
+    user_ids = [user_id for user_id, _ in check_ins]
+    lesson_ids = [lesson_id for _, lesson_id in check_ins]
+    result = db.execute(text("""
+        INSERT INTO attendances (user_id, lesson_id, attended)
+        SELECT DISTINCT c.user_id, c.lesson_id, true
+        FROM unnest(CAST(:user_ids AS integer[]), CAST(:lesson_ids AS integer[])) AS c(user_id, lesson_id)
+        ON CONFLICT (user_id, lesson_id) DO UPDATE SET attended = true
+        WHERE attendances.attended IS NOT TRUE
+    """), {"user_ids": user_ids, "lesson_ids": lesson_ids})
+    crud_user.bump_history_versions(db, sorted(set(user_ids)))
+    db.commit()
+    return result.rowcount
+
+# колонки выгрузки посещаемости: отметка вместе с предметом и временем занятия
+ATTENDANCE_EXPORT_COLUMNS = (
+    Attendance.id,
+    Attendance.user_id,
+    Attendance.lesson_id,
+    Lesson.subject_id,
+    Lesson.date_time,
+    Attendance.attended,
+)
+
+def iter_attendance_rows(db: Session, date_from: datetime.datetime | None = None,
+                         date_to: datetime.datetime | None = None, subject_id: int | None = None,
+                         chunk_size: int = 5000) -> Iterator[Sequence[RowMapping]]:
+    # выборка по chunk_size строк через серверный курсор, как в crud_prediction.iter_prediction_rows
+    stmt = select(*ATTENDANCE_EXPORT_COLUMNS).join(Lesson, Lesson.id == Attendance.lesson_id)
+    if subject_id is not None:
+        stmt = stmt.where(Lesson.subject_id == subject_id)
+    if date_from is not None:
+        stmt = stmt.where(Lesson.date_time >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Lesson.date_time < date_to)
+    stmt = stmt.order_by(Attendance.id)
+    yield from db.execute(stmt.execution_options(yield_per=chunk_size)).mappings().partitions()
+
 def get_attendance_history(db: Session, user_id: int) -> List[Attendance]:
     return db.query(Attendance).filter(Attendance.user_id == user_id).all()
\ No newline at end of file
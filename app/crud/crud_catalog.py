@@ -0,0 +1,20 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from db.models.catalog_version import CatalogVersion
+
+
+def get_version(db: Session, name: str) -> int:
+    version = db.execute(select(CatalogVersion.version).where(CatalogVersion.name == name)).scalar()
+    return version or 0
+
+
+def bump_version(db: Session, name: str) -> None:
+    # выполняется в транзакции изменения каталога, коммитит вызывающий код
+    stmt = insert(CatalogVersion).values(name=name, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CatalogVersion.name],
+        set_={"version": CatalogVersion.version + 1}
+    )
+    db.execute(stmt)
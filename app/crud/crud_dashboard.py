@@ -0,0 +1,53 @@
+import datetime
+
+from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, select, func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from typing import Any, Dict, List, Tuple
+
+from db.models.prediction_request import PredictionRequest
+from db.models.transaction import Transaction
+from crud.crud_prediction import PREDICTION_COLUMNS
+from crud.crud_transaction import TRANSACTION_COLUMNS
+
+
+def _json_rows(name: str, columns, where, order_by, limit: int):
+    # подзапрос с последними строками, свёрнутый в один JSON-массив на стороне Postgres
+    rows = (
+        select(*(column.label(column.key) for column in columns))
+        .where(*where)
+        .order_by(order_by.desc())
+        .limit(limit)
+        .subquery(name)
+    )
+    row_value = literal_column(rows.name)
+    return (
+        select(func.coalesce(
+            func.json_agg(aggregate_order_by(row_value, rows.c[order_by.key].desc())),
+            literal_column("'[]'::json")
+        ))
+        .select_from(rows)
+        .scalar_subquery()
+    )
+
+
+def _parse_datetimes(rows: List[Dict[str, Any]], columns) -> List[Dict[str, Any]]:
+    # json_agg отдаёт время строкой ISO: в шаблон уходят datetime, как при выборке строк ORM
+    keys = [column.key for column in columns if isinstance(column.type, DateTime)]
+    for row in rows:
+        for key in keys:
+            if row[key] is not None:
+                row[key] = datetime.datetime.fromisoformat(row[key])
+    return rows
+
+
+def get_dashboard_rows(db: Session, user_id: int, all_predictions: bool = False,
+                       limit: int = 100) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # история предсказаний и транзакций за один запрос к БД вместо двух
+    prediction_filter = [] if all_predictions else [PredictionRequest.user_id == user_id]
+    stmt = select(
+        _json_rows("prediction_rows", PREDICTION_COLUMNS, prediction_filter, PredictionRequest.timestamp_created, limit),
+        _json_rows("transaction_rows", TRANSACTION_COLUMNS, [Transaction.user_id == user_id], Transaction.timestamp, limit),
+    )
+    predictions, transactions = db.execute(stmt).one()
+    return _parse_datetimes(predictions, PREDICTION_COLUMNS), _parse_datetimes(transactions, TRANSACTION_COLUMNS)
@@ -0,0 +1,73 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
+from typing import Any, Dict, Optional
+import datetime
+import hashlib
+import json
+
+from db.models.idempotency_key import IdempotencyKey
+from core.config import settings
+
+
+def hash_request(payload: Dict[str, Any]) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def get_active_key(db: Session, *, user_id: int, key: str) -> Optional[IdempotencyKey]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (
+        db.query(IdempotencyKey)
+        .filter(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at > now
+        )
+        .first()
+    )
+
+
+def create_key(db: Session, *, user_id: int, key: str, request_hash: str, prediction_request_id: int,
+               response_body: Dict[str, Any]) -> IdempotencyKey:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    # просроченный, но ещё не удалённый очисткой ключ держит уникальность (user_id, key)
+    db.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.expires_at <= now)
+    )
+    db_key = IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_hash=request_hash,
+        prediction_request_id=prediction_request_id,
+        response_body=response_body,
+        created_at=now,
+        expires_at=now + datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+    )
+    db.add(db_key)
+    # flush, чтобы конфликт уникальности всплыл до списания средств и публикации задачи
+    db.flush()
+    return db_key
+
+
+def delete_key(db: Session, *, user_id: int, key: str) -> None:
+    db.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key))
+
+
+def delete_expired_keys(db: Session, batch_size: int | None = None) -> int:
+    batch_size = batch_size or settings.IDEMPOTENCY_SWEEP_BATCH_SIZE
+    now = datetime.datetime.now(datetime.timezone.utc)
+    deleted = 0
+    while True:
+        # удаляем пачками по индексу expires_at, чтобы не держать длинные блокировки
+        expired_ids = (
+            select(IdempotencyKey.id)
+            .where(IdempotencyKey.expires_at <= now)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(expired_ids)))
+        db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
@@ -0,0 +1,196 @@
+import psycopg2
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Any, BinaryIO, Dict, List
+
+from crud import crud_catalog, crud_lesson, crud_subject
+
+# Импорт расписания и списков студентов из CSV (с заголовком):
+#   subjects.csv     name
+#   lessons.csv      subject_name, date_time
+#   attendances.csv  email, subject_name, date_time, attended (пусто = false)
+# Файлы грузятся COPY во временные таблицы, проверка ссылок и вставка идут целыми множествами,
+# всё в одной транзакции. Отклонённые строки отчёта нумеруются по строкам данных (без заголовка).
+
+_STAGING_DDL = [
+    """
+    CREATE TEMP TABLE import_subjects (
+        line bigint GENERATED ALWAYS AS IDENTITY, name text, error text
+    ) ON COMMIT DROP
+    """,
+    """
+    CREATE TEMP TABLE import_lessons (
+        line bigint GENERATED ALWAYS AS IDENTITY, subject_name text, date_time text,
+        subject_id integer, error text
+    ) ON COMMIT DROP
+    """,
+    """
+    CREATE TEMP TABLE import_attendances (
+        line bigint GENERATED ALWAYS AS IDENTITY, email text, subject_name text, date_time text, attended text,
+        user_id integer, lesson_id integer, error text
+    ) ON COMMIT DROP
+    """,
+]
+
+_COPY = {
+    "subjects": "COPY import_subjects (name) FROM STDIN WITH (FORMAT csv, HEADER true)",
+    "lessons": "COPY import_lessons (subject_name, date_time) FROM STDIN WITH (FORMAT csv, HEADER true)",
+    "attendances": (
+        "COPY import_attendances (email, subject_name, date_time, attended) "
+        "FROM STDIN WITH (FORMAT csv, HEADER true)"
+    ),
+}
+
+_VALIDATE_SUBJECTS = [
+    "UPDATE import_subjects SET error = 'пустое название' WHERE coalesce(trim(name), '') = ''",
+]
+
+_VALIDATE_LESSONS = [
+    """
+    UPDATE import_lessons SET error = 'некорректная дата'
+    WHERE NOT pg_input_is_valid(coalesce(date_time, ''), 'timestamp')
+    """,
+    """
+    UPDATE import_lessons i SET subject_id = s.id
+    FROM subjects s WHERE s.name = trim(i.subject_name)
+    """,
+    "UPDATE import_lessons SET error = 'предмет не найден' WHERE error IS NULL AND subject_id IS NULL",
+]
+
+_VALIDATE_ATTENDANCES = [
+    """
+    UPDATE import_attendances SET error = 'некорректная дата'
+    WHERE NOT pg_input_is_valid(coalesce(date_time, ''), 'timestamp')
+    """,
+    """
+    UPDATE import_attendances SET error = 'некорректное значение attended'
+    WHERE error IS NULL AND coalesce(trim(attended), '') <> '' AND NOT pg_input_is_valid(trim(attended), 'boolean')
+    """,
+    """
+    UPDATE import_attendances i SET user_id = u.id
+    FROM users u WHERE u.email = trim(i.email)
+    """,
+    "UPDATE import_attendances SET error = 'пользователь не найден' WHERE error IS NULL AND user_id IS NULL",
+    """
+    UPDATE import_attendances i SET lesson_id = l.id
+    FROM lessons l JOIN subjects s ON s.id = l.subject_id
+    WHERE i.error IS NULL AND s.name = trim(i.subject_name) AND l.date_time = i.date_time::timestamp
+    """,
+    "UPDATE import_attendances SET error = 'занятие не найдено' WHERE error IS NULL AND lesson_id IS NULL",
+]
+
+_INSERT_SUBJECTS = """
+    INSERT INTO subjects (name)
+    SELECT DISTINCT trim(name) FROM import_subjects WHERE error IS NULL
+    ON CONFLICT (name) DO NOTHING
+"""
+
+_INSERT_LESSONS = """
+    INSERT INTO lessons (subject_id, date_time)
+    SELECT DISTINCT i.subject_id, i.date_time::timestamp FROM import_lessons i
+    WHERE i.error IS NULL AND NOT EXISTS (
+        SELECT 1 FROM lessons l WHERE l.subject_id = i.subject_id AND l.date_time = i.date_time::timestamp
+    )
+"""
+
+# при повторе пары (студент, занятие) в файле побеждает последняя строка
+_RESOLVED_ATTENDANCES = """
+    CREATE TEMP TABLE import_attendances_resolved ON COMMIT DROP AS
+    SELECT DISTINCT ON (user_id, lesson_id)
+        user_id, lesson_id, coalesce(nullif(trim(attended), '')::boolean, false) AS attended
+    FROM import_attendances WHERE error IS NULL
+    ORDER BY user_id, lesson_id, line DESC
+"""
+
+_UPDATE_ATTENDANCES = """
+    UPDATE attendances a SET attended = r.attended
+    FROM import_attendances_resolved r
+    WHERE a.user_id = r.user_id AND a.lesson_id = r.lesson_id AND a.attended IS DISTINCT FROM r.attended
+"""
+
+# блокировка импорта не останавливает отметки студентов: если отметка успела вставить строку
+# после _UPDATE_ATTENDANCES, конфликт не ломает импорт, а отметка посещения не снимается
+_INSERT_ATTENDANCES = """
+    INSERT INTO attendances (user_id, lesson_id, attended)
+    SELECT r.user_id, r.lesson_id, r.attended FROM import_attendances_resolved r
+    WHERE NOT EXISTS (SELECT 1 FROM attendances a WHERE a.user_id = r.user_id AND a.lesson_id = r.lesson_id)
+    ON CONFLICT (user_id, lesson_id) DO UPDATE SET attended = true
+    WHERE EXCLUDED.attended AND attendances.attended IS NOT TRUE
+"""
+
+_BUMP_HISTORY_VERSIONS = """
+    UPDATE users SET history_version = history_version + 1
+    WHERE id IN (SELECT DISTINCT user_id FROM import_attendances_resolved)
+"""
+
+
+class ImportFileError(ValueError):
+    # файл не разбирается как CSV нужного формата (например, лишние или недостающие колонки)
+    def __init__(self, name: str, message: str):
+        super().__init__(message)
+        self.name = name
+
+
+def _execute(db: Session, statements: List[str]) -> None:
+    for statement in statements:
+        db.execute(text(statement))
+
+
+def _counts(db: Session, table: str) -> Dict[str, int]:
+    received, rejected = db.execute(text(
+        f"SELECT count(*), count(*) FILTER (WHERE error IS NOT NULL) FROM {table}"
+    )).one()
+    return {"received": received, "rejected": rejected, "inserted": 0, "updated": 0}
+
+
+def import_timetable(db: Session, files: Dict[str, BinaryIO], dry_run: bool = False,
+                     max_rejects: int = 100) -> Dict[str, Any]:
+    # импорты сериализуются, чтобы параллельный импорт не вставил те же занятия дважды
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext('timetable_import'))"))
+    _execute(db, _STAGING_DDL)
+
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    try:
+        for name, file in files.items():
+            try:
+                cursor.copy_expert(_COPY[name], file)
+            except psycopg2.DataError as e:
+                db.rollback()
+                # в контексте ошибки COPY указан номер строки файла
+                raise ImportFileError(name, f"{e.diag.message_primary} ({e.diag.context})") from e
+    finally:
+        cursor.close()
+
+    # предметы вставляются до проверки занятий, чтобы занятия могли ссылаться на новые предметы
+    _execute(db, _VALIDATE_SUBJECTS)
+    report: Dict[str, Any] = {"subjects": _counts(db, "import_subjects")}
+    report["subjects"]["inserted"] = db.execute(text(_INSERT_SUBJECTS)).rowcount
+
+    _execute(db, _VALIDATE_LESSONS)
+    report["lessons"] = _counts(db, "import_lessons")
+    report["lessons"]["inserted"] = db.execute(text(_INSERT_LESSONS)).rowcount
+
+    _execute(db, _VALIDATE_ATTENDANCES)
+    report["attendances"] = _counts(db, "import_attendances")
+    _execute(db, [_RESOLVED_ATTENDANCES])
+    report["attendances"]["updated"] = db.execute(text(_UPDATE_ATTENDANCES)).rowcount
+    report["attendances"]["inserted"] = db.execute(text(_INSERT_ATTENDANCES)).rowcount
+    _execute(db, [_BUMP_HISTORY_VERSIONS])
+
+    report["rejects"] = [dict(row) for row in db.execute(text("""
+        SELECT 'subjects' AS file, line, error FROM import_subjects WHERE error IS NOT NULL
+        UNION ALL SELECT 'lessons', line, error FROM import_lessons WHERE error IS NOT NULL
+        UNION ALL SELECT 'attendances', line, error FROM import_attendances WHERE error IS NOT NULL
+        ORDER BY file, line LIMIT :limit
+    """), {"limit": max_rejects}).mappings()]
+    report["dry_run"] = dry_run
+
+    if dry_run:
+        db.rollback()
+        return report
+    if report["subjects"]["inserted"]:
+        crud_catalog.bump_version(db, crud_subject.CATALOG_NAME)
+    if report["lessons"]["inserted"]:
+        crud_catalog.bump_version(db, crud_lesson.CATALOG_NAME)
+    db.commit()
+    return report
@@ -1,8 +1,13 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select, RowMapping
+from typing import List, Optional, Sequence
+import datetime
 
 from db.models.lesson import Lesson
 from schemas.lesson import LessonCreate
+from crud import crud_catalog
+
+CATALOG_NAME = "lessons"
 
 def get_lesson(db: Session, lesson_id: int) -> Optional[Lesson]:
     return db.query(Lesson).filter(Lesson.id == lesson_id).first()
@@ -10,9 +15,28 @@ def get_lesson(db: Session, lesson_id: int) -> Optional[Lesson]:
 def get_lessons(db: Session, skip: int = 0, limit: int = 100) -> List[Lesson]:
     return db.query(Lesson).offset(skip).limit(limit).all()
 
+def get_lesson_rows(db: Session) -> Sequence[RowMapping]:
+    stmt = select(Lesson.id, Lesson.subject_id, Lesson.date_time).order_by(Lesson.date_time, Lesson.id)
+    return db.execute(stmt).mappings().all()
+
+def get_lesson_rows_filtered(db: Session, subject_id: int | None = None,
+                             date_from: datetime.datetime | None = None,
+                             date_to: datetime.datetime | None = None,
+                             skip: int = 0, limit: int | None = 100) -> Sequence[RowMapping]:
+    stmt = select(Lesson.id, Lesson.subject_id, Lesson.date_time)
+    if subject_id is not None:
+        stmt = stmt.where(Lesson.subject_id == subject_id)
+    if date_from is not None:
+        stmt = stmt.where(Lesson.date_time >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Lesson.date_time < date_to)
+    stmt = stmt.order_by(Lesson.date_time, Lesson.id).offset(skip).limit(limit)
+    return db.execute(stmt).mappings().all()
+
 def create_lesson(db: Session, lesson: LessonCreate) -> Lesson:
     db_lesson = Lesson(**lesson.dict())
     db.add(db_lesson)
+    crud_catalog.bump_version(db, CATALOG_NAME)
     db.commit()
     db.refresh(db_lesson)
     return db_lesson
\ No newline at end of file
@@ -0,0 +1,147 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Any, Dict, List, Tuple
+import datetime
+import gzip
+import json
+import os
+import re
+
+# таблица итогов создаётся вместе со схемой приложения
+from db.models import history_stats  # noqa: F401
+
+# секционированные по месяцам таблицы истории (init_db.PARTITIONING_DDL)
+PARTITIONED_TABLES = ("predictions", "transactions")
+PARTITION_NAME = re.compile(r"^(?P<table>[a-z_]+)_(?P<year>\d{4})_(?P<month>\d{2})$")
+
+PARTITIONS_QUERY = text(
+    "SELECT child.relname FROM pg_inherits "
+    "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+    "WHERE pg_inherits.inhparent = to_regclass(:table) "
+    "ORDER BY child.relname"
+)
+
+# итоги по пользователю за месяц; повторная архивация того же месяца дописывается к итогам
+MONTHLY_STATS_SQL = {
+    "predictions": """
+        INSERT INTO prediction_monthly_stats AS s
+            (user_id, month, total_count, completed_count, failed_count, total_cost)
+        SELECT user_id, :month, count(*), count(*) FILTER (WHERE status = 'completed'),
+               count(*) FILTER (WHERE status = 'failed'), coalesce(sum(cost), 0)
+        FROM {partition} WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        ON CONFLICT (user_id, month) DO UPDATE SET
+            total_count = s.total_count + EXCLUDED.total_count,
+            completed_count = s.completed_count + EXCLUDED.completed_count,
+            failed_count = s.failed_count + EXCLUDED.failed_count,
+            total_cost = s.total_cost + EXCLUDED.total_cost
+    """,
+    "transactions": """
+        INSERT INTO transaction_monthly_stats AS s
+            (user_id, month, transaction_type, transaction_count, total_amount)
+        SELECT user_id, :month, transaction_type, count(*), sum(amount)
+        FROM {partition} WHERE user_id IS NOT NULL
+        GROUP BY user_id, transaction_type
+        ON CONFLICT (user_id, month, transaction_type) DO UPDATE SET
+            transaction_count = s.transaction_count + EXCLUDED.transaction_count,
+            total_amount = s.total_amount + EXCLUDED.total_amount
+    """,
+}
+
+# строки других таблиц, ссылающиеся на архивируемые предсказания (внешних ключей на секционированную таблицу нет)
+DEPENDENT_ROWS_SQL = {
+    "predictions": [
+        "DELETE FROM shadow_predictions WHERE prediction_id IN (SELECT id FROM {partition})",
+        "DELETE FROM idempotency_keys WHERE prediction_request_id IN (SELECT id FROM {partition})",
+    ],
+    "transactions": [],
+}
+
+
+def month_start(moment: datetime.datetime, months: int = 0) -> datetime.datetime:
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(db: Session, months_ahead: int) -> int:
+    # секции с текущего месяца (UTC) по months_ahead вперёд; уже существующие пропускаются
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    created = 0
+    for table in PARTITIONED_TABLES:
+        created += db.execute(
+            text("SELECT ensure_monthly_partitions(:table, :first_month, :last_month)"),
+            {"table": table, "first_month": month_start(now), "last_month": month_start(now, months_ahead)}
+        ).scalar()
+    db.commit()
+    return created
+
+
+def list_partitions(db: Session, table: str) -> List[Tuple[str, datetime.datetime]]:
+    partitions = []
+    for name in db.execute(PARTITIONS_QUERY, {"table": table}).scalars():
+        match = PARTITION_NAME.match(name)
+        if match and match["table"] == table:
+            partitions.append((name, datetime.datetime(int(match["year"]), int(match["month"]), 1)))
+    return partitions
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def write_archive_file(db: Session, partition: str, path: str, chunk_size: int) -> int:
+    # строки секции в NDJSON под gzip; файл появляется под своим именем только целиком
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    rows = 0
+    stmt = text(f'SELECT * FROM "{partition}" ORDER BY id').execution_options(yield_per=chunk_size)
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+        for chunk in db.execute(stmt).mappings().partitions():
+            file.writelines(json.dumps(dict(row), ensure_ascii=False, default=_json_default) + "\n" for row in chunk)
+            rows += len(chunk)
+    os.replace(tmp_path, path)
+    return rows
+
+
+def archive_partition(db: Session, table: str, partition: str, month: datetime.datetime,
+                      archive_dir: str, chunk_size: int = 5000) -> Dict[str, Any]:
+    # Файл пишется до изменений в БД; итоги, удаление зависимых строк и секции - одна транзакция.
+    # Если она не прошла, секция остаётся на месте, а файл перезапишется при следующем запуске.
+    path = os.path.join(archive_dir, table, f"{month:%Y-%m}.ndjson.gz")
+    rows = write_archive_file(db, partition, path, chunk_size)
+    quoted = f'"{partition}"'
+    try:
+        db.execute(text(MONTHLY_STATS_SQL[table].format(partition=quoted)), {"month": month})
+        # история пользователей изменилась: ETag и кеш истории должны устареть
+        users = db.execute(text(
+            "UPDATE users SET history_version = history_version + 1 "
+            f"WHERE id IN (SELECT user_id FROM {quoted})"
+        )).rowcount
+        for statement in DEPENDENT_ROWS_SQL[table]:
+            db.execute(text(statement.format(partition=quoted)))
+        db.execute(text(f"DROP TABLE {quoted}"))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"table": table, "partition": partition, "month": month.strftime("%Y-%m"),
+            "rows": rows, "users": users, "file": path}
+
+
+def archive_old_partitions(db: Session, retention_months: int, archive_dir: str,
+                           dry_run: bool = False, chunk_size: int = 5000) -> List[Dict[str, Any]]:
+    # в архив уходят секции месяцев, закончившихся раньше, чем retention_months месяцев назад
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    cutoff = month_start(now, -retention_months)
+    report = []
+    for table in PARTITIONED_TABLES:
+        for partition, month in list_partitions(db, table):
+            if month >= cutoff:
+                continue
+            if dry_run:
+                report.append({"table": table, "partition": partition, "month": month.strftime("%Y-%m")})
+                continue
+            report.append(archive_partition(db, table, partition, month, archive_dir, chunk_size))
+    return report
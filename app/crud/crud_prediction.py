@@ -1,13 +1,29 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from sqlalchemy import select, Float, RowMapping
+from typing import List, Optional, Dict, Any, Iterator, Sequence
 import datetime
 
 from db.models.prediction_request import PredictionRequest
 from schemas.prediction import PredictionCreate
+from crud import crud_user
 
 
-def get_prediction_by_id(db: Session, prediction_id: int) -> Optional[PredictionRequest]:
-    return db.query(PredictionRequest).filter(PredictionRequest.id == prediction_id).first()
+def get_prediction_by_id(db: Session, prediction_id: int,
+                         created_at: datetime.datetime | None = None) -> Optional[PredictionRequest]:
+    # с известным временем создания запрос читает одну месячную секцию, без него - индекс id каждой секции
+    query = db.query(PredictionRequest).filter(PredictionRequest.id == prediction_id)
+    if created_at is not None:
+        query = query.filter(PredictionRequest.timestamp_created == created_at)
+    return query.first()
+
+
+def _created_between(stmt, date_from: datetime.datetime | None, date_to: datetime.datetime | None):
+    # границы по времени создания отсекают секции вне периода (partition pruning)
+    if date_from is not None:
+        stmt = stmt.where(PredictionRequest.timestamp_created >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(PredictionRequest.timestamp_created < date_to)
+    return stmt
 
 
 def get_prediction_history_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[
@@ -32,6 +48,83 @@ def get_all_predictions(db: Session, skip: int = 0, limit: int = 100) -> List[Pr
     )
 
 
+# колонки схемы schemas.prediction.PredictionRequest для проекций без загрузки ORM-объектов
+PREDICTION_COLUMNS = (
+    PredictionRequest.id,
+    PredictionRequest.user_id,
+    PredictionRequest.status,
+    PredictionRequest.input_data,
+    PredictionRequest.result,
+    PredictionRequest.error_message,
+    PredictionRequest.cost,
+    PredictionRequest.timestamp_created,
+    PredictionRequest.timestamp_completed,
+    PredictionRequest.model_version,
+)
+
+
+def get_prediction_rows_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                                date_from: datetime.datetime | None = None,
+                                date_to: datetime.datetime | None = None) -> Sequence[RowMapping]:
+    stmt = (
+        _created_between(select(*PREDICTION_COLUMNS), date_from, date_to)
+        .where(PredictionRequest.user_id == user_id)
+        .order_by(PredictionRequest.timestamp_created.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return db.execute(stmt).mappings().all()
+
+
+def get_all_prediction_rows(db: Session, skip: int = 0, limit: int = 100,
+                            date_from: datetime.datetime | None = None,
+                            date_to: datetime.datetime | None = None) -> Sequence[RowMapping]:
+    stmt = (
+        _created_between(select(*PREDICTION_COLUMNS), date_from, date_to)
+        .order_by(PredictionRequest.timestamp_created.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return db.execute(stmt).mappings().all()
+
+
+# выражения совпадают с индексами ix_predictions_feature2_timestamp и ix_predictions_probability
+FEATURE2 = PredictionRequest.input_data["feature2"].astext
+PROBABILITY = PredictionRequest.result["probability"].astext.cast(Float)
+
+
+def search_prediction_rows(db: Session, *, feature2: str | None = None, min_probability: float | None = None,
+                           max_probability: float | None = None, status: str | None = None,
+                           user_id: int | None = None, date_from: datetime.datetime | None = None,
+                           date_to: datetime.datetime | None = None, skip: int = 0,
+                           limit: int = 100) -> Sequence[RowMapping]:
+    stmt = _created_between(select(*PREDICTION_COLUMNS), date_from, date_to)
+    if feature2 is not None:
+        stmt = stmt.where(FEATURE2 == feature2)
+    if min_probability is not None:
+        stmt = stmt.where(PROBABILITY >= min_probability)
+    if max_probability is not None:
+        stmt = stmt.where(PROBABILITY <= max_probability)
+    if status is not None:
+        stmt = stmt.where(PredictionRequest.status == status)
+    if user_id is not None:
+        stmt = stmt.where(PredictionRequest.user_id == user_id)
+    stmt = stmt.order_by(PredictionRequest.timestamp_created.desc()).offset(skip).limit(limit)
+    return db.execute(stmt).mappings().all()
+
+
+def iter_prediction_rows(db: Session, date_from: datetime.datetime | None = None,
+                         date_to: datetime.datetime | None = None, user_id: int | None = None,
+                         chunk_size: int = 5000) -> Iterator[Sequence[RowMapping]]:
+    # серверный курсор в порядке первичного ключа: строки идут клиенту без сортировки всей выборки,
+    # в памяти одновременно не больше chunk_size строк
+    stmt = _created_between(select(*PREDICTION_COLUMNS), date_from, date_to)
+    if user_id is not None:
+        stmt = stmt.where(PredictionRequest.user_id == user_id)
+    stmt = stmt.order_by(PredictionRequest.id)
+    yield from db.execute(stmt.execution_options(yield_per=chunk_size)).mappings().partitions()
+
+
 def create_prediction_request(db: Session, *, user_id: int, prediction_in: PredictionCreate,
                               cost: float | None = None) -> PredictionRequest:
     input_data_dict = prediction_in.input_data.model_dump() if prediction_in.input_data else None
@@ -61,6 +154,7 @@ def update_prediction_status(
         db_prediction.result = result
         db_prediction.error_message = error_message
         db_prediction.timestamp_completed = datetime.datetime.now(datetime.timezone.utc)
+        crud_user.bump_history_version(db, db_prediction.user_id)
         try:
             db.commit()
             db.refresh(db_prediction)
@@ -1,8 +1,12 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select, RowMapping
+from typing import List, Optional, Sequence
 
 from db.models.subject import Subject
 from schemas.subject import SubjectCreate
+from crud import crud_catalog
+
+CATALOG_NAME = "subjects"
 
 def get_subject(db: Session, subject_id: int) -> Optional[Subject]:
     return db.query(Subject).filter(Subject.id == subject_id).first()
@@ -10,9 +14,13 @@ def get_subject(db: Session, subject_id: int) -> Optional[Subject]:
 def get_subjects(db: Session, skip: int = 0, limit: int = 100) -> List[Subject]:
     return db.query(Subject).offset(skip).limit(limit).all()
 
+def get_subject_rows(db: Session) -> Sequence[RowMapping]:
+    return db.execute(select(Subject.id, Subject.name).order_by(Subject.id)).mappings().all()
+
 def create_subject(db: Session, subject: SubjectCreate) -> Subject:
     db_subject = Subject(**subject.dict())
     db.add(db_subject)
+    crud_catalog.bump_version(db, CATALOG_NAME)
     db.commit()
     db.refresh(db_subject)
     return db_subject
\ No newline at end of file
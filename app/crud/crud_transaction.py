@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select, RowMapping
+from typing import Iterator, List, Optional, Sequence
+import datetime
 
 from db.models.transaction import Transaction
 from db.models.user import User
@@ -20,6 +22,50 @@ def get_transactions_by_user(db: Session, user_id: int, skip: int = 0, limit: in
     )
 
 
+# колонки схемы schemas.transaction.Transaction для проекций без загрузки ORM-объектов
+TRANSACTION_COLUMNS = (
+    Transaction.id,
+    Transaction.amount,
+    Transaction.transaction_type,
+    Transaction.user_id,
+    Transaction.timestamp,
+    Transaction.prediction_request_id,
+)
+
+
+def _created_between(stmt, date_from: datetime.datetime | None, date_to: datetime.datetime | None):
+    # как в crud_prediction: границы по времени отсекают месячные секции вне периода
+    if date_from is not None:
+        stmt = stmt.where(Transaction.timestamp >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Transaction.timestamp < date_to)
+    return stmt
+
+
+def get_transaction_rows_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                                 date_from: datetime.datetime | None = None,
+                                 date_to: datetime.datetime | None = None) -> Sequence[RowMapping]:
+    stmt = (
+        _created_between(select(*TRANSACTION_COLUMNS), date_from, date_to)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.timestamp.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return db.execute(stmt).mappings().all()
+
+
+def iter_transaction_rows(db: Session, date_from: datetime.datetime | None = None,
+                          date_to: datetime.datetime | None = None, user_id: int | None = None,
+                          chunk_size: int = 5000) -> Iterator[Sequence[RowMapping]]:
+    # выборка по chunk_size строк через серверный курсор, как в crud_prediction.iter_prediction_rows
+    stmt = _created_between(select(*TRANSACTION_COLUMNS), date_from, date_to)
+    if user_id is not None:
+        stmt = stmt.where(Transaction.user_id == user_id)
+    stmt = stmt.order_by(Transaction.id)
+    yield from db.execute(stmt.execution_options(yield_per=chunk_size)).mappings().partitions()
+
+
 def get_all_transactions(db: Session, skip: int = 0, limit: int = 100) -> List[Transaction]:
     return (
         db.query(Transaction)
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import update as sqlalchemy_update
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
 from db.models.user import User
 from db.models.transaction import Transaction
@@ -24,13 +24,13 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
     return db.query(User).order_by(User.id).offset(skip).limit(limit).all()
 
 
-def create_user(db: Session, user: UserCreate) -> User:
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: UserCreate, hashed_password: str | None = None) -> User:
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = User(
         email=user.email,
         hashed_password=hashed_password,
         balance=0.0,
-        role="student",
         is_active=True,
         is_superuser=False
     )
@@ -41,6 +41,34 @@ def create_user(db: Session, user: UserCreate) -> User:
     return db_user
 
 
+def bump_history_version(db: Session, user_id: int) -> None:
+    stmt = (
+        sqlalchemy_update(User)
+        .where(User.id == user_id)
+        .values(history_version=User.history_version + 1)
+        .execution_options(synchronize_session="fetch")
+    )
+    db.execute(stmt)
+
+
+def bump_history_versions(db: Session, user_ids: Sequence[int]) -> None:
+    stmt = (
+        sqlalchemy_update(User)
+        .where(User.id.in_(user_ids))
+        .values(history_version=User.history_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(stmt)
+
+
+def update_password_hash(db: Session, user: User, hashed_password: str) -> User:
+    user.hashed_password = hashed_password
+    db.commit()
+    db.refresh(user)
+    logger.info(f"Хеш пароля пользователя {user.id} пересчитан с новой стоимостью.")
+    return user
+
+
 def update_balance(db: Session, user: User, amount: float, transaction_type: str,
                    prediction_request_id: int | None = None) -> User | None:
     new_balance = user.balance + amount
@@ -55,7 +83,7 @@ def update_balance(db: Session, user: User, amount: float, transaction_type: str
         stmt = (
             sqlalchemy_update(User)
             .where(User.id == user.id)
-            .values(balance=new_balance)
+            .values(balance=new_balance, history_version=User.history_version + 1)
             .execution_options(synchronize_session="fetch")
         )
         result = db.execute(stmt)
@@ -1,11 +1,20 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from core.config import settings
+from db.replicas import ReplicaRouter
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, **settings.db_pool_options())
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+replicas = ReplicaRouter(
+    engine,
+    settings.DATABASE_REPLICA_URLS,
+    max_lag_seconds=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    connect_timeout=settings.DB_REPLICA_CONNECT_TIMEOUT,
+    **settings.db_pool_options()
+)
+
 Base = declarative_base()
 
 
@@ -15,3 +24,16 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def read_session():
+    # сессия только для чтения: реплика из ReplicaRouter или основная БД
+    return SessionLocal(bind=replicas.engine())
+
+
+def get_read_db():
+    db = read_session()
+    try:
+        yield db
+    finally:
+        db.close()
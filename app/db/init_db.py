@@ -1,17 +1,300 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import text
 from db import base
 from db.models.user import User
+# таблицы пакетной и теневой оценки пишет воркер, но создаются они вместе со схемой приложения
+# create_all создаёт таблицы только импортированных моделей: init_db вызывается и без приложения (server.main)
+from db.models import (  # noqa: F401
+    attendance, attendance_stats, catalog_version, history_stats, idempotency_key, lesson, prediction_request,
+    rate_limit_bucket, scoring_checkpoint, shadow_prediction, student_score, subject, transaction,
+)
 from core.config import settings
+from crud import crud_partition
 from core.security import get_password_hash
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# Сводки attendance_lesson_stats / attendance_student_stats обновляются инкрементально:
+# триггеры уровня оператора получают все изменённые строки (transition tables) и применяют
+# к счётчикам агрегированную разницу одним upsert на таблицу сводки.
+ATTENDANCE_STATS_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION attendance_stats_apply(
+        user_ids integer[], lesson_ids integer[], total_deltas integer[], attended_deltas integer[]
+    ) RETURNS void AS $$
+    BEGIN
+        WITH delta AS (
+            SELECT * FROM unnest(user_ids, lesson_ids, total_deltas, attended_deltas)
+                AS d(user_id, lesson_id, total_delta, attended_delta)
+            WHERE d.lesson_id IS NOT NULL
+        )
+        INSERT INTO attendance_lesson_stats AS s (lesson_id, total_count, attended_count)
+        SELECT lesson_id, sum(total_delta), sum(attended_delta) FROM delta
+        GROUP BY lesson_id ORDER BY lesson_id
+        ON CONFLICT (lesson_id) DO UPDATE SET
+            total_count = s.total_count + EXCLUDED.total_count,
+            attended_count = s.attended_count + EXCLUDED.attended_count;
+
+        WITH delta AS (
+            SELECT * FROM unnest(user_ids, lesson_ids, total_deltas, attended_deltas)
+                AS d(user_id, lesson_id, total_delta, attended_delta)
+            WHERE d.user_id IS NOT NULL
+        )
+        INSERT INTO attendance_student_stats AS s (user_id, subject_id, total_count, attended_count)
+        SELECT delta.user_id, lessons.subject_id, sum(total_delta), sum(attended_delta)
+        FROM delta JOIN lessons ON lessons.id = delta.lesson_id
+        WHERE lessons.subject_id IS NOT NULL
+        GROUP BY delta.user_id, lessons.subject_id ORDER BY delta.user_id, lessons.subject_id
+        ON CONFLICT (user_id, subject_id) DO UPDATE SET
+            total_count = s.total_count + EXCLUDED.total_count,
+            attended_count = s.attended_count + EXCLUDED.attended_count;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION attendance_stats_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM attendance_stats_apply(
+                array_agg(user_id), array_agg(lesson_id),
+                array_agg(1), array_agg(CASE WHEN attended THEN 1 ELSE 0 END)
+            ) FROM new_rows HAVING count(*) > 0;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            PERFORM attendance_stats_apply(
+                array_agg(user_id), array_agg(lesson_id),
+                array_agg(-1), array_agg(CASE WHEN attended THEN -1 ELSE 0 END)
+            ) FROM old_rows HAVING count(*) > 0;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER attendances_stats_insert AFTER INSERT ON attendances
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION attendance_stats_trigger()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER attendances_stats_update AFTER UPDATE ON attendances
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION attendance_stats_trigger()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER attendances_stats_delete AFTER DELETE ON attendances
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION attendance_stats_trigger()
+    """,
+    # первичное заполнение для базы, где отметки появились раньше сводок; выполняется в той же
+    # транзакции, что и создание триггеров, поэтому параллельные отметки не теряются и не двоятся
+    """
+    INSERT INTO attendance_lesson_stats (lesson_id, total_count, attended_count)
+    SELECT lesson_id, count(*), count(*) FILTER (WHERE attended) FROM attendances
+    WHERE lesson_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM attendance_lesson_stats)
+    GROUP BY lesson_id
+    """,
+    """
+    INSERT INTO attendance_student_stats (user_id, subject_id, total_count, attended_count)
+    SELECT attendances.user_id, lessons.subject_id, count(*), count(*) FILTER (WHERE attendances.attended)
+    FROM attendances JOIN lessons ON lessons.id = attendances.lesson_id
+    WHERE attendances.user_id IS NOT NULL AND lessons.subject_id IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM attendance_student_stats)
+    GROUP BY attendances.user_id, lessons.subject_id
+    """,
+]
+
+
+# Индекс (user_id, lesson_id) раньше был не уникальным, и параллельные отметки могли создать дубли.
+# Перед заменой на уникальный дубли сливаются: остаётся строка с меньшим id, отмеченная, если отмечена
+# хоть одна из копий. Запись в attendances на это время блокируется; удаление проходит через триггер
+# сводок, поэтому счётчики уменьшаются на удалённые копии.
+ATTENDANCE_UNIQUE_DDL = [
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_index
+                   WHERE indexrelid = to_regclass('ix_attendances_user_id_lesson_id') AND indisunique) THEN
+            RETURN;
+        END IF;
+        LOCK TABLE attendances IN SHARE ROW EXCLUSIVE MODE;
+        -- другой процесс мог заменить индекс, пока ждали блокировку
+        IF EXISTS (SELECT 1 FROM pg_index
+                   WHERE indexrelid = to_regclass('ix_attendances_user_id_lesson_id') AND indisunique) THEN
+            RETURN;
+        END IF;
+        UPDATE attendances a SET attended = true
+        FROM (
+            SELECT min(id) AS id FROM attendances
+            GROUP BY user_id, lesson_id HAVING count(*) > 1 AND bool_or(attended)
+        ) d
+        WHERE a.id = d.id AND a.attended IS NOT TRUE;
+        DELETE FROM attendances a USING attendances b
+        WHERE a.user_id = b.user_id AND a.lesson_id = b.lesson_id AND a.id > b.id;
+        DROP INDEX IF EXISTS ix_attendances_user_id_lesson_id;
+        CREATE UNIQUE INDEX ix_attendances_user_id_lesson_id ON attendances (user_id, lesson_id);
+    END
+    $$
+    """,
+]
+
+
+# predictions и transactions секционированы по месяцам "timestamp" (RANGE). Секции создаются
+# заранее на PARTITION_PREMAKE_MONTHS вперёд при старте и периодически (crud_partition.ensure_partitions),
+# старые секции уходят в архив целиком (crud_partition.archive_old_partitions).
+# Таблица, созданная до секционирования, переносится в секционированную один раз при старте.
+PARTITIONING_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION ensure_monthly_partitions(
+        parent text, first_month timestamp, last_month timestamp
+    ) RETURNS integer AS $$
+    DECLARE
+        month timestamp := date_trunc('month', first_month);
+        partition text;
+        created integer := 0;
+    BEGIN
+        -- процессы приложения стартуют одновременно: секции одной таблицы создаются по очереди
+        PERFORM pg_advisory_xact_lock(hashtext('partitions:' || parent));
+        WHILE month <= last_month LOOP
+            partition := parent || '_' || to_char(month, 'YYYY_MM');
+            IF to_regclass(partition) IS NULL THEN
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                               partition, parent, month, month + interval '1 month');
+                created := created + 1;
+            END IF;
+            month := month + interval '1 month';
+        END LOOP;
+        RETURN created;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION partition_monthly(tbl text) RETURNS void AS $$
+    DECLARE
+        legacy text := tbl || '_unpartitioned';
+        id_sequence text;
+        foreign_keys text[];
+        foreign_key text;
+        referencing record;
+        first_month timestamp;
+        last_month timestamp;
+    BEGIN
+        PERFORM pg_advisory_xact_lock(hashtext('partitions:' || tbl));
+        IF (SELECT relkind FROM pg_class WHERE oid = to_regclass(tbl)) IS DISTINCT FROM 'r' THEN
+            RETURN;
+        END IF;
+        -- внешние ключи на id несовместимы с первичным ключом (id, "timestamp") секционированной таблицы
+        FOR referencing IN
+            SELECT conrelid::regclass AS relation, conname FROM pg_constraint
+            WHERE confrelid = tbl::regclass AND contype = 'f'
+        LOOP
+            EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', referencing.relation, referencing.conname);
+        END LOOP;
+        SELECT array_agg(pg_get_constraintdef(oid)) INTO foreign_keys
+        FROM pg_constraint WHERE conrelid = tbl::regclass AND contype = 'f';
+        id_sequence := pg_get_serial_sequence(tbl, 'id');
+
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', tbl, legacy);
+        EXECUTE format(
+            'UPDATE %I SET "timestamp" = now() AT TIME ZONE ''UTC'' WHERE "timestamp" IS NULL', legacy
+        );
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")', tbl, legacy);
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN "timestamp" SET NOT NULL', tbl);
+        EXECUTE format('SELECT min("timestamp"), max("timestamp") FROM %I', legacy) INTO first_month, last_month;
+        IF first_month IS NOT NULL THEN
+            PERFORM ensure_monthly_partitions(tbl, first_month, last_month);
+        END IF;
+        EXECUTE format('INSERT INTO %I SELECT * FROM %I', tbl, legacy);
+        -- последовательность id переходит к новой таблице, нумерация продолжается
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', id_sequence, tbl);
+        EXECUTE format('DROP TABLE %I', legacy);
+
+        EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, "timestamp")', tbl);
+        FOREACH foreign_key IN ARRAY coalesce(foreign_keys, '{}') LOOP
+            EXECUTE format('ALTER TABLE %I ADD %s', tbl, foreign_key);
+        END LOOP;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "SELECT partition_monthly('predictions')",
+    "SELECT partition_monthly('transactions')",
+    "CREATE INDEX IF NOT EXISTS ix_predictions_id ON predictions (id)",
+    "CREATE INDEX IF NOT EXISTS ix_predictions_user_id_timestamp ON predictions (user_id, \"timestamp\")",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_id ON transactions (id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_user_id_timestamp ON transactions (user_id, \"timestamp\")",
+]
+
+
+# При TASK_BACKEND=postgres очередью служит сама таблица predictions: новые строки в статусе pending
+# будят воркер через NOTIFY (уведомление уходит при фиксации транзакции, один раз на транзакцию),
+# воркер забирает их пачками через FOR UPDATE SKIP LOCKED (core/task_queue.py).
+TASK_QUEUE_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION prediction_tasks_notify() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('prediction_tasks', '');
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER predictions_notify AFTER INSERT ON predictions
+    FOR EACH STATEMENT EXECUTE FUNCTION prediction_tasks_notify()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_predictions_queue ON predictions (\"timestamp\") "
+    "WHERE status IN ('pending', 'processing')",
+]
+
+
+# create_all не меняет уже существующие таблицы, поэтому новые колонки добавляются идемпотентно
+SCHEMA_UPDATES = [
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS error_message VARCHAR",
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS timestamp_completed TIMESTAMP",
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS model_version VARCHAR",
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP",
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE student_scores ADD COLUMN IF NOT EXISTS model_version VARCHAR",
+    "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS prediction_request_id INTEGER",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS history_version INTEGER NOT NULL DEFAULT 0",
+    "CREATE INDEX IF NOT EXISTS ix_lessons_subject_id_date_time ON lessons (subject_id, date_time)",
+    "CREATE INDEX IF NOT EXISTS ix_lessons_date_time ON lessons (date_time)",
+    *ATTENDANCE_UNIQUE_DDL,
+    *ATTENDANCE_STATS_DDL,
+    *PARTITIONING_DDL,
+    # JSON -> JSONB: значения разбираются один раз при записи, по полям можно строить индексы;
+    # ALTER TYPE переписывает все секции под блокировкой таблицы, поэтому выполняется только для колонок JSON
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'predictions'
+                AND column_name IN ('input_data', 'prediction_result') AND data_type = 'json'
+        ) THEN
+            ALTER TABLE predictions
+                ALTER COLUMN input_data TYPE jsonb USING input_data::jsonb,
+                ALTER COLUMN prediction_result TYPE jsonb USING prediction_result::jsonb;
+        END IF;
+    END
+    $$
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_predictions_feature2_timestamp ON predictions ((input_data ->> 'feature2'), \"timestamp\")",
+    "CREATE INDEX IF NOT EXISTS ix_predictions_probability ON predictions (((prediction_result ->> 'probability')::float8))",
+    *TASK_QUEUE_DDL,
+]
+
+
 def init_db(db: Session) -> None:
     logger.info("Создание таблиц базы данных...")
     try:
         base.Base.metadata.create_all(bind=base.engine)
+        with base.engine.begin() as connection:
+            for statement in SCHEMA_UPDATES:
+                connection.execute(text(statement))
+        created = crud_partition.ensure_partitions(db, settings.PARTITION_PREMAKE_MONTHS)
+        if created:
+            logger.info(f"Создано секций истории: {created}")
         logger.info("Таблицы успешно созданы или уже существуют.")
     except Exception as e:
         logger.error(f"Ошибка при создании таблиц: {e}")
@@ -1,9 +1,14 @@
-from sqlalchemy import Column, Integer, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from db.base import Base
 
 class Attendance(Base):
     __tablename__ = 'attendances'
+    __table_args__ = (
+        # история студента; уникальность - цель ON CONFLICT пакетной записи отметок и импорта,
+        # параллельные процессы не создают двух отметок одного студента на занятие
+        Index('ix_attendances_user_id_lesson_id', 'user_id', 'lesson_id', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'))
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from db.base import Base
+
+
+# Сводки посещаемости поддерживаются триггером на attendances (см. init_db.SCHEMA_UPDATES):
+# каждая вставка/изменение/удаление отметок добавляет к счётчикам свою разницу,
+# поэтому отчёты не сканируют сырые отметки.
+class AttendanceLessonStats(Base):
+    __tablename__ = 'attendance_lesson_stats'
+
+    lesson_id = Column(Integer, ForeignKey('lessons.id'), primary_key=True)
+    total_count = Column(Integer, nullable=False, default=0)
+    attended_count = Column(Integer, nullable=False, default=0)
+
+
+class AttendanceStudentStats(Base):
+    __tablename__ = 'attendance_student_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    subject_id = Column(Integer, ForeignKey('subjects.id'), primary_key=True)
+    total_count = Column(Integer, nullable=False, default=0)
+    attended_count = Column(Integer, nullable=False, default=0)
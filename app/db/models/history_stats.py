@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey
+from db.base import Base
+
+
+# Помесячные итоги по пользователю для секций predictions / transactions, ушедших в архив
+# (crud_partition.archive_old_partitions): сами строки выгружаются в файлы, итоги остаются в БД.
+class PredictionMonthlyStats(Base):
+    __tablename__ = 'prediction_monthly_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    month = Column(DateTime, primary_key=True)
+    total_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0.0)
+
+
+class TransactionMonthlyStats(Base):
+    __tablename__ = 'transaction_monthly_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    month = Column(DateTime, primary_key=True)
+    transaction_type = Column(String, primary_key=True)
+    transaction_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Float, nullable=False, default=0.0)
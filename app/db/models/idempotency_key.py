@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from db.base import Base
+import datetime
+
+
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_id_key'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(255), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    # predictions секционирована, внешний ключ на один id невозможен; ключи живут сутки и чистятся раньше архивации
+    prediction_request_id = Column(Integer, nullable=False)
+    response_body = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    # индекс для дешёвой очистки просроченных ключей
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    prediction_request = relationship(
+        "PredictionRequest",
+        primaryjoin="foreign(IdempotencyKey.prediction_request_id) == PredictionRequest.id",
+        viewonly=True,
+    )
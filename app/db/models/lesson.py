@@ -1,13 +1,17 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from db.base import Base
 import datetime
 
 class Lesson(Base):
     __tablename__ = 'lessons'
+    __table_args__ = (
+        # расписание предмета за период: WHERE subject_id = ? AND date_time BETWEEN ...
+        Index('ix_lessons_subject_id_date_time', 'subject_id', 'date_time'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     subject_id = Column(Integer, ForeignKey('subjects.id'))
-    date_time = Column(DateTime, nullable=False)
+    date_time = Column(DateTime, nullable=False, index=True)
 
     subject = relationship("Subject")
\ No newline at end of file
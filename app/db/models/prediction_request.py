@@ -1,18 +1,38 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from db.base import Base
 import datetime
 
 
+# Таблица секционирована по месяцам времени создания (init_db.PARTITIONING_DDL): первичный ключ включает
+# ключ секционирования, поэтому внешние ключи на predictions.id из других таблиц не объявляются.
 class PredictionRequest(Base):
     __tablename__ = 'predictions'
+    __table_args__ = (
+        Index('ix_predictions_user_id_timestamp', 'user_id', 'timestamp'),
+        # фильтры администратора (crud_prediction.search_prediction_rows): выражения совпадают с запросами
+        Index('ix_predictions_feature2_timestamp', text("(input_data ->> 'feature2')"), 'timestamp'),
+        Index('ix_predictions_probability', text("((prediction_result ->> 'probability')::float8)")),
+        # очередь задач при TASK_BACKEND=postgres: воркер забирает строки из этого индекса (core/task_queue.py)
+        Index('ix_predictions_queue', 'timestamp', postgresql_where=text("status IN ('pending', 'processing')")),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    input_data = Column(JSON)
-    prediction_result = Column(JSON)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    input_data = Column(JSONB)
+    result = Column("prediction_result", JSONB)
+    error_message = Column(String, nullable=True)
     status = Column(String, default="completed")
     cost = Column(Float, default=1.0)
-    timestamp = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    timestamp_created = Column("timestamp", DateTime, primary_key=True,
+                               default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    timestamp_completed = Column(DateTime, nullable=True)
+    model_version = Column(String, nullable=True)
+    # когда воркер забрал задачу из очереди в Postgres; зависшие в processing задачи забираются повторно
+    claimed_at = Column(DateTime, nullable=True)
+    # сколько раз задача забиралась из очереди; после TASK_MAX_ATTEMPTS помечается failed
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
     user_id = Column(Integer, ForeignKey('users.id'))
 
     owner = relationship("User", back_populates="predictions")
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, Float, Boolean, DateTime
+from db.base import Base
+
+
+class RateLimitBucket(Base):
+    __tablename__ = 'rate_limit_buckets'
+
+    key = Column(String(255), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    allowed = Column(Boolean, nullable=False, default=True)
+    updated_at = Column(DateTime, nullable=False)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from db.base import Base
+
+
+# прогресс пакетной задачи: прерванный прогон продолжается после last_user_id
+class ScoringCheckpoint(Base):
+    __tablename__ = 'scoring_checkpoints'
+
+    job_name = Column(String(64), primary_key=True)
+    run_started_at = Column(DateTime, nullable=False)
+    last_user_id = Column(Integer, nullable=False, default=0)
+    students_scored = Column(Integer, nullable=False, default=0)
+    completed_at = Column(DateTime, nullable=True)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime
+from db.base import Base
+import datetime
+
+
+# теневая оценка: та же задача, посчитанная моделью-кандидатом вне критического пути
+# (workers/worker.py), рядом с результатом и временем основной модели
+class ShadowPrediction(Base):
+    __tablename__ = 'shadow_predictions'
+
+    id = Column(Integer, primary_key=True)
+    # без внешнего ключа: predictions секционирована, строки удаляются при архивации секции
+    prediction_id = Column(Integer, nullable=False, index=True)
+    primary_version = Column(String, nullable=False)
+    primary_probability = Column(Float, nullable=True)
+    primary_latency_ms = Column(Float, nullable=False)
+    shadow_version = Column(String, nullable=False)
+    shadow_probability = Column(Float, nullable=True)
+    shadow_latency_ms = Column(Float, nullable=True)
+    # completed | timeout | failed
+    status = Column(String, nullable=False)
+    error_message = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.datetime.now(datetime.timezone.utc))
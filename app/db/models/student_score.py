@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, String
+from db.base import Base
+
+
+# последняя оценка ночного пакетного прогона (workers/batch_scoring.py) по каждому студенту
+class StudentScore(Base):
+    __tablename__ = 'student_scores'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    probability = Column(Float, nullable=False, index=True)
+    attended_count = Column(Integer, nullable=False)
+    total_count = Column(Integer, nullable=False)
+    scored_at = Column(DateTime, nullable=False)
+    run_started_at = Column(DateTime, nullable=False)
+    model_version = Column(String, nullable=True)
@@ -1,15 +1,21 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from db.base import Base
 import datetime
 
+# секционирована по месяцам, как predictions
 class Transaction(Base):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        Index('ix_transactions_user_id_timestamp', 'user_id', 'timestamp'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     amount = Column(Float, nullable=False)
     transaction_type = Column(String, nullable=False)
-    timestamp = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    timestamp = Column(DateTime, primary_key=True, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     user_id = Column(Integer, ForeignKey('users.id'))
+    prediction_request_id = Column(Integer, nullable=True)
 
     owner = relationship("User", back_populates="transactions")
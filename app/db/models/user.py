@@ -11,6 +11,8 @@ class User(Base):
     balance = Column(Float, default=0.0, nullable=False)
     is_active = Column(Boolean(), default=True)
     is_superuser = Column(Boolean(), default=False)
+    # растёт при любом изменении истории пользователя; основа ETag для эндпоинтов истории
+    history_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     transactions = relationship("Transaction", back_populates="owner")
     predictions = relationship("PredictionRequest", back_populates="owner")
@@ -0,0 +1,90 @@
+import itertools
+import logging
+
+from sqlalchemy import create_engine, event, text
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_LSN_QUERY = text("SELECT pg_current_wal_lsn()")
+# отставание реплики в секундах: 0, если она проиграла WAL основной БД до позиции :primary_lsn,
+# иначе возраст последней проигранной транзакции. NULL - сервер не реплика (не в восстановлении)
+# или отстаёт и не получает WAL потоком: такой сервер не считается исправной репликой.
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN NULL "
+    "WHEN pg_last_wal_replay_lsn() >= CAST(:primary_lsn AS pg_lsn) THEN 0 "
+    "WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+# Маршрутизация чтений по репликам Postgres: round-robin по репликам, прошедшим последнюю
+# проверку (соединение, сервер в режиме реплики, отставание не больше max_lag_seconds).
+# Проверку check() периодически вызывает владелец (фоновая задача приложения, таймер воркера).
+# Пока проверок не было или все реплики недоступны, чтения идут в основную БД. Обрыв соединения
+# с репликой во время запроса исключает её до следующей проверки.
+class ReplicaRouter:
+    def __init__(self, primary, urls, max_lag_seconds=None, connect_timeout=2, **engine_options):
+        self.primary = primary
+        self.max_lag_seconds = max_lag_seconds
+        self.replicas = [
+            create_engine(url, pool_pre_ping=True, connect_args={"connect_timeout": connect_timeout}, **engine_options)
+            for url in urls
+        ]
+        for engine in self.replicas:
+            event.listen(engine, "handle_error", self._on_error)
+        # список заменяется целиком, читатели берут снимок без блокировки
+        self._healthy = []
+        self._counter = itertools.count()
+
+    def _on_error(self, context):
+        engine = context.engine
+        # connection is None - ошибка при установке соединения (реплика не принимает подключения)
+        lost = context.is_disconnect or context.connection is None
+        if lost and engine in self._healthy:
+            self._healthy = [replica for replica in self._healthy if replica is not engine]
+            logger.warning(f"Реплика {engine.url!r} исключена из чтения до следующей проверки: {context.original_exception}")
+
+    def check(self):
+        if not self.replicas:
+            return 0
+        try:
+            # позиция WAL основной БД читается до реплик: реплика, проигравшая её, не отстаёт
+            with self.primary.connect() as connection:
+                primary_lsn = connection.execute(PRIMARY_LSN_QUERY).scalar()
+        except Exception as e:
+            logger.warning(f"Основная БД недоступна, состояние реплик не обновлено: {e}")
+            return len(self._healthy)
+        healthy = []
+        for engine in self.replicas:
+            try:
+                with engine.connect() as connection:
+                    lag = connection.execute(REPLICA_LAG_QUERY, {"primary_lsn": primary_lsn}).scalar()
+            except Exception as e:
+                if engine in self._healthy:
+                    logger.warning(f"Реплика {engine.url!r} недоступна: {e}")
+                continue
+            if lag is None:
+                if engine in self._healthy:
+                    logger.warning(f"Сервер {engine.url!r} не в режиме реплики или не получает WAL")
+                continue
+            lag = float(lag)
+            if self.max_lag_seconds is not None and lag > self.max_lag_seconds:
+                if engine in self._healthy:
+                    logger.warning(f"Реплика {engine.url!r} отстаёт на {lag:.1f} с")
+                continue
+            if engine not in self._healthy:
+                logger.info(f"Реплика {engine.url!r} доступна для чтения (отставание {lag:.1f} с)")
+            healthy.append(engine)
+        self._healthy = healthy
+        return len(healthy)
+
+    def engine(self):
+        healthy = self._healthy
+        if not healthy:
+            return self.primary
+        return healthy[next(self._counter) % len(healthy)]
+
+    def dispose(self):
+        for engine in self.replicas:
+            engine.dispose()
@@ -0,0 +1,38 @@
+import argparse
+import json
+import sys
+
+from core.config import settings
+from crud import crud_import
+from db.base import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт предметов, расписания и списков студентов из CSV")
+    parser.add_argument("--subjects", help="CSV: name")
+    parser.add_argument("--lessons", help="CSV: subject_name, date_time")
+    parser.add_argument("--attendances", help="CSV: email, subject_name, date_time, attended")
+    parser.add_argument("--dry-run", action="store_true", help="только проверить, ничего не записывая")
+    args = parser.parse_args()
+
+    paths = {name: getattr(args, name) for name in ("subjects", "lessons", "attendances") if getattr(args, name)}
+    if not paths:
+        parser.error("нужен хотя бы один файл")
+
+    files = {name: open(path, "rb") for name, path in paths.items()}
+    db = SessionLocal()
+    try:
+        report = crud_import.import_timetable(db, files, dry_run=args.dry_run, max_rejects=settings.IMPORT_MAX_REJECTS)
+    finally:
+        db.close()
+        for file in files.values():
+            file.close()
+
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    rejected = sum(report[name]["rejected"] for name in ("subjects", "lessons", "attendances"))
+    sys.exit(1 if rejected else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,29 @@
+import asyncio
 import logging
+import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Form, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import Annotated
 
 from core.config import settings
-from api.endpoints import auth, users, predictions, attendances, lessons, subjects
+from api.endpoints import auth, users, predictions, attendances, lessons, subjects, analytics, exports, imports
 from api import deps
-from db.base import SessionLocal
-from db import init_db
+from api.rate_limit import limiter, rate_limit
+from api import catalog_cache
+from api.attendance_writer import attendance_writer
+from core import metrics, security
+from core.publisher import publisher
+from core.cache import VersionedLRUCache
+from db.base import SessionLocal, engine, replicas
+from crud import crud_idempotency, crud_dashboard, crud_partition
 from schemas.user import UserCreate, BalanceUpdate
 from schemas.prediction import PredictionCreate
 
@@ -25,24 +36,106 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 templates = Jinja2Templates(directory="templates")
+# скомпилированные шаблоны переживают перезапуск, в production шаблоны не перечитываются с диска
+os.makedirs(settings.JINJA_BYTECODE_CACHE_DIR, exist_ok=True)
+templates.env.bytecode_cache = FileSystemBytecodeCache(settings.JINJA_BYTECODE_CACHE_DIR)
+templates.env.auto_reload = settings.APP_ENV == "development"
+
+# отрендеренная история по пользователю; версия - users.history_version
+dashboard_history_cache = VersionedLRUCache(settings.DASHBOARD_CACHE_MAX_USERS)
+
+def sweep_expired_idempotency_keys() -> int:
+    db = SessionLocal()
+    try:
+        return crud_idempotency.delete_expired_keys(db)
+    finally:
+        db.close()
+
+async def idempotency_sweeper():
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_SWEEP_INTERVAL_SECONDS)
+        try:
+            deleted = await run_in_threadpool(sweep_expired_idempotency_keys)
+            if deleted:
+                logger.info(f"Удалено просроченных ключей идемпотентности: {deleted}")
+        except Exception as e:
+            logger.error(f"Ошибка при очистке ключей идемпотентности: {e}")
+
+async def rate_limit_sweeper():
+    while True:
+        await asyncio.sleep(settings.RATE_LIMIT_SWEEP_INTERVAL_SECONDS)
+        try:
+            deleted = await run_in_threadpool(limiter.sweep)
+            if deleted:
+                logger.info(f"Удалено восстановившихся корзин ограничителя частоты: {deleted}")
+        except Exception as e:
+            logger.error(f"Ошибка при очистке корзин ограничителя частоты: {e}")
+
+def create_upcoming_partitions() -> int:
+    db = SessionLocal()
+    try:
+        return crud_partition.ensure_partitions(db, settings.PARTITION_PREMAKE_MONTHS)
+    finally:
+        db.close()
+
+async def partition_maintainer():
+    # процесс может работать месяцами: секции на следующие месяцы досоздаются заранее
+    while True:
+        await asyncio.sleep(settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            created = await run_in_threadpool(create_upcoming_partitions)
+            if created:
+                logger.info(f"Создано секций истории: {created}")
+        except Exception as e:
+            logger.error(f"Ошибка при создании секций истории: {e}")
+
+async def replica_health_checker():
+    while True:
+        try:
+            await run_in_threadpool(replicas.check)
+        except Exception as e:
+            logger.error(f"Ошибка проверки реплик БД: {e}")
+        await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL_SECONDS)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Запуск приложения...")
-    logger.info("Попытка инициализации базы данных...")
+    # схему создаёт server.main до запуска процессов; здесь только прогрев кеша процесса
     db: Session | None = None
     try:
         db = SessionLocal()
-        init_db.init_db(db)
-        init_db.seed_db(db)
-        logger.info("Инициализация базы данных завершена.")
+        catalog_cache.warm_up(db)
+        logger.info("Каталог предметов и занятий загружен в кеш.")
     except Exception as e:
-        logger.error(f"Критическая ошибка при инициализации БД: {e}")
+        logger.error(f"Ошибка при загрузке каталога в кеш: {e}")
     finally:
         if db:
             db.close()
+    for name in templates.env.list_templates():
+        templates.get_template(name)
+    sweeper = asyncio.create_task(idempotency_sweeper())
+    # корзины в памяти процесса вытесняются сами, в БД строки копятся по каждому адресу и пользователю
+    bucket_sweeper = asyncio.create_task(rate_limit_sweeper()) if settings.RATE_LIMIT_BACKEND == "postgres" else None
+    partitioner = asyncio.create_task(partition_maintainer())
+    check_in_flusher = asyncio.create_task(attendance_writer.run())
+    replica_checker = asyncio.create_task(replica_health_checker()) if replicas.replicas else None
     yield
     logger.info("Остановка приложения...")
+    # uvicorn к этому моменту уже дождался завершения текущих запросов (GRACEFUL_SHUTDOWN_TIMEOUT)
+    sweeper.cancel()
+    if bucket_sweeper:
+        bucket_sweeper.cancel()
+    partitioner.cancel()
+    if replica_checker:
+        replica_checker.cancel()
+    # очередь отметок дописывается в БД до закрытия пула
+    check_in_flusher.cancel()
+    await asyncio.gather(check_in_flusher, return_exceptions=True)
+    security.shutdown_hash_executor()
+    publisher.close()
+    engine.dispose()
+    replicas.dispose()
+    logger.info("Очередь задач и пул БД закрыты.")
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -58,6 +151,9 @@ app.include_router(predictions.router, prefix=f"{settings.API_V1_STR}/prediction
 app.include_router(attendances.router, prefix=f"{settings.API_V1_STR}/attendances", tags=["Attendances"])
 app.include_router(lessons.router, prefix=f"{settings.API_V1_STR}/lessons", tags=["Lessons"])
 app.include_router(subjects.router, prefix=f"{settings.API_V1_STR}/subjects", tags=["Subjects"])
+app.include_router(analytics.router, prefix=f"{settings.API_V1_STR}/analytics", tags=["Analytics"])
+app.include_router(exports.router, prefix=f"{settings.API_V1_STR}/exports", tags=["Exports"])
+app.include_router(imports.router, prefix=f"{settings.API_V1_STR}/imports", tags=["Imports"])
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
@@ -67,11 +163,11 @@ async def read_root(request: Request):
 async def register_page(request: Request):
     return templates.TemplateResponse("register.html", {"request": request})
 
-@app.post("/register", response_class=HTMLResponse)
+@app.post("/register", response_class=HTMLResponse, dependencies=[Depends(rate_limit("register"))])
 async def register_user(request: Request, email: str = Form(...), password: str = Form(...), db: Session = Depends(deps.get_db)):
     try:
         user_in = UserCreate(email=email, password=password)
-        user = auth.register_user(db=db, user_in=user_in)
+        user = await auth.register_user(db=db, user_in=user_in)
         return RedirectResponse("/login", status_code=303)
     except HTTPException as e:
         return templates.TemplateResponse("register.html", {"request": request, "error": e.detail})
@@ -80,34 +176,48 @@ async def register_user(request: Request, email: str = Form(...), password: str
 async def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
-@app.post("/login", response_class=HTMLResponse)
+@app.post("/login", response_class=HTMLResponse, dependencies=[Depends(rate_limit("login"))])
 async def login_user(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(deps.get_db)):
     try:
-        token = auth.login_for_access_token(db=db, form_data=OAuth2PasswordRequestForm(username=username, password=password))
+        token = await auth.login_for_access_token(db=db, form_data=OAuth2PasswordRequestForm(username=username, password=password))
         response = RedirectResponse("/dashboard", status_code=303)
         response.set_cookie(key="access_token", value=token["access_token"], httponly=True)
         return response
     except HTTPException as e:
         return templates.TemplateResponse("login.html", {"request": request, "error": e.detail})
 
-async def get_current_user_from_cookie(request: Request, db: Session = Depends(deps.get_db)):
-    token = request.cookies.get("access_token")
-    if not token:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    return await deps.get_current_user(db, token)
+def render_dashboard_history(db: Session, current_user: UserModel) -> Markup:
+    # суперпользователь видит чужие предсказания, которые не меняют его версию истории
+    cacheable = not current_user.is_superuser
+    if cacheable:
+        cached = dashboard_history_cache.get(current_user.id, current_user.history_version)
+        if cached is not None:
+            return cached
 
-@app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request, current_user: Annotated[UserModel, Depends(deps.get_current_user_from_cookie)], db: Session = Depends(deps.get_db)):
-    predictions_data = predictions.read_prediction_requests(db=db, current_user=current_user)
-    transactions_data = users.read_transaction_history(db=db, current_user=current_user)
+    predictions_data, transactions_data = crud_dashboard.get_dashboard_rows(
+        db, user_id=current_user.id, all_predictions=current_user.is_superuser
+    )
+    history_html = Markup(templates.get_template("dashboard_history.html").render(
+        predictions=predictions_data,
+        transactions=transactions_data
+    ))
+    if cacheable:
+        dashboard_history_cache.set(current_user.id, current_user.history_version, history_html)
+    return history_html
+
+def render_dashboard(request: Request, db: Session, current_user: UserModel, error: str | None = None):
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
         "user": current_user,
-        "predictions": predictions_data,
-        "transactions": transactions_data,
+        "history_html": render_dashboard_history(db, current_user),
+        "error": error,
         "prediction_cost": settings.PREDICTION_COST
     })
 
+@app.get("/dashboard", response_class=HTMLResponse)
+async def dashboard(request: Request, current_user: Annotated[UserModel, Depends(deps.get_current_user_from_cookie)], db: Session = Depends(deps.get_db)):
+    return render_dashboard(request, db, current_user)
+
 @app.post("/topup", response_class=HTMLResponse)
 async def topup_balance(request: Request, current_user: Annotated[UserModel, Depends(deps.get_current_user_from_cookie)], db: Session = Depends(deps.get_db), amount: float = Form(...)):
     try:
@@ -115,34 +225,17 @@ async def topup_balance(request: Request, current_user: Annotated[UserModel, Dep
         updated_user = users.topup_user_balance(db=db, balance_in=balance_in, current_user=current_user)
         return RedirectResponse("/dashboard", status_code=303)
     except HTTPException as e:
-        predictions_data = predictions.read_prediction_requests(db=db, current_user=current_user)
-        transactions_data = users.read_transaction_history(db=db, current_user=current_user)
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "user": current_user,
-            "predictions": predictions_data,
-            "transactions": transactions_data,
-            "error": e.detail,
-            "prediction_cost": settings.PREDICTION_COST
-        })
-
-@app.post("/predict", response_class=HTMLResponse)
+        return render_dashboard(request, db, current_user, error=e.detail)
+
+@app.post("/predict", response_class=HTMLResponse,
+          dependencies=[Depends(rate_limit("predictions", user_dependency=deps.get_current_user_from_cookie))])
 async def create_prediction(request: Request, current_user: Annotated[UserModel, Depends(deps.get_current_user_from_cookie)], feature1: float = Form(...), feature2: str = Form(...), db: Session = Depends(deps.get_db)):
     try:
         prediction_in = PredictionCreate(input_data={"feature1": feature1, "feature2": feature2})
         prediction_request = predictions.create_prediction_request_endpoint(db=db, prediction_in=prediction_in, current_user=current_user)
         return RedirectResponse("/dashboard", status_code=303)
     except HTTPException as e:
-        predictions_data = predictions.read_prediction_requests(db=db, current_user=current_user)
-        transactions_data = users.read_transaction_history(db=db, current_user=current_user)
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "user": current_user,
-            "predictions": predictions_data,
-            "transactions": transactions_data,
-            "error": e.detail,
-            "prediction_cost": settings.PREDICTION_COST
-        })
+        return render_dashboard(request, db, current_user, error=e.detail)
 
 @app.get("/logout", response_class=HTMLResponse)
 async def logout(request: Request):
@@ -166,12 +259,17 @@ async def health_check():
             db.close()
     return {"status": "healthy", "database": db_status}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    return metrics.render()
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     logger.warning(f"HTTPException: {exc.status_code} {exc.detail} для {request.url}")
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
+        headers=exc.headers,
     )
 
 @app.exception_handler(Exception)
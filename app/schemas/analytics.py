@@ -0,0 +1,59 @@
+from pydantic import BaseModel
+from typing import Optional
+import datetime
+
+class SubjectAttendanceRate(BaseModel):
+    subject_id: int
+    subject_name: str
+    lessons: int
+    total: int
+    attended: int
+    attendance_rate: Optional[float] = None
+
+class LessonAttendanceRate(BaseModel):
+    lesson_id: int
+    subject_id: int
+    date_time: datetime.datetime
+    total: int
+    attended: int
+    attendance_rate: Optional[float] = None
+
+class WeeklyAttendanceRate(BaseModel):
+    week_start: datetime.datetime
+    total: int
+    attended: int
+    attendance_rate: Optional[float] = None
+
+class AtRiskStudent(BaseModel):
+    user_id: int
+    email: str
+    subject_id: int
+    subject_name: str
+    total: int
+    attended: int
+    attendance_rate: Optional[float] = None
+
+class StudentScore(BaseModel):
+    user_id: int
+    email: str
+    probability: float
+    attended_count: int
+    total_count: int
+    scored_at: datetime.datetime
+    model_version: Optional[str] = None
+
+class ShadowReport(BaseModel):
+    primary_version: str
+    shadow_version: str
+    total: int
+    compared: int
+    timeouts: int
+    failures: int
+    agreement_rate: Optional[float] = None
+    mean_abs_diff: Optional[float] = None
+    primary_latency_avg_ms: float
+    primary_latency_p95_ms: float
+    shadow_latency_avg_ms: Optional[float] = None
+    shadow_latency_p95_ms: Optional[float] = None
+    first_at: datetime.datetime
+    last_at: datetime.datetime
@@ -9,4 +9,11 @@ class Attendance(AttendanceBase):
     id: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class CheckInRequest(BaseModel):
+    qr_code_content: str
+
+class CheckInResponse(BaseModel):
+    lesson_id: int
+    status: str
\ No newline at end of file
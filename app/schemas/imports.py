@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import List
+
+class ImportCounts(BaseModel):
+    received: int
+    inserted: int
+    updated: int
+    rejected: int
+
+class ImportReject(BaseModel):
+    file: str
+    line: int
+    error: str
+
+class ImportReport(BaseModel):
+    subjects: ImportCounts
+    lessons: ImportCounts
+    attendances: ImportCounts
+    rejects: List[ImportReject]
+    dry_run: bool
@@ -9,4 +9,12 @@ class Lesson(LessonBase):
     id: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class LessonCreate(LessonBase):
+    pass
+
+class LessonQRCode(BaseModel):
+    lesson_id: int
+    qr_code_content: str
+    expires_at: int
\ No newline at end of file
@@ -29,6 +29,7 @@ class PredictionRequest(BaseModel):
     cost: Optional[float] = None
     timestamp_created: datetime.datetime
     timestamp_completed: Optional[datetime.datetime] = None
+    model_version: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -7,4 +7,7 @@ class Subject(SubjectBase):
     id: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SubjectCreate(SubjectBase):
+    pass
\ No newline at end of file
@@ -0,0 +1,53 @@
+import logging
+
+import uvicorn
+
+from core.config import settings
+from db import init_db
+from db.base import SessionLocal, engine
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def init_database():
+    # схема и суперпользователь создаются один раз до запуска процессов uvicorn, а не в каждом из них
+    logger.info("Попытка инициализации базы данных...")
+    db = SessionLocal()
+    try:
+        init_db.init_db(db)
+        init_db.seed_db(db)
+        logger.info("Инициализация базы данных завершена.")
+    except Exception as e:
+        logger.error(f"Критическая ошибка при инициализации БД: {e}")
+    finally:
+        db.close()
+        # соединения родительского процесса не нужны воркерам
+        engine.dispose()
+
+
+def main():
+    init_database()
+    if settings.APP_ENV == "development":
+        uvicorn.run("main:app", host=settings.HOST, port=settings.PORT, reload=True)
+        return
+
+    # число процессов по ядрам; каждый процесс строит свой пул БД из settings.db_pool_options()
+    uvicorn.run(
+        "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.web_workers,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.TRUSTED_PROXIES,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+        # дольше, чем nginx держит простаивающие keepalive-соединения к апстриму
+        timeout_keep_alive=75,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import datetime
+import logging
+import os
+import signal
+import time
+
+import numpy as np
+from sqlalchemy import Float, cast, column, delete, extract, func, select, table, update
+from sqlalchemy.dialects.postgresql import insert
+
+from ml_model import schedule_now, to_seconds
+from model_registry import ModelRegistry
+from worker import SessionLocal, engine
+from db.models.attendance import Attendance
+from db.models.student_score import StudentScore
+from db.models.scoring_checkpoint import ScoringCheckpoint
+
+# таблицы через Core: воркеру не нужны ORM-связи с остальными моделями приложения
+attendances = Attendance.__table__
+student_scores = StudentScore.__table__
+scoring_checkpoints = ScoringCheckpoint.__table__
+# в образе воркера нет модели Lesson: для истории отметок хватает облегчённой таблицы
+lessons = table("lessons", column("id"), column("date_time"), column("subject_id"))
+
+# Ночная оценка всех студентов. Запуск по расписанию (cron / профиль batch в docker-compose):
+#   python batch_scoring.py [--chunk-rows N] [--restart]
+# Отметки читаются серверным курсором в порядке user_id, каждая пачка оценивается одним
+# векторным вызовом модели и записывается в student_scores вместе с контрольной точкой.
+# Для моделей с признаками истории вместе с отметками читаются время и предмет занятия.
+# Память ограничена размером пачки (плюс история одного студента); прерванный прогон
+# продолжается с последнего записанного студента.
+
+JOB_NAME = "nightly_attendance_scores"
+
+stopping = False
+
+
+def utcnow():
+    # колонки без часового пояса хранят UTC
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def iter_user_chunks(db, after_user_id, chunk_rows, history=False):
+    if history:
+        # модели с признаками истории нужны время и предмет каждой отметки - та же история, что у воркера
+        query = (
+            select(attendances.c.user_id, attendances.c.attended,
+                   cast(extract("epoch", lessons.c.date_time), Float), func.coalesce(lessons.c.subject_id, 0))
+            .join(lessons, lessons.c.id == attendances.c.lesson_id)
+            .where(attendances.c.user_id > after_user_id, attendances.c.attended.isnot(None))
+            .order_by(attendances.c.user_id, lessons.c.date_time, attendances.c.id)
+        )
+        dtypes = (np.int64, bool, np.float64, np.int64)
+    else:
+        query = (
+            select(attendances.c.user_id, attendances.c.attended)
+            .where(attendances.c.user_id > after_user_id, attendances.c.attended.isnot(None))
+            .order_by(attendances.c.user_id)
+        )
+        dtypes = (np.int64, bool)
+    result = db.execute(query.execution_options(yield_per=chunk_rows))
+    carry = [np.empty(0, dtype=dtype) for dtype in dtypes]
+    for partition in result.partitions():
+        columns = [
+            np.concatenate((
+                carried,
+                np.fromiter((bool(row[i]) if dtype is bool else row[i] for row in partition),
+                            dtype=dtype, count=len(partition))
+            ))
+            for i, (carried, dtype) in enumerate(zip(carry, dtypes))
+        ]
+        users = columns[0]
+        # последний студент пачки может продолжиться в следующей - его строки переносятся
+        cut = int(np.searchsorted(users, users[-1]))
+        carry = [values[cut:] for values in columns]
+        if cut:
+            yield [values[:cut] for values in columns]
+    if len(carry[0]):
+        yield carry
+
+
+def start_run(db, restart):
+    checkpoint = db.execute(
+        select(scoring_checkpoints).where(scoring_checkpoints.c.job_name == JOB_NAME)
+    ).mappings().first()
+    if checkpoint is not None and checkpoint["completed_at"] is None and not restart:
+        logging.info(
+            f"Продолжаем прогон от {checkpoint['run_started_at']}: "
+            f"оценено {checkpoint['students_scored']}, последний студент {checkpoint['last_user_id']}"
+        )
+        return dict(checkpoint)
+    checkpoint = {
+        "job_name": JOB_NAME,
+        "run_started_at": utcnow(),
+        "last_user_id": 0,
+        "students_scored": 0,
+        "completed_at": None,
+    }
+    stmt = insert(scoring_checkpoints).values(**checkpoint)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[scoring_checkpoints.c.job_name],
+        set_={column: stmt.excluded[column] for column in checkpoint if column != "job_name"}
+    ))
+    db.commit()
+    return checkpoint
+
+
+def save_checkpoint(db, checkpoint):
+    db.execute(
+        update(scoring_checkpoints)
+        .where(scoring_checkpoints.c.job_name == JOB_NAME)
+        .values(
+            last_user_id=checkpoint["last_user_id"],
+            students_scored=checkpoint["students_scored"],
+            completed_at=checkpoint["completed_at"],
+        )
+    )
+
+
+def write_scores(db, checkpoint, model_version, users, attended_counts, total_counts, probabilities):
+    scored_at = utcnow()
+    rows = [
+        {
+            "user_id": user_id,
+            "probability": probability,
+            "attended_count": attended_count,
+            "total_count": total_count,
+            "scored_at": scored_at,
+            "run_started_at": checkpoint["run_started_at"],
+            "model_version": model_version,
+        }
+        for user_id, attended_count, total_count, probability in zip(
+            users.tolist(), attended_counts.tolist(), total_counts.tolist(), probabilities.tolist()
+        )
+    ]
+    stmt = insert(student_scores)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[student_scores.c.user_id],
+        set_={column: stmt.excluded[column] for column in rows[0] if column != "user_id"}
+    )
+    db.execute(stmt, rows)
+    # оценки и контрольная точка фиксируются одной транзакцией
+    checkpoint["last_user_id"] = rows[-1]["user_id"]
+    checkpoint["students_scored"] += len(rows)
+    save_checkpoint(db, checkpoint)
+    db.commit()
+
+
+def run(chunk_rows, restart=False):
+    reader = SessionLocal()
+    writer = SessionLocal()
+    try:
+        checkpoint = start_run(writer, restart)
+        model = ModelRegistry().load_current()
+        logging.info(f"Оценка моделью {model.version}")
+        # модели с признаками истории (затухание, предметы, серии) оцениваются по полной истории отметок
+        history = getattr(model, "decayed", False)
+        now = to_seconds(schedule_now())
+        started = time.monotonic()
+        scored = 0
+        for chunk in iter_user_chunks(reader, checkpoint["last_user_id"], chunk_rows, history):
+            chunk_started = time.monotonic()
+            user_ids = chunk[0]
+            users, attended_counts, total_counts, probabilities = model.predict_batch(*chunk, now=now)
+            write_scores(writer, checkpoint, model.version, users, attended_counts, total_counts, probabilities)
+            scored += len(users)
+            elapsed = time.monotonic() - started
+            logging.info(
+                f"Пачка: {len(users)} студентов, {len(user_ids)} отметок за {time.monotonic() - chunk_started:.2f} с; "
+                f"всего {checkpoint['students_scored']} студентов, {scored / elapsed:.0f} студентов/с"
+            )
+            if stopping:
+                logging.info(f"Остановка: прогон продолжится после студента {checkpoint['last_user_id']}")
+                return
+        # студенты, которых не было в этом прогоне (нет отметок), больше не оцениваются
+        writer.execute(delete(student_scores).where(student_scores.c.run_started_at < checkpoint["run_started_at"]))
+        checkpoint["completed_at"] = utcnow()
+        save_checkpoint(writer, checkpoint)
+        writer.commit()
+        elapsed = time.monotonic() - started
+        logging.info(
+            f"Прогон завершён: {scored} студентов за {elapsed:.1f} с "
+            f"({scored / elapsed if elapsed else 0:.0f} студентов/с), всего в прогоне {checkpoint['students_scored']}"
+        )
+    finally:
+        reader.close()
+        writer.close()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ночная пакетная оценка посещаемости всех студентов")
+    parser.add_argument("--chunk-rows", type=int, default=int(os.getenv("BATCH_SCORING_CHUNK_ROWS", "100000")),
+                        help="отметок в одной пачке серверного курсора")
+    parser.add_argument("--restart", action="store_true", help="начать прогон заново, игнорируя контрольную точку")
+    args = parser.parse_args()
+
+    def stop(signum, frame):
+        global stopping
+        logging.info("Получен сигнал остановки, завершаем после текущей пачки...")
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    run(args.chunk_rows, restart=args.restart)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# модули воркера импортируются по короткому имени, как при запуске из каталога workers (PYTHONPATH=..:.)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
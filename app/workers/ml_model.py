@@ -1,7 +1,343 @@
-import random
+import datetime
+import math
+import os
+from zoneinfo import ZoneInfo
 
-def predict(history):
-    # для примера предсказание вероятности следующего посещения на основе истории посещений
-    attended_count = sum(record['attended'] for record in history)
-    probability = attended_count / len(history) if history else 0.5
-    return {"probability": probability}
\ No newline at end of file
+import numpy as np
+
+# Модели предсказания вероятности следующего посещения по истории посещений.
+# Вид модели ("kind") и порядок признаков задаются манифестом артефакта в реестре (model_registry.py).
+
+# время занятий хранится в часовом поясе расписания (SCHEDULE_TIMEZONE приложения);
+# в признаках оно - секунды от 1970-01-01 по тем же часам
+SCHEDULE_TIMEZONE = os.getenv("SCHEDULE_TIMEZONE", "Europe/Moscow")
+EPOCH = datetime.datetime(1970, 1, 1)
+DAY_SECONDS = 86400.0
+# вес отметки падает вдвое за half_life_days; модель может задать свой период в манифесте
+HALF_LIFE_DAYS = 14.0
+# границы частей дня в часах: утро [0, 12), день [12, 16), вечер [16, 24)
+DAYPART_BOUNDS = np.array([12.0, 16.0])
+
+BASE_FEATURES = ("bias", "attendance_rate", "log_total")
+DECAYED_FEATURES = (
+    "decayed_rate",
+    "decayed_weight",
+    "subject_rate_min",
+    "subject_rate_mean",
+    "subject_rate_max",
+    *(f"weekday_rate_{day}" for day in range(7)),
+    *(f"daypart_rate_{part}" for part in range(len(DAYPART_BOUNDS) + 1)),
+    "now_weekday_rate",
+    "now_daypart_rate",
+    "streak_attended",
+    "streak_missed",
+    "longest_missed_streak",
+    "days_since_last",
+)
+FEATURE_NAMES = BASE_FEATURES + DECAYED_FEATURES
+
+
+def to_seconds(moment):
+    return (moment - EPOCH).total_seconds()
+
+
+def schedule_now():
+    return datetime.datetime.now(ZoneInfo(SCHEDULE_TIMEZONE)).replace(tzinfo=None)
+
+
+def history_arrays(history):
+    # список отметок -> (время занятия в секундах, код предмета, посещено);
+    # разбор одним проходом генераторов: np.array по datetime и строкам в разы медленнее
+    count = len(history)
+    times = np.fromiter((to_seconds(record['date_time']) for record in history), dtype=np.float64, count=count)
+    codes = {}
+    subjects = np.fromiter(
+        (codes.setdefault(record['subject_name'], len(codes)) for record in history), dtype=np.intp, count=count
+    )
+    attended = np.fromiter((bool(record['attended']) for record in history), dtype=bool, count=count)
+    return times, subjects, attended
+
+
+def row_arrays(rows):
+    # строки БД (время занятия в секундах, id предмета, посещено) -> массивы истории;
+    # id предметов перекодируются в 0..k-1, чтобы bincount не зависел от их величины
+    count = len(rows)
+    times = np.fromiter((row[0] for row in rows), dtype=np.float64, count=count)
+    _, subjects = np.unique(np.fromiter((row[1] for row in rows), dtype=np.int64, count=count), return_inverse=True)
+    attended = np.fromiter((bool(row[2]) for row in rows), dtype=bool, count=count)
+    return times, subjects.reshape(-1), attended
+
+
+def _weighted_rates(groups, size, weights, hits, default):
+    total = np.bincount(groups, weights, minlength=size)
+    attended = np.bincount(groups, hits, minlength=size)
+    return np.divide(attended, total, out=np.full(size, default), where=total > 0), total > 0
+
+
+def decayed_features(times, subjects, attended, now, half_life_days=HALF_LIFE_DAYS):
+    # Все признаки считаются над массивами без цикла по отметкам: веса exp2(-возраст / период),
+    # доли по предметам, дням недели и частям дня - взвешенные bincount, серии - по позициям пропусков.
+    if len(times) == 0:
+        features = dict.fromkeys(DECAYED_FEATURES, 0.5)
+        features.update(decayed_weight=0.0, streak_attended=0.0, streak_missed=0.0,
+                        longest_missed_streak=0.0, days_since_last=-1.0)
+        return features
+
+    order = np.argsort(times, kind="stable")
+    times, subjects, attended = times[order], subjects[order], attended[order]
+    count = len(times)
+
+    age_days = (now - times) / DAY_SECONDS
+    weights = np.exp2(-np.maximum(age_days, 0.0) / half_life_days)
+    hits = weights * attended
+    weight_sum = weights.sum()
+    decayed_rate = hits.sum() / weight_sum if weight_sum > 0 else 0.5
+
+    subject_rates, _ = _weighted_rates(subjects, subjects.max() + 1, weights, hits, decayed_rate)
+    subject_rates = subject_rates[np.bincount(subjects) > 0]
+
+    # 1970-01-01 - четверг: день недели с понедельника = (дни от эпохи + 3) % 7
+    days, day_seconds = np.divmod(times, DAY_SECONDS)
+    weekdays = (days.astype(np.intp) + 3) % 7
+    dayparts = np.searchsorted(DAYPART_BOUNDS, day_seconds / 3600.0, side="right")
+    weekday_rates, _ = _weighted_rates(weekdays, 7, weights, hits, decayed_rate)
+    daypart_rates, _ = _weighted_rates(dayparts, len(DAYPART_BOUNDS) + 1, weights, hits, decayed_rate)
+
+    now_day, now_seconds = divmod(now, DAY_SECONDS)
+    now_weekday = (int(now_day) + 3) % 7
+    now_daypart = int(np.searchsorted(DAYPART_BOUNDS, now_seconds / 3600.0, side="right"))
+
+    missed_at = np.flatnonzero(~attended)
+    attended_at = np.flatnonzero(attended)
+    # длины серий пропусков - расстояния между границами серий в дополненном нулями массиве
+    edges = np.flatnonzero(np.diff(np.r_[0, (~attended).view(np.int8), 0]))
+    missed_runs = edges[1::2] - edges[::2]
+
+    features = {
+        "decayed_rate": float(decayed_rate),
+        "decayed_weight": float(weight_sum),
+        "subject_rate_min": float(subject_rates.min()),
+        "subject_rate_mean": float(subject_rates.mean()),
+        "subject_rate_max": float(subject_rates.max()),
+        "now_weekday_rate": float(weekday_rates[now_weekday]),
+        "now_daypart_rate": float(daypart_rates[now_daypart]),
+        "streak_attended": float(count - 1 - missed_at[-1] if len(missed_at) else count),
+        "streak_missed": float(count - 1 - attended_at[-1] if len(attended_at) else count),
+        "longest_missed_streak": float(missed_runs.max() if len(missed_runs) else 0),
+        "days_since_last": float(age_days[-1]),
+    }
+    features.update((f"weekday_rate_{day}", float(rate)) for day, rate in enumerate(weekday_rates))
+    features.update((f"daypart_rate_{part}", float(rate)) for part, rate in enumerate(daypart_rates))
+    return features
+
+
+def _grouped_rates(keys, size, weights, hits, defaults):
+    total = np.bincount(keys, weights, minlength=size)
+    attended = np.bincount(keys, hits, minlength=size)
+    return np.divide(attended, total, out=np.array(defaults, dtype=np.float64), where=total > 0)
+
+
+def _group_starts(groups):
+    # groups отсортирован: начала участков с одинаковым значением
+    return np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.empty(0, dtype=np.intp)
+
+
+def _last_positions(groups, positions, size):
+    # позиция последней выбранной отметки каждого студента, -1 если таких нет
+    last = np.full(size, -1, dtype=np.int64)
+    if len(groups):
+        ends = np.r_[groups[1:] != groups[:-1], True]
+        last[groups[ends]] = positions[ends]
+    return last
+
+
+def decayed_feature_columns(groups, size, times, subjects, attended, now, half_life_days=HALF_LIFE_DAYS):
+    # decayed_features сразу для size студентов (пакетная оценка): отметка i принадлежит студенту groups[i],
+    # subjects - неотрицательные коды предметов. Те же формулы, но bincount по ключу (студент, группа)
+    # и серии по позициям внутри студента; для одного студента decayed_features быстрее - меньше вызовов numpy.
+    order = np.lexsort((times, groups))
+    groups, times, subjects, attended = groups[order], times[order], subjects[order], attended[order]
+    counts = np.bincount(groups, minlength=size)
+    starts = np.cumsum(counts) - counts
+
+    age_days = (now - times) / DAY_SECONDS
+    weights = np.exp2(-np.maximum(age_days, 0.0) / half_life_days)
+    hits = weights * attended
+    weight_sum = np.bincount(groups, weights, minlength=size)
+    decayed_rate = _grouped_rates(groups, size, weights, hits, np.full(size, 0.5))
+
+    # доли по парам (студент, предмет), встретившимся в истории; у студента без отметок - 0.5
+    subject_count = int(subjects.max()) + 1 if len(subjects) else 1
+    pairs, pair_keys = np.unique(groups.astype(np.int64) * subject_count + subjects, return_inverse=True)
+    pair_groups = pairs // subject_count
+    pair_rates = _grouped_rates(pair_keys.reshape(-1), len(pairs), weights, hits, decayed_rate[pair_groups])
+    subject_min, subject_mean, subject_max = np.full(size, 0.5), np.full(size, 0.5), np.full(size, 0.5)
+    if len(pairs):
+        pair_starts = _group_starts(pair_groups)
+        present = pair_groups[pair_starts]
+        subject_min[present] = np.minimum.reduceat(pair_rates, pair_starts)
+        subject_max[present] = np.maximum.reduceat(pair_rates, pair_starts)
+        subject_mean[present] = np.add.reduceat(pair_rates, pair_starts) / np.diff(np.r_[pair_starts, len(pairs)])
+
+    # 1970-01-01 - четверг: день недели с понедельника = (дни от эпохи + 3) % 7
+    days, day_seconds = np.divmod(times, DAY_SECONDS)
+    weekdays = (days.astype(np.intp) + 3) % 7
+    dayparts = np.searchsorted(DAYPART_BOUNDS, day_seconds / 3600.0, side="right")
+    parts = len(DAYPART_BOUNDS) + 1
+    weekday_rates = _grouped_rates(groups * 7 + weekdays, size * 7, weights, hits,
+                                   np.repeat(decayed_rate, 7)).reshape(size, 7)
+    daypart_rates = _grouped_rates(groups * parts + dayparts, size * parts, weights, hits,
+                                   np.repeat(decayed_rate, parts)).reshape(size, parts)
+
+    now_day, now_seconds = divmod(now, DAY_SECONDS)
+    now_weekday = (int(now_day) + 3) % 7
+    now_daypart = int(np.searchsorted(DAYPART_BOUNDS, now_seconds / 3600.0, side="right"))
+
+    # серия от последней отметки: count - 1 - позиция последней отметки противоположного вида
+    positions = np.arange(len(times)) - starts[groups]
+    missed = ~attended
+    streak_attended = counts - 1 - _last_positions(groups[missed], positions[missed], size)
+    streak_missed = counts - 1 - _last_positions(groups[attended], positions[attended], size)
+
+    # серии пропусков не переходят через границу студентов
+    run_starts = missed & ((positions == 0) | ~np.r_[False, missed[:-1]])
+    run_ids = np.cumsum(run_starts)[missed] - 1
+    run_lengths = np.bincount(run_ids) if len(run_ids) else np.empty(0, dtype=np.int64)
+    run_groups = groups[run_starts]
+    longest_missed = np.zeros(size)
+    if len(run_groups):
+        run_group_starts = _group_starts(run_groups)
+        longest_missed[run_groups[run_group_starts]] = np.maximum.reduceat(run_lengths, run_group_starts)
+
+    days_since_last = np.full(size, -1.0)
+    days_since_last[counts > 0] = age_days[(starts + counts - 1)[counts > 0]]
+
+    columns = {
+        "decayed_rate": decayed_rate,
+        "decayed_weight": weight_sum,
+        "subject_rate_min": subject_min,
+        "subject_rate_mean": subject_mean,
+        "subject_rate_max": subject_max,
+        "now_weekday_rate": weekday_rates[:, now_weekday],
+        "now_daypart_rate": daypart_rates[:, now_daypart],
+        "streak_attended": streak_attended.astype(np.float64),
+        "streak_missed": streak_missed.astype(np.float64),
+        "longest_missed_streak": longest_missed,
+        "days_since_last": days_since_last,
+    }
+    columns.update((f"weekday_rate_{day}", weekday_rates[:, day]) for day in range(7))
+    columns.update((f"daypart_rate_{part}", daypart_rates[:, part]) for part in range(parts))
+    return columns
+
+
+def history_features(history, now=None, half_life_days=HALF_LIFE_DAYS, decayed=True):
+    if not decayed:
+        attended_count = sum(record['attended'] for record in history)
+        return {
+            "bias": 1.0,
+            "attendance_rate": attended_count / len(history) if history else 0.5,
+            "log_total": math.log1p(len(history)),
+        }
+    now = to_seconds(schedule_now() if now is None else now)
+    return array_features(*history_arrays(history), now, half_life_days)
+
+
+def array_features(times, subjects, attended, now, half_life_days=HALF_LIFE_DAYS, decayed=True):
+    # все признаки FEATURE_NAMES по массивам истории; общий путь для воркера и обучения (train_model.py)
+    features = {
+        "bias": 1.0,
+        "attendance_rate": float(attended.mean()) if len(attended) else 0.5,
+        "log_total": math.log1p(len(attended)),
+    }
+    if decayed:
+        features.update(decayed_features(times, subjects, attended, now, half_life_days))
+    return features
+
+
+def count_features(attended_counts, total_counts):
+    # те же признаки, что history_features, сразу для многих студентов
+    return {
+        "bias": np.ones(len(total_counts)),
+        "attendance_rate": attended_counts / total_counts,
+        "log_total": np.log1p(total_counts),
+    }
+
+
+def group_by_user(user_ids, attended):
+    # отметки отсортированы по user_id: границы студентов находятся одним сравнением соседей
+    starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+    total_counts = np.diff(np.r_[starts, len(user_ids)])
+    attended_counts = np.add.reduceat(attended.astype(np.int64), starts)
+    return user_ids[starts], attended_counts, total_counts
+
+
+class RatioModel:
+    # доля посещённых занятий; модель по умолчанию, пока в реестре нет ни одной версии
+    kind = "ratio"
+
+    def __init__(self, version, manifest=None):
+        self.version = version
+        self.manifest = manifest or {"version": version, "kind": self.kind}
+
+    def predict(self, history, now=None):
+        return {"probability": history_features(history, decayed=False)["attendance_rate"]}
+
+    def predict_arrays(self, times, subjects, attended, now):
+        return {"probability": float(attended.mean()) if len(attended) else 0.5}
+
+    def predict_batch(self, user_ids, attended, times=None, subjects=None, now=None):
+        users, attended_counts, total_counts = group_by_user(user_ids, attended)
+        return users, attended_counts, total_counts, attended_counts / total_counts
+
+
+class LogisticModel:
+    kind = "logistic"
+
+    def __init__(self, version, manifest, weights):
+        self.version = version
+        self.manifest = manifest
+        self.feature_names = manifest["features"]
+        # weights может быть np.memmap: веса не копируются в память процесса
+        self.weights = weights
+        if len(self.weights) != len(self.feature_names):
+            raise ValueError(
+                f"Модель {version}: {len(self.weights)} весов на {len(self.feature_names)} признаков"
+            )
+        unknown = set(self.feature_names) - set(FEATURE_NAMES)
+        if unknown:
+            raise ValueError(f"Модель {version}: неизвестные признаки {sorted(unknown)}")
+        self.half_life_days = float(manifest.get("half_life_days", HALF_LIFE_DAYS))
+        self.decayed = not set(self.feature_names) <= set(BASE_FEATURES)
+
+    def predict(self, history, now=None):
+        features = history_features(history, now, self.half_life_days, self.decayed)
+        return self._probability(features)
+
+    def predict_arrays(self, times, subjects, attended, now):
+        return self._probability(array_features(times, subjects, attended, now, self.half_life_days, self.decayed))
+
+    def _probability(self, features):
+        x = np.array([features[name] for name in self.feature_names])
+        return {"probability": float(1.0 / (1.0 + np.exp(-(x @ self.weights))))}
+
+    def predict_batch(self, user_ids, attended, times=None, subjects=None, now=None):
+        users, attended_counts, total_counts = group_by_user(user_ids, attended)
+        if self.decayed:
+            if times is None:
+                raise ValueError(f"Модель {self.version}: для признаков истории нужны время и предметы занятий")
+            # признаки истории всех студентов пачки - одним расчётом по ключу студента, тем же кодом, что и в воркере
+            _, subjects = np.unique(subjects, return_inverse=True)
+            groups = np.repeat(np.arange(len(users)), total_counts)
+            features = count_features(attended_counts, total_counts)
+            features.update(decayed_feature_columns(groups, len(users), times, subjects.reshape(-1), attended, now,
+                                                    self.half_life_days))
+        else:
+            features = count_features(attended_counts, total_counts)
+        x = np.column_stack([features[name] for name in self.feature_names])
+        return users, attended_counts, total_counts, 1.0 / (1.0 + np.exp(-(x @ self.weights)))
+
+
+MODEL_KINDS = {
+    RatioModel.kind: RatioModel,
+    LogisticModel.kind: LogisticModel,
+}
@@ -0,0 +1,172 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ml_model import MODEL_KINDS, RatioModel
+
+# Реестр моделей на локальном диске:
+#   <root>/<version>/manifest.json  {"version", "kind", "features", ...}
+#   <root>/<version>/weights.npy    веса (если нужны виду модели), открываются через mmap
+#   <root>/CURRENT                  имя активной версии
+#   <root>/SHADOW                   имя версии-кандидата для теневой оценки (необязателен)
+# Версия публикуется переименованием готового каталога, активируется заменой CURRENT
+# (os.replace) - читатель всегда видит либо старую, либо новую версию целиком.
+
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "/models")
+BUILTIN_VERSION = "builtin-ratio"
+
+
+class ModelRegistry:
+    def __init__(self, root=MODEL_REGISTRY_DIR):
+        self.root = root
+
+    def list_versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, "manifest.json"))
+        )
+
+    def _read_pointer(self, name):
+        try:
+            with open(os.path.join(self.root, name)) as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_pointer(self, name, version):
+        tmp_path = os.path.join(self.root, f".{name}.{os.getpid()}")
+        with open(tmp_path, "w") as file:
+            file.write(version)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, os.path.join(self.root, name))
+
+    def current_version(self):
+        return self._read_pointer("CURRENT")
+
+    def shadow_version(self):
+        return self._read_pointer("SHADOW")
+
+    def load(self, version):
+        if version is None or version == BUILTIN_VERSION:
+            return RatioModel(BUILTIN_VERSION)
+        path = os.path.join(self.root, version)
+        with open(os.path.join(path, "manifest.json")) as file:
+            manifest = json.load(file)
+        model_class = MODEL_KINDS[manifest["kind"]]
+        weights_path = os.path.join(path, "weights.npy")
+        if os.path.exists(weights_path):
+            return model_class(version, manifest, np.load(weights_path, mmap_mode="r"))
+        return model_class(version, manifest)
+
+    def load_current(self):
+        return self.load(self.current_version())
+
+    def publish(self, version, manifest, weights=None):
+        os.makedirs(self.root, exist_ok=True)
+        target = os.path.join(self.root, version)
+        if os.path.exists(target):
+            raise FileExistsError(f"Версия {version} уже есть в реестре")
+        staging = tempfile.mkdtemp(prefix=f".{version}-", dir=self.root)
+        try:
+            with open(os.path.join(staging, "manifest.json"), "w") as file:
+                json.dump({**manifest, "version": version}, file, ensure_ascii=False, indent=2)
+            if weights is not None:
+                np.save(os.path.join(staging, "weights.npy"), np.asarray(weights, dtype=np.float64))
+            os.rename(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return target
+
+    def activate(self, version):
+        # проверяем, что версия загружается, до того как на неё переключатся воркеры
+        self.load(version)
+        self._write_pointer("CURRENT", version)
+
+    def set_shadow(self, version):
+        if version is None:
+            try:
+                os.remove(os.path.join(self.root, "SHADOW"))
+            except FileNotFoundError:
+                pass
+            return
+        self.load(version)
+        self._write_pointer("SHADOW", version)
+
+
+# Текущая модель процесса. Ссылка на модель заменяется одним присваиванием после полной
+# загрузки новой версии; обработчик берёт model один раз на задачу, поэтому задача
+# целиком считается одной версией.
+class ModelHolder:
+    def __init__(self, registry):
+        self.registry = registry
+        self.model = registry.load_current()
+        logging.info(f"Загружена модель {self.model.version}")
+        self.shadow = None
+        self._refresh_shadow()
+
+    def refresh(self):
+        self._refresh_shadow()
+        version = self.registry.current_version() or BUILTIN_VERSION
+        if version == self.model.version:
+            return False
+        try:
+            model = self.registry.load(version)
+        except Exception as e:
+            logging.error(f"Не удалось загрузить модель {version}, остаётся {self.model.version}: {e}")
+            return False
+        previous, self.model = self.model.version, model
+        logging.info(f"Модель переключена: {previous} -> {model.version}")
+        return True
+
+    def _refresh_shadow(self):
+        version = self.registry.shadow_version()
+        if version == (self.shadow.version if self.shadow else None):
+            return
+        if version is None:
+            logging.info("Теневая оценка выключена")
+            self.shadow = None
+            return
+        try:
+            self.shadow = self.registry.load(version)
+            logging.info(f"Теневая модель: {version}")
+        except Exception as e:
+            logging.error(f"Не удалось загрузить теневую модель {version}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Реестр моделей предсказания посещаемости")
+    parser.add_argument("--root", default=MODEL_REGISTRY_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="версии в реестре")
+    activate = commands.add_parser("activate", help="сделать версию активной")
+    activate.add_argument("version")
+    shadow = commands.add_parser("shadow", help="оценивать версию в тени рядом с активной")
+    shadow.add_argument("version", nargs="?", help="без версии теневая оценка выключается")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "list":
+        current = registry.current_version() or BUILTIN_VERSION
+        shadow = registry.shadow_version()
+        for version in [BUILTIN_VERSION, *registry.list_versions()]:
+            mark = "*" if version == current else "~" if version == shadow else " "
+            print(f"{mark} {version}")
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"Активна версия {args.version}")
+    elif args.command == "shadow":
+        registry.set_shadow(args.version)
+        print(f"Теневая версия: {args.version}" if args.version else "Теневая оценка выключена")
+
+
+if __name__ == '__main__':
+    main()
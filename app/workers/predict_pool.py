@@ -0,0 +1,132 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from model_registry import ModelRegistry
+
+# Пул процессов для predict: расчёт признаков и модели не держит GIL процесса воркера,
+# поэтому цикл pika (heartbeat, подтверждения) продолжает работать, пока идёт предсказание.
+# Каждый процесс загружает активную модель при старте и подгружает другую версию,
+# только если задача пришла с ней (после переключения в реестре).
+# История и результат передаются через общую память: на каждую задачу в полёте - свой слот
+# с массивами времени, предмета и отметки на HISTORY_SLOT_ROWS строк и ячейкой результата.
+# Между процессами сериализуются только номер слота, длина истории, момент и версия модели;
+# история длиннее слота передаётся массивами NumPy.
+# Аварийное завершение процесса (OOM, сигнал) ломает весь ProcessPoolExecutor: задачи в полёте
+# получают BrokenProcessPool, пул пересоздаётся с той же общей памятью.
+
+HISTORY_SLOT_ROWS = int(os.getenv("PREDICT_HISTORY_SLOT_ROWS", "4096"))
+# байт на строку истории: время float64 + предмет int64 + отметка bool
+ROW_BYTES = 8 + 8 + 1
+
+
+def _slot_views(buffer, slots, rows):
+    times = np.ndarray((slots, rows), dtype=np.float64, buffer=buffer)
+    offset = times.nbytes
+    subjects = np.ndarray((slots, rows), dtype=np.int64, buffer=buffer, offset=offset)
+    offset += subjects.nbytes
+    attended = np.ndarray((slots, rows), dtype=bool, buffer=buffer, offset=offset)
+    offset += attended.nbytes
+    results = np.ndarray((slots,), dtype=np.float64, buffer=buffer, offset=offset)
+    return times, subjects, attended, results
+
+
+# состояние дочернего процесса
+_child = {}
+
+
+def _init_child(shm_name, slots, rows, registry_root):
+    # дочерние процессы spawn используют трекер ресурсов родителя, общая память удаляется один раз в shutdown
+    shm = SharedMemory(name=shm_name)
+    registry = ModelRegistry(registry_root)
+    _child.update(shm=shm, views=_slot_views(shm.buf, slots, rows), registry=registry,
+                  model=registry.load_current())
+
+
+def _predict(slot, count, now, version, arrays=None):
+    model = _child["model"]
+    if model.version != version:
+        model = _child["model"] = _child["registry"].load(version)
+    times, subjects, attended, results = _child["views"]
+    if arrays is None:
+        arrays = times[slot, :count], subjects[slot, :count], attended[slot, :count]
+    results[slot] = model.predict_arrays(*arrays, now)["probability"]
+
+
+class PredictPool:
+    def __init__(self, processes, registry_root, rows=HISTORY_SLOT_ROWS):
+        self.slots = processes
+        self.rows = rows
+        self.registry_root = registry_root
+        self._shm = SharedMemory(create=True, size=processes * (rows * ROW_BYTES + 8))
+        self._times, self._subjects, self._attended, self._results = _slot_views(self._shm.buf, processes, rows)
+        self._free = list(range(processes))
+        # номер исполнителя, которому отдана задача слота: сломанный пул пересоздаётся один раз
+        self._generation = 0
+        self._slot_generations = [0] * processes
+        self._start()
+        logging.info(f"Пул предсказаний: {processes} процессов, слот истории {rows} строк")
+
+    def _start(self):
+        # spawn: процесс воркера к моменту запуска пула уже держит потоки и соединения
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.slots,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_child,
+            initargs=(self._shm.name, self.slots, self.rows, self.registry_root),
+        )
+        self._generation += 1
+
+    def _restart(self):
+        logging.warning("Процесс пула предсказаний завершился аварийно, пул перезапускается")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._start()
+
+    def recover(self, slot):
+        # вызывается, когда задача слота получила BrokenProcessPool
+        if self._slot_generations[slot] == self._generation:
+            self._restart()
+
+    def in_flight(self):
+        return self.slots - len(self._free)
+
+    def submit(self, model_version, times, subjects, attended, now):
+        # возвращает (слот, future); результат забирается через result(slot) после завершения future
+        slot = self._free.pop()
+        count = len(times)
+        try:
+            if count <= self.rows:
+                self._times[slot, :count] = times
+                self._subjects[slot, :count] = subjects
+                self._attended[slot, :count] = attended
+                call = (_predict, slot, count, now, model_version)
+            else:
+                call = (_predict, slot, count, now, model_version, (times, subjects, attended))
+            try:
+                future = self._executor.submit(*call)
+            except BrokenProcessPool:
+                # пул сломался между задачами: ошибку увидела бы только следующая задача
+                self._restart()
+                future = self._executor.submit(*call)
+            self._slot_generations[slot] = self._generation
+        except Exception:
+            self._free.append(slot)
+            raise
+        return slot, future
+
+    def result(self, slot):
+        return float(self._results[slot])
+
+    def release(self, slot):
+        self._free.append(slot)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        del self._times, self._subjects, self._attended, self._results
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import insert
+
+from db.models.shadow_prediction import ShadowPrediction
+from model_registry import ModelRegistry
+
+# Теневая оценка модели-кандидата (model_registry.py shadow <version>).
+# Основное предсказание записывается и подтверждается как обычно; кандидат считается
+# после этого в отдельном процессе и на время обработки задачи не влияет.
+# У кандидата свой бюджет времени: оценка дольше SHADOW_TIMEOUT_MS прерывается - процесс
+# останавливается, задача сохраняется как timeout без вероятности, следующая получает новый
+# процесс. Загрузка модели и запуск процесса в бюджет не входят. Если очередь теневых задач
+# заполнена, задача пропускается - теневая оценка выборочная и не должна копить отставание.
+
+SHADOW_TIMEOUT_MS = float(os.getenv("SHADOW_TIMEOUT_MS", "200"))
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "100"))
+
+shadow_predictions = ShadowPrediction.__table__
+
+# состояние процесса теневой оценки
+_child = {}
+
+
+def _init_child(registry_root):
+    _child["registry"] = ModelRegistry(registry_root)
+
+
+def _load(version):
+    model = _child.get("model")
+    if model is None or model.version != version:
+        _child["model"] = _child["registry"].load(version)
+
+
+def _predict(version, times, subjects, attended, now):
+    # модель загружена заранее вызовом _load; повторно - только в процессе, заменившем упавший
+    _load(version)
+    return _child["model"].predict_arrays(times, subjects, attended, now)["probability"]
+
+
+class ShadowScorer:
+    def __init__(self, session_factory, registry_root, timeout_ms=SHADOW_TIMEOUT_MS, max_pending=SHADOW_MAX_PENDING):
+        self.session_factory = session_factory
+        self.registry_root = registry_root
+        self.timeout_ms = timeout_ms
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # задачи идут по одной в потоке shadow, он же единственный владелец процесса оценки
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._pool = None
+        self._version = None
+        self.skipped = 0
+
+    def submit(self, model, history, now, prediction_id, primary_version, primary_probability, primary_latency_ms):
+        if not self._slots.acquire(blocking=False):
+            self.skipped += 1
+            return False
+        row = {
+            "prediction_id": prediction_id,
+            "primary_version": primary_version,
+            "primary_probability": primary_probability,
+            "primary_latency_ms": primary_latency_ms,
+            "shadow_version": model.version,
+        }
+        self._executor.submit(self._score, model, history, now, row)
+        return True
+
+    def _prepare(self, version):
+        if self._pool is None:
+            # spawn: процесс воркера держит потоки и соединения
+            self._pool = multiprocessing.get_context("spawn").Pool(
+                1, initializer=_init_child, initargs=(self.registry_root,)
+            )
+            self._version = None
+        if self._version != version:
+            self._pool.apply(_load, (version,))
+            self._version = version
+
+    def _terminate(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def _score(self, model, history, now, row):
+        try:
+            started = None
+            probability = None
+            try:
+                self._prepare(model.version)
+                started = time.perf_counter()
+                probability = self._pool.apply_async(_predict, (model.version, *history, now)).get(self.timeout_ms / 1000)
+                row["status"] = "completed"
+            except multiprocessing.TimeoutError:
+                row["status"] = "timeout"
+                self._terminate()
+            except Exception as e:
+                row["status"] = "failed"
+                row["error_message"] = str(e)
+            row["shadow_latency_ms"] = (time.perf_counter() - started) * 1000 if started is not None else None
+            row["shadow_probability"] = probability
+            self._save(row)
+        finally:
+            self._slots.release()
+
+    def _save(self, row):
+        db = self.session_factory()
+        try:
+            db.execute(insert(shadow_predictions).values(**row))
+            db.commit()
+        except Exception as e:
+            logging.error(f"Ошибка записи теневой оценки (ID: {row['prediction_id']}): {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def shutdown(self):
+        # недосчитанные теневые оценки не ждём: остановка воркера важнее выборки
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._terminate()
+        if self.skipped:
+            logging.info(f"Пропущено теневых оценок из-за очереди: {self.skipped}")
@@ -0,0 +1,100 @@
+import datetime
+import math
+
+import numpy as np
+
+from ml_model import DECAYED_FEATURES, FEATURE_NAMES, LogisticModel, RatioModel, decayed_features, to_seconds
+
+MONDAY = datetime.datetime(2026, 1, 12)
+
+
+def arrays(moments, attended, subjects=None):
+    times = np.array([to_seconds(moment) for moment in moments], dtype=np.float64)
+    subjects = np.zeros(len(times), dtype=np.intp) if subjects is None else np.array(subjects, dtype=np.intp)
+    return times, subjects, np.array(attended, dtype=bool)
+
+
+def test_empty_history_defaults():
+    features = decayed_features(*arrays([], []), to_seconds(MONDAY))
+    assert set(features) == set(DECAYED_FEATURES)
+    assert features["decayed_rate"] == 0.5
+    assert features["weekday_rate_0"] == features["daypart_rate_2"] == features["now_weekday_rate"] == 0.5
+    assert features["decayed_weight"] == 0.0
+    assert features["streak_attended"] == features["streak_missed"] == features["longest_missed_streak"] == 0.0
+    assert features["days_since_last"] == -1.0
+
+
+def test_decayed_rate_halves_weight_per_half_life():
+    # отметка на период полураспада старше весит вдвое меньше: (0 * 0.5 + 1 * 1) / 1.5
+    history = arrays([MONDAY - datetime.timedelta(days=14), MONDAY], [False, True])
+    features = decayed_features(*history, to_seconds(MONDAY), half_life_days=14.0)
+    assert math.isclose(features["decayed_rate"], 2 / 3)
+    assert math.isclose(features["decayed_weight"], 1.5)
+
+
+def test_streaks_and_longest_gap():
+    days = [MONDAY + datetime.timedelta(days=day) for day in range(9)]
+    now = to_seconds(days[-1] + datetime.timedelta(days=2))
+    features = decayed_features(*arrays(days, [True, False, False, True, False, False, False, True, True]), now)
+    assert (features["streak_attended"], features["streak_missed"]) == (2.0, 0.0)
+    assert features["longest_missed_streak"] == 3.0
+    assert math.isclose(features["days_since_last"], 2.0)
+
+    features = decayed_features(*arrays(days[:3], [True, False, False]), now)
+    assert (features["streak_attended"], features["streak_missed"]) == (0.0, 2.0)
+    assert features["longest_missed_streak"] == 2.0
+
+
+def test_weekday_from_thursday_epoch():
+    # 1970-01-01 - четверг (weekday_rate_3), 1970-01-05 - понедельник (weekday_rate_0)
+    history = arrays([datetime.datetime(1970, 1, 1, 10), datetime.datetime(1970, 1, 5, 10)], [True, False])
+    features = decayed_features(*history, to_seconds(datetime.datetime(1970, 1, 12, 9)))
+    assert features["weekday_rate_3"] == 1.0
+    assert features["weekday_rate_0"] == 0.0
+    # дни без занятий получают общую долю
+    assert features["weekday_rate_1"] == features["decayed_rate"]
+    assert features["now_weekday_rate"] == 0.0
+
+
+def test_daypart_boundaries():
+    # утро [0, 12), день [12, 16), вечер [16, 24): граница относится к следующей части
+    moments = [MONDAY.replace(hour=11, minute=59, second=59), MONDAY.replace(hour=12),
+               MONDAY.replace(hour=15, minute=59, second=59), MONDAY.replace(hour=16)]
+    features = decayed_features(*arrays(moments, [True, False, False, True]), to_seconds(MONDAY.replace(hour=23)))
+    assert (features["daypart_rate_0"], features["daypart_rate_1"], features["daypart_rate_2"]) == (1.0, 0.0, 1.0)
+    assert features["now_daypart_rate"] == 1.0
+
+
+def test_ratio_predict_batch():
+    users, attended_counts, total_counts, probabilities = RatioModel("builtin-ratio").predict_batch(
+        np.array([3, 3, 3, 3, 8]), np.array([True, False, True, True, False])
+    )
+    assert users.tolist() == [3, 8]
+    assert (attended_counts.tolist(), total_counts.tolist()) == ([3, 0], [4, 1])
+    assert probabilities.tolist() == [0.75, 0.0]
+
+
+def test_logistic_predict_batch_matches_single_student():
+    rng = np.random.default_rng(7)
+    model = LogisticModel("test", {"features": list(FEATURE_NAMES)}, rng.normal(size=len(FEATURE_NAMES)) / 4)
+    counts = [1, 5, 12, 3]
+    user_ids = np.repeat([2, 4, 9, 11], counts)
+    times = to_seconds(MONDAY) - rng.uniform(0, 90, len(user_ids)) * 86400.0
+    subjects = rng.choice([5, 17, 40], len(user_ids))
+    attended = rng.random(len(user_ids)) < 0.6
+    now = to_seconds(MONDAY)
+
+    users, _, _, probabilities = model.predict_batch(user_ids, attended, times, subjects, now)
+    assert users.tolist() == [2, 4, 9, 11]
+    ends = np.cumsum(counts)
+    for probability, start, end in zip(probabilities, ends - counts, ends):
+        _, codes = np.unique(subjects[start:end], return_inverse=True)
+        expected = model.predict_arrays(times[start:end], codes.reshape(-1), attended[start:end], now)["probability"]
+        assert math.isclose(probability, expected)
+
+
+def test_logistic_predict_batch_known_answer():
+    # единственный признак bias с весом ln 3: сигмоида даёт 3/4 независимо от истории
+    model = LogisticModel("bias", {"features": ["bias"]}, np.array([math.log(3.0)]))
+    _, _, _, probabilities = model.predict_batch(np.array([1, 1, 2]), np.array([True, False, False]))
+    assert np.allclose(probabilities, [0.75, 0.75])
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+
+from model_registry import BUILTIN_VERSION, ModelHolder, ModelRegistry
+
+LOGISTIC = {"kind": "logistic", "features": ["bias", "attendance_rate"]}
+
+
+def test_publish_activate_and_shadow(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    assert registry.list_versions() == []
+    assert registry.load_current().version == BUILTIN_VERSION
+
+    registry.publish("v1", LOGISTIC, [0.0, 1.0])
+    registry.publish("v2", LOGISTIC, [0.5, 2.0])
+    with pytest.raises(FileExistsError):
+        registry.publish("v1", LOGISTIC, [0.0, 1.0])
+    # незавершённые каталоги публикации не видны как версии
+    assert registry.list_versions() == ["v1", "v2"]
+    assert registry.current_version() is None
+
+    registry.activate("v2")
+    model = registry.load_current()
+    assert (model.version, model.weights.tolist()) == ("v2", [0.5, 2.0])
+
+    registry.set_shadow("v1")
+    assert registry.shadow_version() == "v1"
+    registry.set_shadow(None)
+    assert registry.shadow_version() is None
+
+    # версия, которая не загружается, не становится активной
+    with pytest.raises(FileNotFoundError):
+        registry.activate("v3")
+    assert registry.current_version() == "v2"
+
+
+def test_holder_refresh_swaps_keeps_and_falls_back(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    registry.publish("v1", LOGISTIC, [0.0, 1.0])
+    registry.activate("v1")
+    holder = ModelHolder(registry)
+    assert holder.model.version == "v1"
+    assert holder.refresh() is False
+
+    registry.publish("v2", LOGISTIC, [0.5, 2.0])
+    registry.activate("v2")
+    assert holder.refresh() is True
+    assert holder.model.version == "v2"
+
+    # битая версия (весов меньше, чем признаков) записана в CURRENT в обход activate
+    registry.publish("v3", LOGISTIC, np.array([1.0]))
+    with open(os.path.join(tmp_path, "CURRENT"), "w") as file:
+        file.write("v3")
+    assert holder.refresh() is False
+    assert holder.model.version == "v2"
+
+    os.remove(os.path.join(tmp_path, "CURRENT"))
+    assert holder.refresh() is True
+    assert holder.model.version == BUILTIN_VERSION
+    attended = np.array([True, True, True, False])
+    assert holder.model.predict_arrays(np.zeros(4), np.zeros(4, dtype=np.intp), attended, 0.0) == {"probability": 0.75}
+
+
+def test_holder_follows_shadow_pointer(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    registry.publish("candidate", LOGISTIC, [0.0, 1.0])
+    holder = ModelHolder(registry)
+    assert (holder.model.version, holder.shadow) == (BUILTIN_VERSION, None)
+
+    registry.set_shadow("candidate")
+    holder.refresh()
+    assert holder.shadow.version == "candidate"
+    registry.set_shadow(None)
+    holder.refresh()
+    assert holder.shadow is None
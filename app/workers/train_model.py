@@ -0,0 +1,262 @@
+import argparse
+import datetime
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from ml_model import FEATURE_NAMES, HALF_LIFE_DAYS, array_features, row_arrays
+from model_registry import ModelRegistry
+from worker import engine
+
+# Офлайн-обучение логистической модели для реестра:
+#   python train_model.py [--version V] [--split-at 2026-03-01] [--activate]
+# Пример: история студента до занятия k включительно -> посетит ли он занятие k+1.
+# Признаки считаются тем же кодом, что и в воркере (ml_model.array_features) на момент
+# начала занятия k+1 (кроме NOW_FEATURES, см. ниже). Разбиение по времени: примеры с целевым занятием до split_at - обучение,
+# остальные - проверка.
+# Отметки читаются серверным курсором в порядке (user_id, время занятия), признаки пишутся
+# блоками в файлы на диске и дальше читаются через np.memmap, поэтому память ограничена
+# блоком и историей одного студента, а не размером выборки. Модель обучается методом Ньютона
+# (IRLS) с L2-регуляризацией: на каждой итерации градиент и гессиан накапливаются по блокам.
+
+HISTORY_QUERY = text(
+    "SELECT a.user_id, extract(epoch FROM l.date_time)::float8 AS lesson_time, "
+    "l.subject_id, a.attended "
+    "FROM attendances a "
+    "JOIN lessons l ON l.id = a.lesson_id "
+    "WHERE a.attended IS NOT NULL "
+    "ORDER BY a.user_id, l.date_time, a.id"
+)
+# граница разбиения по умолчанию: 80% целевых отметок по времени уходят в обучение
+SPLIT_QUERY = text(
+    "SELECT percentile_disc(:fraction) WITHIN GROUP (ORDER BY l.date_time) "
+    "FROM attendances a JOIN lessons l ON l.id = a.lesson_id "
+    "WHERE a.attended IS NOT NULL"
+)
+EPOCH = datetime.datetime(1970, 1, 1)
+# признаки момента оценки: здесь это начало целевого занятия, а воркер и ночная оценка берут
+# текущее время (schedule_now) - распределения при обучении и в работе не совпадают, поэтому
+# по умолчанию эти признаки не используются, только явно через --features
+NOW_FEATURES = ("now_weekday_rate", "now_daypart_rate", "days_since_last")
+DEFAULT_FEATURES = [name for name in FEATURE_NAMES if name not in NOW_FEATURES]
+# корзины гистограммы вероятностей для AUC на проверке без хранения всех предсказаний
+AUC_BINS = 1000
+
+
+def iter_user_histories(connection, chunk_rows):
+    result = connection.execution_options(yield_per=chunk_rows).execute(HISTORY_QUERY)
+    current_user, rows = None, []
+    for partition in result.partitions():
+        for user_id, lesson_time, subject_id, attended in partition:
+            if user_id != current_user and rows:
+                yield current_user, rows
+                rows = []
+            current_user = user_id
+            rows.append((lesson_time, subject_id, attended))
+    if rows:
+        yield current_user, rows
+
+
+def user_examples(rows, feature_names, half_life_days, max_examples):
+    times, subjects, attended = row_arrays(rows)
+    # целевые занятия k = 1..n-1; у студентов с длинной историей берутся последние max_examples
+    targets = range(max(1, len(rows) - max_examples), len(rows))
+    x = np.empty((len(targets), len(feature_names)))
+    for i, k in enumerate(targets):
+        features = array_features(times[:k], subjects[:k], attended[:k], times[k], half_life_days)
+        x[i] = [features[name] for name in feature_names]
+    target_index = np.fromiter(targets, dtype=np.intp, count=len(targets))
+    return x, attended[target_index].astype(np.float64), times[target_index]
+
+
+class ExampleWriter:
+    # примеры дописываются блоками в сырые float64-файлы: x построчно и метки отдельно
+    def __init__(self, path, width):
+        self.path = path
+        self.width = width
+        self.rows = 0
+        self._x = open(path + ".x", "wb")
+        self._y = open(path + ".y", "wb")
+
+    def write(self, x, y):
+        x.astype(np.float64).tofile(self._x)
+        y.astype(np.float64).tofile(self._y)
+        self.rows += len(y)
+
+    def close(self):
+        self._x.close()
+        self._y.close()
+
+    def open(self):
+        if not self.rows:
+            return np.empty((0, self.width)), np.empty(0)
+        x = np.memmap(self.path + ".x", dtype=np.float64, mode="r", shape=(self.rows, self.width))
+        y = np.memmap(self.path + ".y", dtype=np.float64, mode="r", shape=(self.rows,))
+        return x, y
+
+
+def extract(work_dir, split_at, feature_names, half_life_days, chunk_rows, max_examples):
+    split_seconds = (split_at - EPOCH).total_seconds()
+    train = ExampleWriter(os.path.join(work_dir, "train"), len(feature_names))
+    valid = ExampleWriter(os.path.join(work_dir, "valid"), len(feature_names))
+    started = time.monotonic()
+    students = 0
+    try:
+        with engine.connect() as connection:
+            for _, rows in iter_user_histories(connection, chunk_rows):
+                if len(rows) < 2:
+                    continue
+                x, y, target_times = user_examples(rows, feature_names, half_life_days, max_examples)
+                is_train = target_times < split_seconds
+                train.write(x[is_train], y[is_train])
+                valid.write(x[~is_train], y[~is_train])
+                students += 1
+                if students % 1000 == 0:
+                    logging.info(
+                        f"Извлечено {students} студентов: {train.rows} обучающих и {valid.rows} проверочных примеров "
+                        f"за {time.monotonic() - started:.1f} с"
+                    )
+    finally:
+        train.close()
+        valid.close()
+    logging.info(
+        f"Выборка готова: {students} студентов, {train.rows} обучающих и {valid.rows} проверочных примеров "
+        f"за {time.monotonic() - started:.1f} с"
+    )
+    return train, valid
+
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def fit(x, y, l2, max_iter, tol, block_rows):
+    width = x.shape[1]
+    weights = np.zeros(width)
+    # свободный член (bias, всегда первый признак) не штрафуется
+    penalty = np.full(width, l2)
+    penalty[0] = 0.0
+    for iteration in range(1, max_iter + 1):
+        gradient = -penalty * weights
+        hessian = np.diag(penalty)
+        for start in range(0, len(y), block_rows):
+            x_block = np.asarray(x[start:start + block_rows])
+            y_block = np.asarray(y[start:start + block_rows])
+            p = sigmoid(x_block @ weights)
+            gradient += x_block.T @ (y_block - p)
+            hessian += (x_block * (p * (1 - p))[:, None]).T @ x_block
+        step = np.linalg.lstsq(hessian, gradient, rcond=None)[0]
+        weights += step
+        logging.info(f"Итерация {iteration}: |шаг| = {np.linalg.norm(step):.2e}")
+        if np.linalg.norm(step) < tol:
+            break
+    return weights
+
+
+def evaluate(x, y, weights, block_rows, baseline_column=None):
+    eps = 1e-12
+    log_loss = baseline_loss = correct = 0.0
+    positives = np.zeros(AUC_BINS)
+    negatives = np.zeros(AUC_BINS)
+    for start in range(0, len(y), block_rows):
+        x_block = np.asarray(x[start:start + block_rows])
+        y_block = np.asarray(y[start:start + block_rows])
+        p = sigmoid(x_block @ weights)
+        log_loss -= np.sum(y_block * np.log(p + eps) + (1 - y_block) * np.log(1 - p + eps))
+        correct += np.sum((p >= 0.5) == (y_block == 1))
+        bins = np.minimum((p * AUC_BINS).astype(np.intp), AUC_BINS - 1)
+        positives += np.bincount(bins, y_block, minlength=AUC_BINS)
+        negatives += np.bincount(bins, 1 - y_block, minlength=AUC_BINS)
+        if baseline_column is not None:
+            base = np.clip(x_block[:, baseline_column], eps, 1 - eps)
+            baseline_loss -= np.sum(y_block * np.log(base) + (1 - y_block) * np.log(1 - base))
+    rows = len(y)
+    if not rows:
+        return {"rows": 0}
+    # AUC по гистограмме: доля пар (посетил, пропустил), где у посетившего вероятность выше
+    below = np.cumsum(negatives) - negatives
+    pairs = positives.sum() * negatives.sum()
+    auc = float((positives * (below + negatives / 2)).sum() / pairs) if pairs else None
+    metrics = {"rows": rows, "log_loss": float(log_loss / rows), "accuracy": float(correct / rows), "auc": auc}
+    if baseline_column is not None:
+        metrics["baseline_log_loss"] = float(baseline_loss / rows)
+    return metrics
+
+
+def default_split_at(fraction):
+    with engine.connect() as connection:
+        split_at = connection.execute(SPLIT_QUERY, {"fraction": fraction}).scalar()
+    if split_at is None:
+        raise SystemExit("Нет отметок посещаемости для обучения")
+    return split_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-обучение модели посещаемости в реестр моделей")
+    parser.add_argument("--version", default=None, help="версия артефакта (по умолчанию logistic-<время>)")
+    parser.add_argument("--features", nargs="+", default=DEFAULT_FEATURES, choices=FEATURE_NAMES,
+                        help="по умолчанию все, кроме " + ", ".join(NOW_FEATURES))
+    parser.add_argument("--half-life-days", type=float, default=HALF_LIFE_DAYS)
+    parser.add_argument("--split-at", type=datetime.datetime.fromisoformat, default=None,
+                        help="целевые занятия раньше этого момента - обучение, остальные - проверка")
+    parser.add_argument("--split-fraction", type=float, default=0.8,
+                        help="доля отметок до границы, если --split-at не задан")
+    parser.add_argument("--max-examples-per-user", type=int, default=200)
+    parser.add_argument("--chunk-rows", type=int, default=int(os.getenv("TRAIN_CHUNK_ROWS", "50000")))
+    parser.add_argument("--block-rows", type=int, default=65536, help="строк выборки в памяти при обучении")
+    parser.add_argument("--l2", type=float, default=1.0)
+    parser.add_argument("--max-iter", type=int, default=25)
+    parser.add_argument("--tol", type=float, default=1e-6)
+    parser.add_argument("--work-dir", default=None, help="каталог для временных файлов выборки")
+    parser.add_argument("--activate", action="store_true", help="сразу сделать обученную версию активной")
+    args = parser.parse_args()
+
+    feature_names = ["bias", *(name for name in args.features if name != "bias")]
+    split_at = args.split_at or default_split_at(args.split_fraction)
+    version = args.version or f"logistic-{datetime.datetime.now(datetime.timezone.utc):%Y%m%d%H%M%S}"
+    logging.info(f"Обучение {version}: {len(feature_names)} признаков, граница разбиения {split_at}")
+
+    work_dir = tempfile.mkdtemp(prefix="train-", dir=args.work_dir)
+    try:
+        train, valid = extract(work_dir, split_at, feature_names, args.half_life_days,
+                               args.chunk_rows, args.max_examples_per_user)
+        if not train.rows:
+            raise SystemExit("Нет обучающих примеров до границы разбиения")
+        x_train, y_train = train.open()
+        weights = fit(x_train, y_train, args.l2, args.max_iter, args.tol, args.block_rows)
+        baseline_column = feature_names.index("attendance_rate") if "attendance_rate" in feature_names else None
+        x_valid, y_valid = valid.open()
+        metrics = {
+            "train": evaluate(x_train, y_train, weights, args.block_rows, baseline_column),
+            "validation": evaluate(x_valid, y_valid, weights, args.block_rows, baseline_column),
+        }
+        logging.info(f"Метрики: {metrics}")
+        del x_train, y_train, x_valid, y_valid
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    registry = ModelRegistry()
+    manifest = {
+        "kind": "logistic",
+        "features": feature_names,
+        "half_life_days": args.half_life_days,
+        "trained_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "split_at": split_at.isoformat(),
+        "l2": args.l2,
+        "metrics": metrics,
+    }
+    path = registry.publish(version, manifest, weights)
+    logging.info(f"Модель {version} сохранена в {path}")
+    if args.activate:
+        registry.activate(version)
+        logging.info(f"Модель {version} активирована")
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,20 @@
+import datetime
 import os
-import pika
+import signal
 import json
+import functools
 import logging
-from ml_model import predict
-from sqlalchemy import create_engine
+import time
+from concurrent.futures.process import BrokenProcessPool
+from ml_model import row_arrays, schedule_now, to_seconds
+from model_registry import MODEL_REGISTRY_DIR, ModelHolder, ModelRegistry
+from predict_pool import PredictPool
+from shadow_scoring import ShadowScorer
+from sqlalchemy import create_engine, text, update
 from sqlalchemy.orm import sessionmaker
 from db.models.prediction_request import PredictionRequest
-from db.models.attendance import Attendance
+from db.replicas import ReplicaRouter
+from core.task_queue import create_task_queue
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -17,20 +25,82 @@ POSTGRES_DB = os.getenv("POSTGRES_DB")
 
 rabbitmq_host = 'rabbitmq'
 rabbitmq_queue = 'ml_tasks'
+# "rabbitmq" или "postgres" - как TASK_BACKEND приложения (core/task_queue.py)
+TASK_BACKEND = os.getenv("TASK_BACKEND", "rabbitmq")
+# TASK_BACKEND=postgres: задач за один запрос, через сколько секунд задача упавшего воркера
+# забирается заново, как часто очередь проверяется без NOTIFY и после скольких захватов задача
+# считается неудавшейся
+TASK_CLAIM_BATCH = int(os.getenv("TASK_CLAIM_BATCH", "32"))
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "300"))
+TASK_POLL_SECONDS = float(os.getenv("TASK_POLL_SECONDS", "5"))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+
+# как часто воркер сверяет активную версию модели в реестре (также по SIGHUP)
+MODEL_REFRESH_SECONDS = float(os.getenv("MODEL_REFRESH_SECONDS", "30"))
+# процессов для predict; 0 - считать в процессе воркера, как раньше
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))
 
 
 DATABASE_URL = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}/{POSTGRES_DB}"
-engine = create_engine(DATABASE_URL)
+# БД использует только поток соединения и поток теневой оценки, большой пул не нужен
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=int(os.getenv("WORKER_DB_POOL_SIZE", "2")),
+    max_overflow=int(os.getenv("WORKER_DB_MAX_OVERFLOW", "2")),
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30"))
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def process_message(ch, method, properties, body):
+# история посещений читается из реплик (JSON-список URL, как DATABASE_REPLICA_URLS приложения);
+# запись статуса всегда идёт в основную БД
+DB_REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("DB_REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+replicas = ReplicaRouter(
+    engine,
+    json.loads(os.getenv("DATABASE_REPLICA_URLS", "[]")),
+    max_lag_seconds=float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "30")),
+    connect_timeout=int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", "2")),
+    pool_size=int(os.getenv("WORKER_DB_POOL_SIZE", "2")),
+    max_overflow=int(os.getenv("WORKER_DB_MAX_OVERFLOW", "2")),
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+)
+
+model_holder = None
+shadow_scorer = None
+predict_pool = None
+
+
+def get_model_holder():
+    global model_holder
+    if model_holder is None:
+        model_holder = ModelHolder(ModelRegistry())
+    return model_holder
+
+
+def get_shadow_scorer():
+    global shadow_scorer
+    if shadow_scorer is None:
+        shadow_scorer = ShadowScorer(SessionLocal, MODEL_REGISTRY_DIR)
+    return shadow_scorer
+
+def task_handler(task_queue):
+    # обработчик для consume/drain очереди: результаты пула возвращаются в её цикл приёма
+    return lambda task, done: run_task(task, task_queue.add_callback_threadsafe, done)
+
+def run_task(task, call_in_loop, done):
+    # Общая обработка задачи для любого способа доставки: вызывается в потоке цикла приёма,
+    # call_in_loop(fn) передаёт fn в этот поток из другого, done() - задача записана (ack).
+    prediction_id = created_at = None
     try:
-        task = json.loads(body)
         prediction_id = task.get('prediction_id')
         user_id = task.get('user_id')
+        # время создания - ключ месячной секции predictions: обновление не просматривает остальные секции
+        created_at = datetime.datetime.fromisoformat(task['created_at']) if task.get('created_at') else None
 
         if not prediction_id or not user_id:
-            logging.error(f"Неверный формат сообщения: {body}")
+            logging.error(f"Неверный формат задачи: {task}")
+            done()
             return
 
         logging.info(f"Получена задача на предсказание (ID: {prediction_id})")
@@ -38,43 +108,106 @@ def process_message(ch, method, properties, body):
         # Получаем историю посещений из базы данных
         history = get_attendance_history(user_id)
 
-        result = predict(history)
-        logging.info(f"Результат предсказания: {result}")
-        update_prediction_status(prediction_id, "completed", result=result)
+        # модель фиксируется на всю задачу: переключение версии не затрагивает начатое предсказание
+        holder = get_model_holder()
+        model, shadow = holder.model, holder.shadow
+        # один момент "сейчас" для основной и теневой модели - их признаки совпадают
+        now = to_seconds(schedule_now())
+        started = time.perf_counter()
+
+        if predict_pool is not None:
+            slot, future = predict_pool.submit(model.version, *history, now)
+
+            def pooled(future):
+                latency_ms = (time.perf_counter() - started) * 1000
+                call_in_loop(functools.partial(
+                    finish_pooled, done, prediction_id, created_at, model, shadow, history,
+                    now, slot, future, latency_ms
+                ))
+
+            future.add_done_callback(pooled)
+            return
+
+        probability = model.predict_arrays(*history, now)["probability"]
+        latency_ms = (time.perf_counter() - started) * 1000
+        complete_prediction(prediction_id, created_at, model, shadow, history, now, probability, latency_ms)
+
+    except Exception as e:
+        logging.error(f"Ошибка обработки сообщения: {e}")
+        update_prediction_status(prediction_id, "failed", error_message=str(e), created_at=created_at)
+
+    done()
 
+def finish_pooled(done, prediction_id, created_at, model, shadow, history, now, slot, future, latency_ms):
+    try:
+        future.result()
+        complete_prediction(prediction_id, created_at, model, shadow, history, now, predict_pool.result(slot),
+                            latency_ms)
+    except BrokenProcessPool as e:
+        logging.error(f"Процесс пула предсказаний завершился аварийно: {e}")
+        predict_pool.recover(slot)
+        update_prediction_status(prediction_id, "failed", error_message=str(e), created_at=created_at)
     except Exception as e:
         logging.error(f"Ошибка обработки сообщения: {e}")
-        update_prediction_status(prediction_id, "failed", error_message=str(e))
+        update_prediction_status(prediction_id, "failed", error_message=str(e), created_at=created_at)
+    finally:
+        predict_pool.release(slot)
+    done()
 
-    ch.basic_ack(delivery_tag=method.delivery_tag)
+def complete_prediction(prediction_id, created_at, model, shadow, history, now, probability, latency_ms):
+    result = {"probability": probability, "model_version": model.version}
+    logging.info(f"Результат предсказания: {result}")
+    update_prediction_status(prediction_id, "completed", result=result, created_at=created_at)
 
+    if shadow is not None and shadow.version != model.version:
+        get_shadow_scorer().submit(shadow, history, now, prediction_id, model.version, probability, latency_ms)
+
+# История и статус читаются и пишутся SQL-запросами: в образе воркера нет моделей User,
+# Lesson и Subject, без них ORM-связи PredictionRequest и Attendance не инициализируются
 def get_attendance_history(user_id):
-    db = SessionLocal()
+    db = SessionLocal(bind=replicas.engine())
     try:
-        history = db.query(Attendance).filter(Attendance.user_id == user_id).all()
-        # история посещения для модели
-        attendance_history = []
-        for attendance in history:
-            attendance_history.append({
-                'subject_name': attendance.lesson.subject.name,
-                'date_time': attendance.lesson.date_time,
-                'attended': attendance.attended
-            })
-        return attendance_history
+        # история посещения для модели: массивы (время занятия в секундах, предмет, посещено)
+        rows = db.execute(
+            text(
+                "SELECT extract(epoch FROM l.date_time)::float8 AS lesson_time, l.subject_id, a.attended "
+                "FROM attendances a "
+                "JOIN lessons l ON l.id = a.lesson_id "
+                "WHERE a.user_id = :user_id AND a.attended IS NOT NULL "
+                "ORDER BY l.date_time, a.id"
+            ),
+            {"user_id": user_id}
+        ).all()
+        return row_arrays(rows)
     except Exception as e:
         logging.error(f"Ошибка получения истории посещений: {e}")
-        return []
+        return row_arrays([])
     finally:
         db.close()
 
-def update_prediction_status(prediction_id, status, result=None, error_message=None):
+def update_prediction_status(prediction_id, status, result=None, error_message=None, created_at=None):
     db = SessionLocal()
     try:
-        prediction = db.query(PredictionRequest).filter(PredictionRequest.id == prediction_id).first()
-        if prediction:
-            prediction.status = status
-            prediction.result = result
-            prediction.error_message = error_message
+        predictions = PredictionRequest.__table__
+        stmt = update(predictions).where(predictions.c.id == prediction_id)
+        if created_at is not None:
+            stmt = stmt.where(predictions.c.timestamp == created_at)
+        user_id = db.execute(
+            stmt
+            .values(
+                status=status,
+                prediction_result=result,
+                error_message=error_message,
+                model_version=result.get("model_version") if result is not None else None,
+            )
+            .returning(predictions.c.user_id)
+        ).scalar()
+        if user_id is not None:
+            # инвалидирует ETag истории предсказаний пользователя
+            db.execute(
+                text("UPDATE users SET history_version = history_version + 1 WHERE id = :user_id"),
+                {"user_id": user_id}
+            )
             db.commit()
             logging.info(f"Статус предсказания (ID: {prediction_id}) обновлен на '{status}'")
         else:
@@ -85,16 +218,69 @@ def update_prediction_status(prediction_id, status, result=None, error_message=N
     finally:
         db.close()
 
+def schedule_maintenance(task_queue, holder):
+    # обновление модели и проверка реплик выполняются в цикле приёма между задачами,
+    # поэтому обрабатываемая задача не прерывается и не теряется
+    def refresh_model():
+        holder.refresh()
+        task_queue.call_later(MODEL_REFRESH_SECONDS, refresh_model)
+
+    # проверка реплик блокирует цикл не дольше DB_REPLICA_CONNECT_TIMEOUT на реплику
+    def check_replicas():
+        replicas.check()
+        task_queue.call_later(DB_REPLICA_CHECK_INTERVAL_SECONDS, check_replicas)
+
+    if replicas.replicas:
+        check_replicas()
+
+    task_queue.call_later(MODEL_REFRESH_SECONDS, refresh_model)
+
+def task_capacity():
+    # в работе не больше задач, чем слотов пула: у каждой свой слот общей памяти;
+    # без пула из RabbitMQ берётся одно сообщение, из Postgres - пачка, считаемая по очереди
+    return predict_pool.slots if predict_pool is not None else None
+
+def serve(task_queue):
+    holder = get_model_holder()
+    schedule_maintenance(task_queue, holder)
+    task_queue.consume(task_handler(task_queue), task_capacity())
+
 def main():
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbitmq_host))
-    channel = connection.channel()
-    channel.queue_declare(queue=rabbitmq_queue)
+    task_queue = create_task_queue(
+        TASK_BACKEND,
+        engine=engine,
+        rabbitmq_host=rabbitmq_host,
+        rabbitmq_queue=rabbitmq_queue,
+        batch_size=TASK_CLAIM_BATCH,
+        lease_seconds=TASK_LEASE_SECONDS,
+        poll_seconds=TASK_POLL_SECONDS,
+        max_attempts=TASK_MAX_ATTEMPTS,
+    )
 
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue=rabbitmq_queue, on_message_callback=process_message)
+    def stop(signum, frame):
+        # текущие задачи дообрабатываются и подтверждаются, новые не забираются
+        logging.info('Получен сигнал остановки, завершаем после текущих задач...')
+        task_queue.stop()
 
-    logging.info('Ожидание задач...')
-    channel.start_consuming()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, lambda signum, frame: task_queue.add_callback_threadsafe(get_model_holder().refresh))
+
+    global predict_pool
+    if WORKER_PROCESSES > 0:
+        predict_pool = PredictPool(WORKER_PROCESSES, MODEL_REGISTRY_DIR)
+    try:
+        logging.info(f'Ожидание задач ({TASK_BACKEND})...')
+        serve(task_queue)
+    finally:
+        task_queue.close()
+        if predict_pool is not None:
+            predict_pool.shutdown()
+        if shadow_scorer is not None:
+            shadow_scorer.shutdown()
+        engine.dispose()
+        replicas.dispose()
+        logging.info('Воркер остановлен.')
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
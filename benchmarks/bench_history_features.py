@@ -0,0 +1,61 @@
+# Время расчёта признаков истории посещений (workers/ml_model.py) на одного студента.
+# Цель: меньше 1 мс на 1000 отметок.
+# Запуск из корня репозитория: python benchmarks/bench_history_features.py --rows 100 1000 10000
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "workers"))
+
+from ml_model import decayed_features, history_arrays, history_features, to_seconds  # noqa: E402
+
+
+def make_history(rows: int, subjects: int, rng: np.random.Generator) -> list:
+    start = datetime.datetime(2025, 9, 1, 9, 0)
+    offsets = np.sort(rng.integers(0, 365 * 24 * 60, rows))
+    return [
+        {
+            "subject_name": f"Предмет {int(subject)}",
+            "date_time": start + datetime.timedelta(minutes=int(offset)),
+            "attended": bool(attended),
+        }
+        for offset, subject, attended in zip(offsets, rng.integers(0, subjects, rows), rng.random(rows) < 0.8)
+    ]
+
+
+def median_ms(func, repeat: int) -> float:
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--subjects", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    now = datetime.datetime(2026, 9, 1, 12, 0)
+    print(f"{'rows':>6} {'arrays ms':>10} {'features ms':>12} {'total ms':>9}")
+    for rows in args.rows:
+        history = make_history(rows, args.subjects, rng)
+        arrays = history_arrays(history)
+        # arrays - разбор списка словарей из БД, features - сами векторные признаки
+        to_arrays = median_ms(lambda: history_arrays(history), args.repeat)
+        features = median_ms(lambda: decayed_features(*arrays, to_seconds(now)), args.repeat)
+        total = median_ms(lambda: history_features(history, now), args.repeat)
+        print(f"{rows:>6} {to_arrays:>10.3f} {features:>12.3f} {total:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# CPU-время на один ответ истории: ORM-объекты + response_model + json.dumps
+# против проекции колонок + TypeAdapter.dump_json (api.responses.dump_rows).
+# Запуск из корня репозитория: python benchmarks/bench_history_serialization.py
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from api.responses import dump_rows  # noqa: E402
+from db.models.prediction_request import PredictionRequest  # noqa: E402
+from db.models.transaction import Transaction  # noqa: E402
+# User нужен для настройки связи owner у ORM-моделей
+from db.models.user import User  # noqa: E402,F401
+from schemas import prediction as prediction_schema  # noqa: E402
+from schemas import transaction as transaction_schema  # noqa: E402
+
+
+def make_transaction_rows(n: int):
+    now = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    return [
+        {
+            "id": i,
+            "amount": -1.0 if i % 2 else 10.0,
+            "transaction_type": "prediction_fee" if i % 2 else "topup",
+            "user_id": 1,
+            "timestamp": now - datetime.timedelta(minutes=i),
+            "prediction_request_id": i if i % 2 else None,
+        }
+        for i in range(n)
+    ]
+
+
+def make_prediction_rows(n: int):
+    now = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    return [
+        {
+            "id": i,
+            "user_id": 1,
+            "status": "completed",
+            "input_data": {"qr_code_content": None, "feature1": 1.5, "feature2": "lecture"},
+            "result": {"probability": 0.75},
+            "error_message": None,
+            "cost": 1.0,
+            "timestamp_created": now - datetime.timedelta(minutes=i),
+            "timestamp_completed": now - datetime.timedelta(minutes=i) + datetime.timedelta(seconds=2),
+        }
+        for i in range(n)
+    ]
+
+
+def orm_path(model, schema, rows):
+    # то, что делал FastAPI: ORM-объекты -> валидация response_model -> dump -> json.dumps
+    objects = [model(**row) for row in rows]
+    adapter = TypeAdapter(List[schema])
+    value = adapter.validate_python(objects, from_attributes=True)
+    data = adapter.dump_python(value, mode="json")
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def projection_path(rows):
+    return dump_rows(rows)
+
+
+def cpu_time_per_call(fn, repeat: int) -> float:
+    fn()
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    cases = [
+        ("transactions", Transaction, transaction_schema.Transaction, make_transaction_rows),
+        ("predictions", PredictionRequest, prediction_schema.PredictionRequest, make_prediction_rows),
+    ]
+    print(f"{'endpoint':<14} {'rows':>6} {'orm+response_model ms':>22} {'projection ms':>14} {'speedup':>8}")
+    for name, model, schema, make_rows in cases:
+        for size in args.sizes:
+            rows = make_rows(size)
+            repeat = max(1, args.repeat * 100 // size)
+            orm = cpu_time_per_call(lambda: orm_path(model, schema, rows), repeat)
+            projection = cpu_time_per_call(lambda: projection_path(rows), repeat)
+            print(f"{name:<14} {size:>6} {orm * 1000:>22.3f} {projection * 1000:>14.3f} {orm / projection:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Нагрузочное сравнение RPS напрямую к uvicorn и через nginx (до/после изменения конфигурации).
+# Пример: python benchmarks/bench_http_rps.py --target direct=http://localhost:8000 --target nginx=http://localhost
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def run_target(base_url: str, paths, concurrency: int, duration: float, headers: dict):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=10.0) as client:
+        async def worker(offset: int):
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": p99 * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", action="append", required=True, help="метка=базовый URL")
+    parser.add_argument("--path", action="append", help="пути для запросов (по умолчанию /, /login, /register)")
+    parser.add_argument("--token", help="Bearer-токен для запросов к API истории")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    paths = args.path or ["/", "/login", "/register"]
+    headers = {"Accept-Encoding": "gzip"}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+
+    print(f"{'target':<12} {'requests':>9} {'rps':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for target in args.target:
+        label, _, base_url = target.partition("=")
+        stats = asyncio.run(run_target(base_url, paths, args.concurrency, args.duration, headers))
+        print(f"{label:<12} {stats['requests']:>9} {stats['rps']:>10.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
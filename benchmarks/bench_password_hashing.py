@@ -0,0 +1,47 @@
+# Пропускная способность входа (проверка bcrypt) при разной стоимости хеширования.
+# Запуск из корня репозитория: python benchmarks/bench_password_hashing.py --rounds 10 11 12 13
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from core.security import build_password_context  # noqa: E402
+
+
+def logins_per_second(context, hashed: str, duration: float, workers: int) -> float:
+    deadline = time.perf_counter() + duration
+
+    def worker() -> int:
+        done = 0
+        while time.perf_counter() < deadline:
+            context.verify("benchmark-password", hashed)
+            done += 1
+        return done
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        total = sum(f.result() for f in [executor.submit(worker) for _ in range(workers)])
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'rounds':>6} {'ms/verify':>10} {'logins/s/core':>14} {'logins/s (' + str(args.workers) + ' threads)':>24}")
+    for rounds in args.rounds:
+        context = build_password_context(rounds)
+        hashed = context.hash("benchmark-password")
+        single = logins_per_second(context, hashed, args.duration, workers=1)
+        parallel = logins_per_second(context, hashed, args.duration, workers=args.workers)
+        print(f"{rounds:>6} {1000 / single:>10.1f} {single:>14.1f} {parallel:>24.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Фильтры администратора по полям предсказаний (GET /predictions/search) на засеянной таблице:
+# колонки JSON без индексов (как до перехода) против JSONB с индексами по выражениям
+# (db/models/prediction_request.py). Обе таблицы создаются в отдельных схемах той же БД и удаляются
+# после замера; запросы строит crud_prediction.search_prediction_rows, схема выбирается через search_path.
+# Запуск из корня репозитория, подключение берётся из переменных POSTGRES_* приложения:
+#   python benchmarks/bench_prediction_filters.py --rows 2000000
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from crud import crud_prediction  # noqa: E402
+from db.base import engine  # noqa: E402
+from db.models.prediction_request import PredictionRequest  # noqa: E402
+from db.models.user import User  # noqa: E402
+
+START = datetime.datetime(2025, 1, 1)
+VARIANTS = ("json", "jsonb")
+JSON_INDEXES = ("ix_predictions_feature2_timestamp", "ix_predictions_probability")
+
+SEED_SQL = """
+    INSERT INTO predictions (user_id, status, cost, "timestamp", input_data, prediction_result, model_version)
+    SELECT g % :users + 1, 'completed', 1.0,
+           :start + (g::float8 * :span / :rows) * interval '1 second',
+           jsonb_build_object('qr_code_content', NULL, 'feature1', round(random() * 100) / 10,
+                              'feature2', 'group-' || (g % :groups))::{type},
+           jsonb_build_object('probability', random(), 'model_version', 'v1')::{type},
+           'v1'
+    FROM generate_series(1, :rows) g
+"""
+
+
+def schema_name(variant):
+    return f"bench_filters_{variant}"
+
+
+def create_table(variant, rows, users, groups, months):
+    schema = schema_name(variant)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        connection.exec_driver_sql(f"CREATE SCHEMA {schema}")
+        translated = connection.execution_options(schema_translate_map={None: schema})
+        User.__table__.create(translated)
+        PredictionRequest.__table__.create(translated)
+        # ensure_monthly_partitions лежит в public, секции создаются в первой схеме search_path
+        connection.exec_driver_sql(f"SET LOCAL search_path TO {schema}, public")
+        connection.execute(
+            text("SELECT ensure_monthly_partitions('predictions', :first_month, :last_month)"),
+            {"first_month": START, "last_month": START + datetime.timedelta(days=31 * (months - 1))}
+        )
+        if variant == "json":
+            for index in JSON_INDEXES:
+                connection.exec_driver_sql(f"DROP INDEX {index}")
+            connection.exec_driver_sql(
+                "ALTER TABLE predictions ALTER COLUMN input_data TYPE json, "
+                "ALTER COLUMN prediction_result TYPE json"
+            )
+        connection.execute(text(
+            "INSERT INTO users (email, hashed_password, balance, is_active, is_superuser, history_version) "
+            "SELECT 'bench' || g || '@example.com', 'x', 0, true, false, 0 FROM generate_series(1, :users) g"
+        ), {"users": users})
+        started = time.perf_counter()
+        connection.execute(text(SEED_SQL.format(type=variant)), {
+            "rows": rows, "users": users, "groups": groups, "start": START,
+            "span": (months * 30 - 1) * 86400,
+        })
+        seeded = time.perf_counter() - started
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql(f"SET search_path TO {schema}, public")
+        connection.exec_driver_sql("VACUUM ANALYZE predictions")
+        size = connection.execute(text(
+            "SELECT sum(pg_total_relation_size(relid)) FROM pg_partition_tree('predictions')"
+        )).scalar()
+    return seeded, size
+
+
+def measure(variant, filters, repeat):
+    with engine.connect() as connection:
+        connection.exec_driver_sql(f"SET search_path TO {schema_name(variant)}, public")
+        db = Session(bind=connection)
+        crud_prediction.search_prediction_rows(db, **filters)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = crud_prediction.search_prediction_rows(db, **filters)
+            timings.append((time.perf_counter() - started) * 1000)
+        db.close()
+        connection.rollback()
+    return statistics.median(timings), len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--groups", type=int, default=500, help="различных значений feature2")
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="не удалять схемы с засеянными таблицами")
+    args = parser.parse_args()
+
+    month_from = START + datetime.timedelta(days=31 * (args.months // 2))
+    cases = {
+        "feature2": {"feature2": "group-7"},
+        "probability >= 0.999": {"min_probability": 0.999},
+        "feature2 + probability": {"feature2": "group-7", "min_probability": 0.9},
+        "feature2 + month": {"feature2": "group-7", "date_from": month_from,
+                             "date_to": month_from + datetime.timedelta(days=30)},
+        "probability band + month": {"min_probability": 0.5, "max_probability": 0.501, "date_from": month_from,
+                                     "date_to": month_from + datetime.timedelta(days=30)},
+    }
+
+    try:
+        for variant in VARIANTS:
+            seeded, size = create_table(variant, args.rows, args.users, args.groups, args.months)
+            print(f"{variant}: {args.rows} строк засеяно за {seeded:.1f} с, размер с индексами {size / 2**20:.0f} МБ")
+        print(f"{'filter':<26}" + "".join(f"{variant + ' ms':>12}" for variant in VARIANTS) + f"{'rows':>6}")
+        for name, filters in cases.items():
+            results = [measure(variant, filters, args.repeat) for variant in VARIANTS]
+            print(f"{name:<26}" + "".join(f"{ms:>12.2f}" for ms, _ in results) + f"{results[-1][1]:>6}")
+    finally:
+        if not args.keep:
+            with engine.begin() as connection:
+                for variant in VARIANTS:
+                    connection.exec_driver_sql(f"DROP SCHEMA IF EXISTS {schema_name(variant)} CASCADE")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Полный путь предсказания в одном процессе: POST /predictions/ -> оценка обработчиком воркера -> GET результата.
+# Очередь API подменяется очередью в памяти (core/task_queue.InProcessTaskQueue), задачи разбирает
+# worker.task_handler через drain в том же потоке, поэтому время каждой стадии измеряется без брокера
+# и без ожидания чужих процессов.
+#   sequential - запросы по одному: p50/p99 каждой стадии и всего пути
+#   batch      - пачка запросов, затем одна оценка всей очереди: предсказаний в секунду на стадии оценки
+# Запуск из корня репозитория (Postgres приложения из POSTGRES_*):
+#   python benchmarks/bench_prediction_pipeline.py --requests 300 --processes 2
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# ограничение частоты запросов не относится к замеру
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app", "workers"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+import worker  # noqa: E402
+from api.endpoints import predictions  # noqa: E402
+from core.config import settings  # noqa: E402
+from core.task_queue import InProcessTaskQueue  # noqa: E402
+from db.base import engine  # noqa: E402
+from main import app  # noqa: E402
+from predict_pool import PredictPool  # noqa: E402
+
+EMAIL = "bench-pipeline@example.com"
+PASSWORD = "bench-pipeline"
+FEATURE2 = "bench-pipeline"
+
+publisher = predictions.publisher = InProcessTaskQueue()
+
+
+def login(client, requests):
+    client.post(f"{settings.API_V1_STR}/auth/register", json={"email": EMAIL, "password": PASSWORD})
+    response = client.post(f"{settings.API_V1_STR}/auth/login", data={"username": EMAIL, "password": PASSWORD})
+    response.raise_for_status()
+    token = response.json()
+    headers = {"Authorization": f"{token['token_type']} {token['access_token']}"}
+    client.post(f"{settings.API_V1_STR}/users/me/balance/topup", headers=headers,
+                json={"amount": settings.PREDICTION_COST * requests}).raise_for_status()
+    return headers
+
+
+def create(client, headers, i):
+    response = client.post(f"{settings.API_V1_STR}/predictions/", headers=headers,
+                           json={"input_data": {"feature1": i % 10 / 10, "feature2": FEATURE2}})
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def fetch(client, headers, prediction_id):
+    response = client.get(f"{settings.API_V1_STR}/predictions/{prediction_id}", headers=headers)
+    response.raise_for_status()
+    data = response.json()
+    if data["status"] != "completed":
+        raise RuntimeError(f"предсказание {prediction_id} в статусе {data['status']}")
+    return data
+
+
+def percentiles(values):
+    values = sorted(values)
+    return statistics.median(values), values[max(int(len(values) * 0.99) - 1, 0)]
+
+
+def run_sequential(client, headers, handle, requests):
+    stages = {"post": [], "score": [], "get": [], "total": []}
+    for i in range(requests):
+        started = time.perf_counter()
+        prediction_id = create(client, headers, i)
+        posted = time.perf_counter()
+        publisher.drain(handle, worker.task_capacity())
+        scored = time.perf_counter()
+        fetch(client, headers, prediction_id)
+        finished = time.perf_counter()
+        stages["post"].append((posted - started) * 1000)
+        stages["score"].append((scored - posted) * 1000)
+        stages["get"].append((finished - scored) * 1000)
+        stages["total"].append((finished - started) * 1000)
+    return {stage: percentiles(values) for stage, values in stages.items()}
+
+
+def run_batch(client, headers, handle, requests):
+    prediction_ids = [create(client, headers, i) for i in range(requests)]
+    started = time.perf_counter()
+    publisher.drain(handle, worker.task_capacity())
+    rate = requests / (time.perf_counter() - started)
+    for prediction_id in prediction_ids:
+        fetch(client, headers, prediction_id)
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--processes", type=int, default=0, help="процессов пула предсказаний; 0 - в потоке")
+    args = parser.parse_args()
+
+    if args.processes > 0:
+        worker.predict_pool = PredictPool(args.processes, worker.MODEL_REGISTRY_DIR)
+    handle = worker.task_handler(publisher)
+    try:
+        with TestClient(app) as client:
+            headers = login(client, args.requests * 2 + 1)
+            # первый запрос прогревает соединения, модель и пул
+            prediction_id = create(client, headers, 0)
+            publisher.drain(handle, worker.task_capacity())
+            fetch(client, headers, prediction_id)
+            stages = run_sequential(client, headers, handle, args.requests)
+            rate = run_batch(client, headers, handle, args.requests)
+    finally:
+        if worker.predict_pool is not None:
+            worker.predict_pool.shutdown()
+        with engine.begin() as connection:
+            connection.execute(text("DELETE FROM predictions WHERE input_data ->> 'feature2' = :feature2"),
+                               {"feature2": FEATURE2})
+
+    print(f"{'stage':<8} {'p50 ms':>8} {'p99 ms':>8}")
+    for stage, (p50, p99) in stages.items():
+        print(f"{stage:<8} {p50:>8.2f} {p99:>8.2f}")
+    print(f"batch: {args.requests} предсказаний оценены за один drain, {rate:.0f} в секунду")
+
+
+if __name__ == "__main__":
+    main()
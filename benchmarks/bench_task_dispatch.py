@@ -0,0 +1,163 @@
+# Доставка задач воркеру через очереди core/task_queue.py: RabbitMQ (pika), Postgres (LISTEN/NOTIFY +
+# FOR UPDATE SKIP LOCKED) и очередь в памяти процесса как нижняя граница. Замеряется только доставка:
+# задача создаётся как в POST /predictions/ (строка pending, commit, publish), обработчик сразу пишет
+# статус completed.
+#   latency    - задачи по одной: время от commit до получения обработчиком, p50/p99
+#   throughput - пачка задач от нескольких потоков-отправителей: задач в секунду до последнего completed
+# Запуск из корня репозитория (Postgres приложения из POSTGRES_*, для RabbitMQ нужен брокер):
+#   python benchmarks/bench_task_dispatch.py --backend memory postgres rabbitmq --rabbitmq-host localhost
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import pika  # noqa: E402
+from sqlalchemy import text, update  # noqa: E402
+
+from core.task_queue import create_task_queue  # noqa: E402
+from db.base import SessionLocal, engine  # noqa: E402
+from db.models.prediction_request import PredictionRequest  # noqa: E402
+# User и Transaction нужны для настройки связи owner у ORM-моделей
+from db.models.transaction import Transaction  # noqa: E402,F401
+from db.models.user import User  # noqa: E402,F401
+
+QUEUE = "bench_dispatch"
+predictions = PredictionRequest.__table__
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {}
+        self.received = {}
+        self.all_done = threading.Event()
+        self.expected = 0
+
+    def reset(self, expected):
+        with self.lock:
+            self.sent.clear()
+            self.received.clear()
+            self.expected = expected
+            self.all_done.clear()
+
+    def receive(self, prediction_id):
+        with self.lock:
+            self.received[prediction_id] = time.perf_counter()
+            if len(self.received) >= self.expected:
+                self.all_done.set()
+
+
+def complete(task):
+    with engine.begin() as connection:
+        connection.execute(
+            update(predictions)
+            .where(predictions.c.id == task["prediction_id"])
+            .values(status="completed", prediction_result={"probability": 0.5})
+        )
+
+
+def create_task(recorder, user_id, task_queue):
+    db = SessionLocal()
+    try:
+        row = PredictionRequest(user_id=user_id, status="pending", cost=1.0,
+                                input_data={"feature1": 1.0, "feature2": "bench"})
+        db.add(row)
+        db.flush()
+        prediction_id = row.id
+        recorder.sent[prediction_id] = time.perf_counter()
+        db.commit()
+        task_queue.publish({"prediction_id": prediction_id, "user_id": user_id})
+    finally:
+        db.close()
+
+
+def start_consumer(recorder, task_queue, capacity):
+    def handle(task, done):
+        recorder.receive(task["prediction_id"])
+        complete(task)
+        done()
+
+    thread = threading.Thread(target=task_queue.consume, args=(handle, capacity), daemon=True)
+    thread.start()
+
+    def stop():
+        task_queue.stop()
+        thread.join()
+
+    return stop
+
+
+def purge_rabbitmq(host):
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+    channel = connection.channel()
+    channel.queue_declare(queue=QUEUE)
+    channel.queue_purge(queue=QUEUE)
+    connection.close()
+
+
+def run_latency(recorder, task_queue, user_ids, tasks):
+    latencies = []
+    for i in range(tasks):
+        recorder.reset(1)
+        create_task(recorder, user_ids[i % len(user_ids)], task_queue)
+        if not recorder.all_done.wait(10):
+            raise RuntimeError("задача не получена за 10 с")
+        (prediction_id, sent), = recorder.sent.items()
+        latencies.append((recorder.received[prediction_id] - sent) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def run_throughput(recorder, task_queue, user_ids, tasks, producers):
+    recorder.reset(tasks)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(producers) as executor:
+        list(executor.map(lambda i: create_task(recorder, user_ids[i % len(user_ids)], task_queue), range(tasks)))
+    if not recorder.all_done.wait(120):
+        raise RuntimeError(f"получено {len(recorder.received)} из {tasks} задач")
+    return tasks / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", nargs="+", default=["memory", "postgres", "rabbitmq"],
+                        choices=["memory", "postgres", "rabbitmq"])
+    parser.add_argument("--rabbitmq-host", default=os.getenv("RABBITMQ_HOST", "localhost"))
+    parser.add_argument("--latency-tasks", type=int, default=300)
+    parser.add_argument("--throughput-tasks", type=int, default=5000)
+    parser.add_argument("--producers", type=int, default=8)
+    parser.add_argument("--capacity", type=int, default=32, help="задач в работе у воркера (prefetch / пачка)")
+    args = parser.parse_args()
+
+    with engine.connect() as connection:
+        user_ids = connection.execute(text("SELECT id FROM users ORDER BY id LIMIT 100")).scalars().all()
+    if not user_ids:
+        raise SystemExit("Нет пользователей: сначала инициализируйте БД приложения")
+
+    print(f"{'backend':<10} {'p50 ms':>8} {'p99 ms':>8} {'tasks/s':>9}")
+    for backend in args.backend:
+        recorder = Recorder()
+        if backend == "rabbitmq":
+            purge_rabbitmq(args.rabbitmq_host)
+        task_queue = create_task_queue(backend, engine=engine, rabbitmq_host=args.rabbitmq_host,
+                                       rabbitmq_queue=QUEUE, batch_size=args.capacity, poll_seconds=1.0)
+        stop = start_consumer(recorder, task_queue, args.capacity)
+        try:
+            p50, p99 = run_latency(recorder, task_queue, user_ids, args.latency_tasks)
+            rate = run_throughput(recorder, task_queue, user_ids, args.throughput_tasks, args.producers)
+        finally:
+            stop()
+            task_queue.close()
+        print(f"{backend:<10} {p50:>8.2f} {p99:>8.2f} {rate:>9.0f}")
+    # строки задач бенчмарка удаляются
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM predictions WHERE input_data ->> 'feature2' = 'bench'"))
+
+
+if __name__ == "__main__":
+    main()